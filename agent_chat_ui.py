@@ -1,5 +1,9 @@
+import time
+import uuid
 import streamlit as st
-from importlib import import_module
+import agent_registry
+import tracing
+from memory import get_memory
 
 # Mapping of script names to their file names
 AGENT_SCRIPTS = {
@@ -8,19 +12,76 @@ AGENT_SCRIPTS = {
     "Lang No Gmail (True Agent) - [Make-game - Add - Wiki]": "lang_no_gmail",
 }
 
+# Redraw streamed tokens at most this often, so long outputs do not stall the page
+TOKEN_REFRESH_SECONDS = 0.1
+# Messages redrawn on each rerun; older ones live on in the conversation memory
+UI_MAX_MESSAGES = 40
+
+def render_stream(events) -> str:
+    """Show an agent's events as they arrive and return its final answer."""
+    status = st.status("Thinking...", expanded=False)
+    live_output = st.empty()
+    tokens = []
+    last_draw = 0.0
+    first_event = None
+    trace_id = None
+    response = "No valid response."
+    for event in events:
+        if first_event is None:
+            first_event = event["elapsed"]
+        kind = event["type"]
+        if kind == "tool_start":
+            status.update(label=f"Running {event['tool']}...")
+            status.write(f"Calling **{event['tool']}** with `{event['input']}`")
+        elif kind == "tool_end":
+            status.write(f"**{event['tool']}** finished")
+        elif kind == "progress":
+            status.write(event["message"])
+        elif kind == "trace" and trace_id is None:
+            trace_id = event["trace_id"]
+        elif kind == "token":
+            tokens.append(event["content"])
+            if time.monotonic() - last_draw >= TOKEN_REFRESH_SECONDS:
+                live_output.code("".join(tokens)[-2000:])
+                last_draw = time.monotonic()
+        elif kind in ("final", "error"):
+            response = event["content"]
+    live_output.empty()
+    status.update(
+        label=f"Done - first update after {first_event or 0:.2f}s",
+        state="error" if response.startswith("Error") else "complete",
+    )
+    st.write(response)
+    # Where the time went: one bar per graph node, tool, LLM call and file write
+    if trace_id:
+        with st.expander("Trace"):
+            st.code(tracing.format_waterfall(tracing.get_trace(trace_id)))
+    return response
+
 st.title("Unified Agent Chat UI")
 
 # Sidebar for selecting an agent script
 selected_script = st.sidebar.selectbox("Select Agent Script", list(AGENT_SCRIPTS.keys()))
 
-# Import the selected module dynamically
-script_module = __import__(AGENT_SCRIPTS[selected_script])
+# Import the selected agent the first time it is used; it is then shared by every rerun and session
+module_name = AGENT_SCRIPTS[selected_script]
+if not agent_registry.is_loaded(module_name):
+    with st.spinner(f"Loading {selected_script}..."):
+        agent_registry.load_agent(module_name)
+for name, seconds in agent_registry.load_times().items():
+    st.sidebar.caption(f"{name} loaded in {seconds:.2f}s")
 
 # Initialize chat history if not already initialized
 if "messages" not in st.session_state:
     st.session_state.messages = []
+    st.session_state.hidden_messages = 0
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+session_id = st.session_state.session_id
 
-# Display chat history
+# Display recent chat history; the rerender cost stays flat however long the chat gets
+if st.session_state.hidden_messages:
+    st.caption(f"{st.session_state.hidden_messages} earlier messages are summarized in the conversation memory.")
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.write(message["content"])
@@ -32,13 +93,25 @@ if prompt := st.chat_input(f"Ask something to {selected_script}"):
     with st.chat_message("user"):
         st.write(prompt)
 
-    # Call the agent's response function
-    if hasattr(script_module, 'chat'):
-        response = script_module.chat(prompt)
-    else:
-        response = "Selected script does not have a chat function."
-
-    # Display agent response
-    st.session_state.messages.append({"role": "assistant", "content": response})
+    # Call the agent's response function, streaming its progress when it supports that
+    chat_stream = agent_registry.get_chat_stream(module_name)
+    chat = agent_registry.get_chat(module_name)
     with st.chat_message("assistant"):
-        st.write(response)
+        if chat_stream is not None:
+            response = render_stream(chat_stream(prompt, session_id))
+        else:
+            if chat is not None:
+                response = chat(prompt, session_id)
+            else:
+                response = "Selected script does not have a chat function."
+            st.write(response)
+    st.session_state.messages.append({"role": "assistant", "content": response})
+    overflow = len(st.session_state.messages) - UI_MAX_MESSAGES
+    if overflow > 0:
+        del st.session_state.messages[:overflow]
+        st.session_state.hidden_messages += overflow
+
+memory = get_memory(session_id).stats()
+st.sidebar.caption(
+    f"Memory: {memory['turns']} turns, {memory['prompt_tokens']} context tokens, {memory['bytes'] / 1024:.1f} KB"
+)
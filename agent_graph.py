@@ -0,0 +1,124 @@
+# agent_graph.py
+import operator
+from typing import TypedDict, Annotated, Optional, Sequence
+from langgraph.graph import StateGraph, END
+from langgraph.types import Send
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from chat_stream import emit, stream_events
+from memory import as_langchain_messages, get_memory
+from tracing import span, traced
+from resilience import request_budget
+from router import IntentRouter, ROUTES
+from tool_registry import ToolContext, enabled_tools, run_tool
+
+# Define the state structure
+class AgentState(TypedDict):
+    messages: Annotated[Sequence[AIMessage | HumanMessage | SystemMessage], "The messages in the conversation"]
+    context: Annotated[ToolContext, "Per-request tool state, shared by the parallel tool branches"]
+    intents: Annotated[list, "(tool, input) pairs found in the last message"]
+    # Outputs of the tool nodes as (intent index, response); parallel branches append to it
+    results: Annotated[list, operator.add]
+
+# What each tool does, for the reply when no tool matches
+CAPABILITIES = {
+    "Calculator": "add numbers",
+    "GmailReader": "check emails",
+    "GameGenerator": "make games",
+    "WikiTool": "look up information on Wikipedia",
+}
+
+class Agent:
+    """A routed tool agent: one router and one compiled graph, built once and shared by every request.
+
+    All per-request state lives in the graph state (including its
+    ToolContext), so concurrent requests can invoke the same graph.
+    """
+
+    def __init__(self, name: str, gmail: bool = True):
+        self.name = name
+        self.tools = enabled_tools(gmail)
+        # Build the intent router once, over the routes of the enabled tools
+        self.router = IntentRouter([r for r in ROUTES if r.tool in self.tools])
+        abilities = [CAPABILITIES[tool] for tool in self.tools if tool in CAPABILITIES]
+        listed = ", ".join(abilities[:-1]) + ", or " + abilities[-1] if len(abilities) > 1 else "".join(abilities)
+        self.fallback = f"I'm not sure what to do with that input. I can {listed}!"
+        self.graph = self._build_graph()
+
+    def _build_graph(self):
+        # Define the router node: find every intent in the last message, reading "it" and
+        # "that" as the topic of the user's previous message in this session
+        @traced("node.router")
+        def router_node(state: AgentState):
+            *history, message = state["messages"]
+            previous = next((m.content for m in reversed(history) if isinstance(m, HumanMessage)), None)
+            return {"intents": self.router.route_followup(message.content, previous)}
+
+        # Fan out to one tool node per intent; the graph runs them in parallel
+        def dispatch(state: AgentState):
+            if not state["intents"]:
+                return "join"
+            return [
+                Send("tool", {"index": index, "tool": tool_name, "input": tool_input, "context": state["context"]})
+                for index, (tool_name, tool_input) in enumerate(state["intents"])
+            ]
+
+        # Define the tool node: runs the tool for a single intent
+        @traced("node.tool")
+        def tool_node(task: dict):
+            tool_name, tool_input = task["tool"], task["input"]
+            if tool_name == "WikiTool" and not tool_input:
+                return {"results": [(task["index"], "Please specify a topic to search on Wikipedia.")]}
+            emit("tool_start", tool=tool_name, input=tool_input)
+            with span(f"tool.{tool_name}", input=tool_input[:200]):
+                tool_response = run_tool(tool_name, tool_input, task["context"])
+            emit("tool_end", tool=tool_name, output=tool_response)
+            return {"results": [(task["index"], tool_response)]}
+
+        # Define the join node: merge the tool outputs in the order the intents were asked
+        @traced("node.join")
+        def join_node(state: AgentState):
+            if state["results"]:
+                response = "\n\n".join(output for _, output in sorted(state["results"]))
+            else:
+                response = self.fallback
+            return {"messages": state["messages"] + [AIMessage(content=response)]}
+
+        workflow = StateGraph(AgentState)
+
+        # Add nodes
+        workflow.add_node("router", router_node)
+        workflow.add_node("tool", tool_node)
+        workflow.add_node("join", join_node)
+
+        # Set entry point, fan-out to the tools, and join before finishing
+        workflow.set_entry_point("router")
+        workflow.add_conditional_edges("router", dispatch, ["tool", "join"])
+        workflow.add_edge("tool", "join")
+        workflow.add_edge("join", END)
+
+        return workflow.compile()
+
+    def run(self, user_input: str, session_id: Optional[str] = None) -> str:
+        # With a session, earlier turns come first: a running summary, then the recent window
+        memory = get_memory(session_id) if session_id else None
+        history = as_langchain_messages(memory.context()) if memory else []
+        initial_state = {
+            "messages": history + [HumanMessage(content=user_input)],
+            "context": ToolContext(),
+            "intents": [],
+            "results": []
+        }
+        with span("chat", agent=self.name, prompt_chars=len(user_input), history_messages=len(history)), \
+                request_budget():
+            result = self.graph.invoke(initial_state)
+        response = result["messages"][-1].content
+        if memory:
+            memory.add_exchange(user_input, response)
+        return response
+
+    def chat(self, prompt: str, session_id: Optional[str] = None) -> str:
+        return self.run(prompt, session_id)
+
+    # Streaming variant for the UI: yields tool events and LLM tokens, then the final answer
+    def chat_stream(self, prompt: str, session_id: Optional[str] = None):
+        return stream_events(self.run, prompt, session_id)
@@ -0,0 +1,86 @@
+# agent_registry.py
+import importlib
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# Agent modules that are already imported, with how long their first import took.
+_agents = {}
+_load_seconds = {}
+_lock = threading.Lock()
+
+def load_agent(module_name: str):
+    """Import an agent module the first time it is used and keep it for the life of the process.
+
+    Agent modules build their LLM clients and compiled graphs at import time,
+    so each one is only ever imported once and then shared.
+    """
+    module = _agents.get(module_name)
+    if module is None:
+        with _lock:
+            module = _agents.get(module_name)
+            if module is None:
+                start = time.perf_counter()
+                module = importlib.import_module(module_name)
+                _load_seconds[module_name] = time.perf_counter() - start
+                _agents[module_name] = module
+    return module
+
+def get_chat(module_name: str):
+    """Return the agent's chat function, or None if it does not define one."""
+    return getattr(load_agent(module_name), "chat", None)
+
+def get_chat_stream(module_name: str):
+    """Return the agent's streaming chat function, or None if it does not define one."""
+    return getattr(load_agent(module_name), "chat_stream", None)
+
+def is_loaded(module_name: str) -> bool:
+    return module_name in _agents
+
+def load_times() -> dict:
+    """Seconds each loaded agent took to import, by module name."""
+    return dict(_load_seconds)
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def profile_import(module_name: str, top: int = 10):
+    """Cold-import a module in a fresh interpreter with -X importtime.
+
+    Returns (total seconds, [(cumulative seconds, module), ...]) for the
+    `top` slowest modules that the import pulled in directly.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module_name} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+    target = next(i for i, entry in enumerate(entries) if entry[2] == module_name)
+    total, indent, _ = entries[target]
+    # Children are listed before their parent, one level deeper.
+    children = []
+    for cumulative, child_indent, name in reversed(entries[:target]):
+        if child_indent <= indent:
+            break
+        if child_indent == indent + 2:
+            children.append((cumulative / 1e6, name))
+    children.sort(reverse=True)
+    return total / 1e6, children[:top]
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or ["lang", "lang_no_gmail", "lang_react"]:
+        try:
+            seconds, heaviest = profile_import(name)
+        except RuntimeError as e:
+            print(e)
+            continue
+        print(f"{name}: {seconds * 1000:.0f} ms cold import")
+        for cumulative, module in heaviest:
+            print(f"  {cumulative * 1000:8.1f} ms  {module}")
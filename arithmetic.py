@@ -0,0 +1,425 @@
+# arithmetic.py
+import ast
+import decimal
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple, Union
+
+# Limits that keep a single request from pinning a CPU.
+MAX_EXPRESSION_LENGTH = 500
+MAX_NODES = 100
+MAX_RESULT_BITS = 4096        # about 1200 decimal digits for integers
+MAX_EXPONENT = 1000
+# Smallest group of same-shaped expressions worth handing to NumPy.
+VECTOR_MIN_BATCH = 64
+
+# Decimal arithmetic for anything that is not an exact integer.
+CONTEXT = decimal.Context(
+    prec=40, Emax=999_999, Emin=-999_999,
+    traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow],
+)
+
+Number = Union[int, Decimal]
+
+class ExpressionError(ValueError):
+    """The text is not a supported expression, or evaluating it would break a limit."""
+
+class CompiledExpression(NamedTuple):
+    """A validated expression: a closure over constant slots, plus its structure for batching."""
+    source: str
+    shape: str
+    constants: Tuple[Number, ...]
+    fn: Callable
+
+    def evaluate(self) -> Number:
+        return _run(self.fn, self.constants)
+
+def _run(fn: Callable, constants: Tuple[Number, ...]) -> Number:
+    try:
+        return fn(constants, SCALAR_OPS)
+    except decimal.DecimalException as e:
+        raise ExpressionError(f"Cannot evaluate: {type(e).__name__}.") from None
+
+def _check_int(value: int) -> int:
+    if value.bit_length() > MAX_RESULT_BITS:
+        raise ExpressionError(f"Result is larger than {MAX_RESULT_BITS} bits.")
+    return value
+
+def _decimal(value: Number) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(value)
+
+def _div(a: Number, b: Number) -> Number:
+    if b == 0:
+        raise ExpressionError("Division by zero.")
+    if isinstance(a, int) and isinstance(b, int) and a % b == 0:
+        return a // b
+    return CONTEXT.divide(_decimal(a), _decimal(b))
+
+def _pow(a: Number, b: Number) -> Number:
+    if abs(b) > MAX_EXPONENT:
+        raise ExpressionError(f"Exponents are limited to {MAX_EXPONENT}.")
+    if isinstance(a, int) and isinstance(b, int) and b >= 0:
+        if a.bit_length() * b > MAX_RESULT_BITS:
+            raise ExpressionError(f"Result is larger than {MAX_RESULT_BITS} bits.")
+        return a ** b
+    if a == 0 and b < 0:
+        raise ExpressionError("Division by zero.")
+    return CONTEXT.power(_decimal(a), _decimal(b))
+
+def _exact(op: Callable[[int, int], int], decimal_op: Callable) -> Callable[[Number, Number], Number]:
+    """Integers stay exact (within MAX_RESULT_BITS); anything else uses CONTEXT."""
+    def apply(a: Number, b: Number) -> Number:
+        if isinstance(a, int) and isinstance(b, int):
+            return _check_int(op(a, b))
+        return decimal_op(_decimal(a), _decimal(b))
+    return apply
+
+# Checked scalar operations. The same compiled closures run on NumPy arrays with VECTOR_OPS.
+SCALAR_OPS: Dict[str, Callable] = {
+    "add": _exact(lambda a, b: a + b, CONTEXT.add),
+    "sub": _exact(lambda a, b: a - b, CONTEXT.subtract),
+    "mul": _exact(lambda a, b: a * b, CONTEXT.multiply),
+    "div": _div,
+    "pow": _pow,
+    "neg": lambda a: -a,
+    "pos": lambda a: a,
+}
+VECTOR_OPS: Dict[str, Callable] = {
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a - b,
+    "mul": lambda a, b: a * b,
+    "neg": lambda a: -a,
+    "pos": lambda a: a,
+}
+# |a - b| <= |a| + |b|, so evaluating with these on absolute values bounds every intermediate.
+BOUND_OPS: Dict[str, Callable] = {
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a + b,
+    "mul": lambda a, b: a * b,
+    "neg": lambda a: a,
+    "pos": lambda a: a,
+}
+_BINARY = {ast.Add: "add", ast.Sub: "sub", ast.Mult: "mul", ast.Div: "div", ast.Pow: "pow"}
+_UNARY = {ast.USub: "neg", ast.UAdd: "pos"}
+
+def _build(node: ast.AST, source: str, constants: list, shape: list) -> Callable:
+    """Compile a whitelisted AST node into a closure of (constant values, ops) and record its shape."""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        if type(node.value) is int:
+            value = _check_int(node.value)
+        else:
+            # Read decimals from the source text, so 0.1 stays exactly 0.1.
+            value = Decimal(ast.get_source_segment(source, node))
+        index = len(constants)
+        constants.append(value)
+        shape.append("i" if isinstance(value, int) else "d")
+        return lambda values, ops: values[index]
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+        name = _UNARY[type(node.op)]
+        shape.append(name)
+        operand = _build(node.operand, source, constants, shape)
+        return lambda values, ops: ops[name](operand(values, ops))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        name = _BINARY[type(node.op)]
+        shape.append(name)
+        left = _build(node.left, source, constants, shape)
+        right = _build(node.right, source, constants, shape)
+        return lambda values, ops: ops[name](left(values, ops), right(values, ops))
+    raise ExpressionError(f"Unsupported syntax: {type(node).__name__}.")
+
+# Numeric literals, so that expressions differing only in their numbers share one parse.
+_LITERAL = re.compile(r"(?<![\w.])(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?(?![\w.])")
+
+_LITERAL_SPLIT = re.compile(f"({_LITERAL.pattern})")
+
+def _template(source: str) -> Tuple[str, List[str]]:
+    """Split an expression into a template with placeholder numbers and the literal tokens."""
+    parts = _LITERAL_SPLIT.split(source)
+    tokens = parts[1::2]
+    for k in range(1, len(parts), 2):
+        parts[k] = "1" if parts[k].isdigit() else "1.5"
+    return "".join(parts), tokens
+
+def _literal_value(token: str) -> Number:
+    if token.isdigit():
+        return _check_int(int(token))
+    return Decimal(token)
+
+@lru_cache(maxsize=1024)
+def _compile_template(template: str) -> CompiledExpression:
+    return _compile_source(template)
+
+def _compile_source(source: str) -> CompiledExpression:
+    try:
+        tree = ast.parse(source, mode="eval")
+    except (SyntaxError, ValueError):
+        raise ExpressionError("Not a valid arithmetic expression.") from None
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise ExpressionError(f"Expressions are limited to {MAX_NODES} syntax nodes.")
+    constants: list = []
+    shape: list = []
+    fn = _build(tree.body, source, constants, shape)
+    return CompiledExpression(source, " ".join(shape), tuple(constants), fn)
+
+@lru_cache(maxsize=4096)
+def compile_expression(source: str) -> CompiledExpression:
+    """Parse and validate an expression once. Only numbers, + - * / ** and parentheses are allowed.
+
+    The numbers are swapped for placeholders first, and the resulting
+    template is parsed and compiled once. "3 + 4" and "10 + 20" then share
+    one closure and differ only in their constants.
+    """
+    source = source.strip()
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expressions are limited to {MAX_EXPRESSION_LENGTH} characters.")
+    template, tokens = _template(source)
+    # Leading zeros ("08") are not valid Python literals; let the full parse reject them.
+    if tokens and not any(len(t) > 1 and t[0] == "0" and t.isdigit() for t in tokens):
+        compiled = _compile_template(template)
+        if len(compiled.constants) == len(tokens):
+            constants = tuple(_literal_value(t) for t in tokens)
+            return CompiledExpression(source, compiled.shape, constants, compiled.fn)
+    return _compile_source(source)
+
+def evaluate(source: str) -> Number:
+    """Evaluate one expression, raising ExpressionError if it is invalid or too expensive."""
+    return compile_expression(source).evaluate()
+
+def evaluate_batch(sources: Sequence[str]) -> List[Union[Number, ExpressionError]]:
+    """Evaluate many expressions in one call. Failures are returned in place as ExpressionError.
+
+    Expressions are grouped by template (the expression with its numbers
+    masked), so each distinct template is parsed once. Large groups of
+    integer-only + - * templates are evaluated as int64 NumPy arrays, when
+    NumPy is installed. A float64 pass over the absolute values bounds every
+    intermediate, and rows that could overflow int64 are redone with exact
+    Python integers. Everything else is evaluated one expression at a time.
+    """
+    results: List[Union[Number, ExpressionError, None]] = [None] * len(sources)
+    groups: Dict[str, List[Tuple[int, List[str]]]] = {}
+    for index, source in enumerate(sources):
+        source = source.strip()
+        if len(source) > MAX_EXPRESSION_LENGTH:
+            results[index] = ExpressionError(f"Expressions are limited to {MAX_EXPRESSION_LENGTH} characters.")
+            continue
+        template, tokens = _template(source)
+        groups.setdefault(template, []).append((index, tokens))
+
+    np = _numpy()
+    for template, members in groups.items():
+        try:
+            compiled = _compile_template(template)
+        except ExpressionError:
+            compiled = None
+        if compiled is None or len(compiled.constants) != len(members[0][1]):
+            # Not a plain template (e.g. "1_000"); compile these one by one.
+            for index, _ in members:
+                results[index] = _evaluate_or_error(sources[index])
+            continue
+        if np is not None and len(members) >= VECTOR_MIN_BATCH and _vectorizable(compiled.shape):
+            members = _evaluate_vector(np, compiled, members, results)
+        for index, tokens in members:
+            if any(len(t) > 1 and t[0] == "0" and t.isdigit() for t in tokens):
+                results[index] = _evaluate_or_error(sources[index])
+                continue
+            try:
+                results[index] = _run(compiled.fn, tuple(_literal_value(t) for t in tokens))
+            except ExpressionError as e:
+                results[index] = e
+    return results
+
+def _evaluate_or_error(source: str) -> Union[Number, ExpressionError]:
+    try:
+        return evaluate(source)
+    except ExpressionError as e:
+        return e
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def _vectorizable(shape: str) -> bool:
+    return all(part in ("i", "add", "sub", "mul", "neg", "pos") for part in shape.split())
+
+def _evaluate_vector(np, compiled: CompiledExpression, members: List[Tuple[int, List[str]]],
+                     results: list) -> List[Tuple[int, List[str]]]:
+    """Fill results for the rows NumPy can do exactly; return the rows left for the scalar path."""
+    rows, left = [], []
+    for member in members:
+        # 18 digits always fit in int64; leading zeros go to the scalar path to be rejected.
+        ok = all(len(t) <= 18 and (len(t) == 1 or t[0] != "0") for t in member[1])
+        (rows if ok else left).append(member)
+    if not rows:
+        return left
+    table = np.array([[int(t) for t in tokens] for _, tokens in rows], dtype=np.int64)
+    columns = [table[:, k] for k in range(table.shape[1])]
+    with np.errstate(over="ignore", invalid="ignore"):
+        exact = compiled.fn(columns, VECTOR_OPS)
+        # Upper bound on every intermediate's magnitude; below 2**62 nothing can overflow int64.
+        bound = compiled.fn([np.abs(column.astype(np.float64)) for column in columns], BOUND_OPS)
+    safe = np.isfinite(bound) & (bound < 2.0 ** 62)
+    for member, value, ok in zip(rows, np.broadcast_to(exact, safe.shape).tolist(), safe.tolist()):
+        if ok:
+            results[member[0]] = value
+        else:
+            left.append(member)
+    return left
+
+# Spoken operators, rewritten before looking for an expression in a request.
+_N = r"(-?\d+(?:\.\d+)?)"
+_WORD_OPERATORS = (
+    (re.compile(rf"\b(?:subtract|take)\s+{_N}\s+(?:away\s+)?from\s+{_N}", re.IGNORECASE), r"\2 - \1"),
+    (re.compile(rf"\bdivide\s+{_N}\s+by\s+{_N}", re.IGNORECASE), r"\1 / \2"),
+    (re.compile(rf"\bmultiply\s+{_N}\s+(?:and|by|with)\s+{_N}", re.IGNORECASE), r"\1 * \2"),
+    (re.compile(r"\bmultiplied\s+by\b|\btimes\b|(?<=\d)\s*[x×]\s*(?=\d)", re.IGNORECASE), " * "),
+    (re.compile(r"\bdivided\s+by\b|÷", re.IGNORECASE), " / "),
+    (re.compile(r"\bto\s+the\s+power\s+of\b|\^", re.IGNORECASE), " ** "),
+    (re.compile(r"\bplus\b", re.IGNORECASE), " + "),
+    (re.compile(r"\bminus\b", re.IGNORECASE), " - "),
+)
+_EXPRESSION_RUN = re.compile(r"[-+*/().\d\s]*\d[-+*/().\d\s]*")
+# Digits joined by commas with no spaces: "1,000,000" (thousands separators) or "3,4" (a list).
+_COMMA_NUMBER = re.compile(r"(?<![\d.])\d+(?:,\d+)+(?![\d.])")
+_THOUSANDS = re.compile(r"\d{1,3}(?:,\d{3})+")
+
+def _strip_thousands(match: "re.Match") -> str:
+    number = match.group()
+    if _THOUSANDS.fullmatch(number):
+        return number.replace(",", "")
+    if any(len(group) == 3 for group in number.split(",")[1:]):
+        # "1,000,00" or "12,345,6": neither grouped thousands nor a plain list.
+        raise ExpressionError(f"I can't tell which number '{number}' is. "
+                              "Write it without commas, or put a space after each comma in a list.")
+    return number
+_NUMBER = re.compile(r"(?<![\d.])-?\d+(?:\.\d+)?")
+
+def parse_request(text: str) -> Tuple[str, Number]:
+    """Find the calculation in a request and evaluate it. Returns (expression, value).
+
+    The longest run of digits, operators and parentheses that compiles wins,
+    e.g. "what is (3 + 4) * 2?". Without an operator, every number in the text
+    is added up, so "add 3 and 4" and "3, 4, 5" are sums. Commas grouping
+    thousands ("1,000") are part of the number.
+    """
+    if len(text) > MAX_EXPRESSION_LENGTH * 2:
+        raise ExpressionError("Request is too long.")
+    rewritten = _COMMA_NUMBER.sub(_strip_thousands, text)
+    for pattern, operator in _WORD_OPERATORS:
+        rewritten = pattern.sub(operator, rewritten)
+    runs = sorted(_EXPRESSION_RUN.finditer(rewritten), key=lambda m: len(m.group().strip()), reverse=True)
+    for match in runs:
+        run = match.group().strip()
+        if not re.search(r"\d\s*(?:[-+*/]|\*\*)\s*[-+(.\d]", run):
+            continue
+        start, end = match.start(), match.end()
+        if re.search(r"\d,$", rewritten[:start]) and rewritten[start].isdigit() or \
+                re.match(r",\d", rewritten[end:]) and rewritten[end - 1].isdigit():
+            # A comma inside a number, as in "1,5 + 2": never compute with half of it.
+            raise ExpressionError(f"I can't tell which numbers are in '{text.strip()}'. Write them without commas.")
+        run = " ".join(run.split())
+        try:
+            return run, evaluate(run)
+        except ExpressionError as e:
+            if "Not a valid" not in str(e):
+                raise
+    # Normalize the numbers so that e.g. "08" is still a valid literal.
+    numbers = [n if "." in n else str(int(n)) for n in _NUMBER.findall(rewritten)]
+    if len(numbers) < 2:
+        raise ExpressionError("I couldn't find a calculation. Try something like '3 + 4' or '3, 4'.")
+    expression = " + ".join(f"({n})" if n.startswith("-") else n for n in numbers)
+    return expression, evaluate(expression)
+
+def answer(text: str) -> str:
+    """The Calculator tool's reply to a request; raises ExpressionError if there is nothing to compute."""
+    expression, value = parse_request(text)
+    compiled = compile_expression(expression)
+    if set(compiled.shape.split()) <= {"add", "i", "d"} and len(compiled.constants) >= 2:
+        numbers = [format_number(n) for n in compiled.constants]
+        listed = ", ".join(numbers[:-1]) + " and " + numbers[-1]
+        return f"The sum of {listed} is {format_number(value)}."
+    return f"{expression} = {format_number(value)}"
+
+def format_number(value: Number) -> str:
+    if isinstance(value, int):
+        return str(value)
+    value = value.normalize(CONTEXT)
+    # Plain notation unless the number is huge or tiny.
+    if -20 <= value.adjusted() <= 40:
+        return format(value, "f")
+    return str(value)
+
+def _legacy_add(input_string: str) -> str:
+    """The original parser from lang.py's add tool, kept for benchmarking."""
+    try:
+        if ',' in input_string:
+            numbers = [int(num.strip()) for num in input_string.split(',')]
+            if len(numbers) == 2:
+                return f"The sum of {numbers[0]} and {numbers[1]} is {numbers[0] + numbers[1]}."
+    except ValueError:
+        pass
+    try:
+        if '+' in input_string:
+            parts = input_string.split('+')
+            num1 = int(''.join(c for c in parts[0] if c.isdigit()))
+            num2 = int(''.join(c for c in parts[1] if c.isdigit()))
+            return f"The sum of {num1} and {num2} is {num1 + num2}."
+    except (ValueError, IndexError):
+        pass
+    numbers = [int(num) for num in re.findall(r'\d+', input_string)]
+    if len(numbers) >= 2:
+        return f"The sum of {numbers[0]} and {numbers[1]} is {numbers[0] + numbers[1]}."
+    return "I couldn't identify two numbers to add. Please provide two numbers separated by a comma or '+' sign."
+
+def _legacy_calculator(input_string: str) -> str:
+    """The original parser from lang_react.py's calculator, kept for benchmarking."""
+    try:
+        if ',' in input_string:
+            numbers = [int(num.strip()) for num in input_string.split(',')]
+        elif '+' in input_string:
+            numbers = [int(''.join(filter(str.isdigit, part))) for part in input_string.split('+')]
+        else:
+            return "Could not parse two numbers clearly."
+        if len(numbers) != 2:
+            return "Provide exactly two numbers."
+        return f"The sum of {numbers[0]} and {numbers[1]} is {numbers[0] + numbers[1]}."
+    except:
+        return "Please provide two valid integers separated by a comma or '+' sign."
+
+# Requests whose answer should not change from the old parsers.
+GOLDEN_REQUESTS = ["3, 4", "calculate 2+2", "What is 5 + 10", "what is 12 and 30", "calculate 7, 8",
+                   "Please add 3 and 4", "sum of 2, 2", "12345678901234567890 + 1",
+                   "1,000 + 2,000"]
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    requests = GOLDEN_REQUESTS * 200
+    for name, fn in (("legacy add", _legacy_add), ("legacy calculator", _legacy_calculator), ("engine", answer)):
+        seconds = min(timeit.repeat(lambda: [fn(r) for r in requests], number=5, repeat=5)) / 5
+        print(f"{name:>18}: {len(requests) / seconds:,.0f} requests/s")
+
+    rng = random.Random(0)
+    batch = [f"{rng.randint(-10**6, 10**6)} * {rng.randint(0, 10**6)} + {rng.randint(0, 999)}" for _ in range(10_000)]
+
+    def one_at_a_time():
+        compile_expression.cache_clear()
+        _compile_template.cache_clear()
+        return [evaluate(e) for e in batch]
+
+    def batched():
+        compile_expression.cache_clear()
+        _compile_template.cache_clear()
+        return evaluate_batch(batch)
+
+    def parse_each():
+        return [_compile_source(e).evaluate() for e in batch]
+
+    assert one_at_a_time() == batched() == parse_each() == [eval(e) for e in batch]
+    for name, fn in (("ast per expression", parse_each), ("one at a time", one_at_a_time), ("evaluate_batch", batched)):
+        seconds = min(timeit.repeat(fn, number=1, repeat=5))
+        print(f"{name:>18}: {len(batch) / seconds:,.0f} expressions/s ({'NumPy' if _numpy() else 'no NumPy'})")
@@ -0,0 +1,239 @@
+# batch_runner.py
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, Optional, Set, Tuple
+
+AGENTS = ("lang", "lang_no_gmail", "lang_react")
+# Fields tried, in order, for each item's prompt and id.
+PROMPT_FIELDS = ("prompt", "text", "body", "title")
+ID_FIELDS = ("id", "request_id")
+# Seconds one prompt may take before it is abandoned.
+BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", "300"))
+# Prompts queued per worker, so a huge input file is never loaded into the pool at once.
+QUEUE_PER_WORKER = 4
+
+class ItemTimeout(BaseException):
+    """Raised in a worker when a prompt runs past its deadline.
+
+    A BaseException, so the agents' own `except Exception` handlers cannot
+    swallow it.
+    """
+
+def read_items(path: str, prompt_field: Optional[str] = None, id_field: Optional[str] = None) -> Iterator[dict]:
+    """Yield {"id", "prompt", "agent"} for each line of a JSONL file.
+
+    The prompt is taken from prompt_field, or else the first of PROMPT_FIELDS
+    present. Lines without an id are numbered by their line number.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if isinstance(row, str):
+                row = {"prompt": row}
+            prompt = row.get(prompt_field) if prompt_field else next(
+                (row[k] for k in PROMPT_FIELDS if row.get(k)), None)
+            item_id = row.get(id_field) if id_field else next((row[k] for k in ID_FIELDS if k in row), None)
+            yield {"id": str(item_id if item_id is not None else number), "prompt": prompt, "agent": row.get("agent")}
+
+def load_checkpoint(path: str, retry_failed: bool = False) -> Set[str]:
+    """Ids already recorded in the output file, which a resumed run skips.
+
+    A line cut short by a crash is trimmed off, so new results start on a
+    fresh line. Failed items are run again when retry_failed is set.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    for line in data[:end].splitlines():
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        if row.get("ok") or not retry_failed:
+            done.add(str(row["id"]))
+    return done
+
+def _init_worker(agent: str, quiet: bool) -> None:
+    """Build the default agent once per worker process; others are built on first use and kept."""
+    os.environ.setdefault("GAME_OPEN_BROWSER", "0")
+    # The parent handles Ctrl-C and shuts the pool down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    import agent_registry
+    agent_registry.load_agent(agent)
+
+def _raise_timeout(signum, frame):
+    raise ItemTimeout()
+
+def _call_with_timeout(fn, prompt: str, timeout: float) -> str:
+    """Run fn(prompt) and give up after `timeout` seconds.
+
+    Tasks run on the worker's main thread, so SIGALRM interrupts even a
+    blocking socket read. Where there is no SIGALRM, fn runs on a helper
+    thread instead and is abandoned when the time is up.
+    """
+    if hasattr(signal, "setitimer"):
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            return fn(prompt)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    result = {}
+
+    def run():
+        try:
+            result["value"] = fn(prompt)
+        except BaseException as e:
+            result["error"] = e
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise ItemTimeout()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+def _run_item(item: dict, agent: str, timeout: float) -> dict:
+    import agent_registry
+    start = time.perf_counter()
+    record = {"id": item["id"], "agent": agent, "worker": os.getpid()}
+    try:
+        chat = agent_registry.get_chat(agent)
+        response = _call_with_timeout(chat, item["prompt"], timeout)
+        record.update(ok=True, response=response)
+    except ItemTimeout:
+        record.update(ok=False, error=f"Timed out after {timeout:g}s", timeout=True)
+    except Exception as e:
+        record.update(ok=False, error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    return record
+
+def percentile(values, p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 4)
+
+def run_batch(input_path: str, output_path: str, agent: str = "lang_no_gmail", workers: int = 4,
+              timeout: float = BATCH_TIMEOUT, retry_failed: bool = False, quiet: bool = True,
+              prompt_field: Optional[str] = None, id_field: Optional[str] = None,
+              progress_every: int = 100) -> dict:
+    """Run every prompt in input_path through an agent on a process pool; return a summary.
+
+    Each result is appended to output_path as one JSON line as soon as it
+    arrives, so an interrupted run resumes where it stopped.
+    """
+    done = load_checkpoint(output_path, retry_failed)
+    counts = {"completed": 0, "failed": 0, "timeouts": 0, "skipped": 0, "invalid": 0}
+    latencies = []
+    start = time.perf_counter()
+    pending = {}
+    items = read_items(input_path, prompt_field, id_field)
+
+    def record(out, result: dict) -> None:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        if result["ok"]:
+            counts["completed"] += 1
+        else:
+            counts["failed"] += 1
+            counts["timeouts"] += bool(result.get("timeout"))
+        if "seconds" in result:
+            latencies.append(result["seconds"])
+        finished = counts["completed"] + counts["failed"]
+        if progress_every and finished % progress_every == 0:
+            rate = finished / (time.perf_counter() - start)
+            print(f"{finished} done, {counts['failed']} failed, {rate:.2f}/s", file=sys.stderr)
+
+    def next_item() -> Optional[Tuple[dict, str]]:
+        for item in items:
+            if item["id"] in done:
+                counts["skipped"] += 1
+                continue
+            item_agent = item["agent"] or agent
+            if not item["prompt"] or item_agent not in AGENTS:
+                counts["invalid"] += 1
+                record(out, {"id": item["id"], "agent": item_agent, "ok": False,
+                             "error": "Missing prompt" if not item["prompt"] else f"Unknown agent {item_agent}"})
+                continue
+            done.add(item["id"])
+            return item, item_agent
+        return None
+
+    interrupted = False
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(agent, quiet)) as pool:
+        try:
+            while True:
+                while len(pending) < workers * QUEUE_PER_WORKER:
+                    queued = next_item()
+                    if queued is None:
+                        break
+                    item, item_agent = queued
+                    pending[pool.submit(_run_item, item, item_agent, timeout)] = item
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The worker process died; record the item and keep going.
+                        result = {"id": item["id"], "agent": item["agent"] or agent, "ok": False,
+                                  "error": f"{type(e).__name__}: {e}"}
+                    record(out, result)
+        except KeyboardInterrupt:
+            interrupted = True
+            for future in pending:
+                future.cancel()
+            print("Interrupted; finished results are saved and the next run resumes from them.", file=sys.stderr)
+
+    wall = time.perf_counter() - start
+    processed = counts["completed"] + counts["failed"]
+    return {
+        **counts,
+        "interrupted": interrupted,
+        "workers": workers,
+        "wall_seconds": round(wall, 2),
+        "items_per_second": round(processed / wall, 3) if wall else None,
+        "latency_seconds": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                            "p99": percentile(latencies, 99)},
+        "output": output_path,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through an agent in parallel.")
+    parser.add_argument("input", help="JSONL file; each line has a prompt (or text/body/title) and optionally id and agent")
+    parser.add_argument("--output", help="results JSONL, also the resume checkpoint (default: <input>.results.jsonl)")
+    parser.add_argument("--agent", default="lang_no_gmail", choices=AGENTS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--timeout", type=float, default=BATCH_TIMEOUT, help="seconds per prompt")
+    parser.add_argument("--retry-failed", action="store_true", help="run items that failed last time again")
+    parser.add_argument("--prompt-field")
+    parser.add_argument("--id-field")
+    parser.add_argument("--progress-every", type=int, default=100)
+    parser.add_argument("--verbose", action="store_true", help="show the agents' own output")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    summary = run_batch(args.input, output, args.agent, args.workers, args.timeout, args.retry_failed,
+                        not args.verbose, args.prompt_field, args.id_field, args.progress_every)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,290 @@
+# benchmark.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from fake_services import FakeGmail, FakeOpenAI, FakeWikipedia
+
+# Prompt corpus: one {"kind", "prompt"} object per line.
+BENCHMARK_PROMPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_prompts.jsonl")
+TARGETS = ("lang", "lang_no_gmail", "lang_react", "make_game")
+# Seconds between memory samples while a level runs.
+RSS_SAMPLE_SECONDS = 0.01
+# Prompt kinds each target is expected to handle.
+TARGET_KINDS = {
+    "lang": {"calculator", "wiki", "game", "gmail", "compound"},
+    "lang_no_gmail": {"calculator", "wiki", "game", "compound"},
+    "lang_react": {"calculator", "wiki", "game", "compound"},
+    "make_game": {"game"},
+}
+
+def load_prompts(path: str = BENCHMARK_PROMPTS) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 4)
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process right now, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+class RSSSampler:
+    """Samples RSS on a background thread; the peak over a block, measured from its start.
+
+    ru_maxrss only ever grows over the process's life, so after the first
+    level it says nothing about later ones. Without /proc the growth of
+    ru_maxrss is the best available measure.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._start_max = peak_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self):
+        if self.start_mb is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start_mb is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def stats(self) -> dict:
+        if self.start_mb is None:
+            return {"rss_growth_mb": round(peak_rss_mb() - self._start_max, 1)}
+        return {"rss_start_mb": self.start_mb, "peak_rss_mb": self.peak_mb,
+                "rss_growth_mb": round(self.peak_mb - self.start_mb, 1)}
+
+class _NoMemo(dict):
+    def __setitem__(self, key, value):
+        pass
+
+def start_services(args, workdir: str) -> Dict[str, object]:
+    """Start the stand-in servers and point every client at them.
+
+    Must run before the agents are imported, since they read their settings
+    from the environment at import time.
+    """
+    services = {
+        "openai": FakeOpenAI(latency=args.llm_latency, token_rate=args.token_rate, error_rate=args.error_rate).start(),
+        "wikipedia": FakeWikipedia(latency=args.wiki_latency).start(),
+        "gmail": FakeGmail(latency=args.gmail_latency).start(),
+    }
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": services["openai"].url + "/v1",
+        "GMAIL_API_ENDPOINT": services["gmail"].url,
+        "GMAIL_MIRROR_DB": os.path.join(workdir, "gmail_mirror.db"),
+        "GAME_OPEN_BROWSER": "0",
+        "GAME_CACHE_DIR": os.path.join(workdir, "game_cache"),
+        # Measure the agents, not the client's rate limits.
+        "OPENAI_RPM": os.getenv("OPENAI_RPM", "1000000"),
+        "OPENAI_TPM": os.getenv("OPENAI_TPM", "1000000000"),
+    })
+    os.environ.pop("WIKI_INDEX", None)
+    if not args.warm_cache:
+        os.environ.update({"LLM_CACHE_SIZE": "0", "WIKI_CACHE_SIZE": "0", "GAME_CACHE_MAX_MB": "0"})
+        os.environ.pop("LLM_CACHE_DB", None)
+        os.environ.pop("WIKI_CACHE_DB", None)
+    try:
+        import wikipedia
+        wikipedia.wikipedia.API_URL = services["wikipedia"].url + "/w/api.php"
+        if not args.warm_cache:
+            # The package memoizes search() and summary() forever; give each memo a dict that stores nothing.
+            for value in vars(wikipedia.wikipedia).values():
+                if isinstance(value, wikipedia.util.cache):
+                    value._cache = _NoMemo()
+    except ImportError:
+        pass
+    # Saved games and the Gmail discovery document land in the scratch directory.
+    os.chdir(workdir)
+    return services
+
+def load_target(name: str) -> Callable[[str], str]:
+    if name == "make_game":
+        import game_maker
+        from intent_classifier import extract_input
+        return lambda prompt: game_maker.make_game(extract_input("GameGenerator", prompt) or prompt,
+                                                   open_browser=False)
+    import agent_registry
+    return agent_registry.get_chat(name)
+
+def run_level(fn: Callable[[str], str], prompts: List[str], concurrency: int, services: dict) -> dict:
+    """Send every prompt through fn on `concurrency` threads and summarize."""
+    calls_before = {name: service.total_calls() for name, service in services.items()}
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    def one(prompt: str):
+        start = time.perf_counter()
+        try:
+            response = fn(prompt)
+            if isinstance(response, str) and response.startswith("Error"):
+                errors.append(response[:200])
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {str(e)[:200]}")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with RSSSampler() as memory, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, prompts))
+    wall = time.perf_counter() - start
+    count = len(prompts)
+    result = {
+        "concurrency": concurrency,
+        "requests": count,
+        "errors": len(errors),
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(count / wall, 2),
+        "latency_seconds": {
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 4),
+        },
+        **memory.stats(),
+    }
+    for name, service in services.items():
+        result[f"{name}_calls_per_request"] = round((service.total_calls() - calls_before[name]) / count, 3)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+def compare(baseline: dict, current: dict) -> List[str]:
+    """One line per (target, concurrency) present in both reports, with p50/p95 and throughput changes."""
+    lines = []
+    for target, runs in current["results"].items():
+        before = {run["concurrency"]: run for run in baseline.get("results", {}).get(target, [])
+                  if isinstance(run, dict) and "concurrency" in run}
+        for run in runs if isinstance(runs, list) else []:
+            old = before.get(run["concurrency"])
+            if old is None:
+                continue
+            changes = []
+            for label, new_value, old_value in (
+                ("p50", run["latency_seconds"]["p50"], old["latency_seconds"]["p50"]),
+                ("p95", run["latency_seconds"]["p95"], old["latency_seconds"]["p95"]),
+                ("rps", run["throughput_rps"], old["throughput_rps"]),
+            ):
+                delta = (new_value - old_value) / old_value * 100 if old_value else 0.0
+                changes.append(f"{label} {old_value} -> {new_value} ({delta:+.1f}%)")
+            lines.append(f"{target} x{run['concurrency']}: " + ", ".join(changes))
+    return lines
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Benchmark the agents offline against local stand-in services.")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="comma-separated, from " + ", ".join(TARGETS))
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated thread counts")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus per concurrency level")
+    parser.add_argument("--corpus", default=BENCHMARK_PROMPTS)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds to the first LLM token")
+    parser.add_argument("--token-rate", type=float, default=500.0, help="LLM tokens per second after the first")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM calls answered 429/500")
+    parser.add_argument("--wiki-latency", type=float, default=0.05)
+    parser.add_argument("--gmail-latency", type=float, default=0.02)
+    parser.add_argument("--warm-cache", action="store_true", help="keep the LLM, Wikipedia and game caches on")
+    parser.add_argument("--outage", default="", help="comma-separated services to degrade: openai, wikipedia, gmail")
+    parser.add_argument("--outage-stall", type=float, default=30.0, help="extra seconds each degraded call hangs")
+    parser.add_argument("--outage-failure-rate", type=float, default=0.0, help="share of degraded calls answered 503")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="an earlier report to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show the agents' own output")
+    args = parser.parse_args(argv)
+
+    out_path = os.path.abspath(args.out)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    corpus = load_prompts(args.corpus)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="agent-benchmark-")
+    services: Dict[str, object] = {}
+    try:
+        services = start_services(args, workdir)
+        for name in filter(None, args.outage.split(",")):
+            services[name].inject(stall=args.outage_stall, failure_rate=args.outage_failure_rate)
+
+        report = {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "verbose")},
+            "results": {},
+        }
+        for target in args.targets.split(","):
+            prompts = [row["prompt"] for row in corpus if row["kind"] in TARGET_KINDS[target]] * args.repeat
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            try:
+                with quiet:
+                    fn = load_target(target)
+                    if fn is None:
+                        raise RuntimeError(f"{target} has no chat function")
+                    runs = [run_level(fn, prompts, level, services) for level in levels]
+            except Exception as e:
+                report["results"][target] = {"error": f"{type(e).__name__}: {e}"}
+                print(f"{target}: failed to run ({type(e).__name__}: {e})")
+                continue
+            report["results"][target] = runs
+            for run in runs:
+                print(f"{target} x{run['concurrency']}: {run['requests']} requests, {run['throughput_rps']} req/s, "
+                      f"p50 {run['latency_seconds']['p50']}s, p95 {run['latency_seconds']['p95']}s, "
+                      f"{run['openai_calls_per_request']} LLM calls/request, {run['errors']} errors, "
+                      f"RSS +{run['rss_growth_mb']} MB")
+
+        openai = services["openai"]
+        report["services"] = {name: dict(service.calls) for name, service in services.items()}
+        report["openai"] = {"errors_injected": openai.errors, "completion_tokens": openai.completion_tokens}
+        if "llm_client" in sys.modules:
+            report["llm_client"] = sys.modules["llm_client"].limiter.stats()
+        if "resilience" in sys.modules:
+            report["tools"] = sys.modules["resilience"].resilience_stats()
+            for tool, stats in report["tools"].items():
+                print(f"{tool}: breaker {stats['state']}, {stats['timeouts']} timeouts, {stats['failures']} failures, "
+                      f"{stats['rejected']} rejected, {stats['fallbacks']} fallbacks")
+        report["peak_rss_mb"] = peak_rss_mb()
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {out_path}")
+        if baseline is not None:
+            print("\n".join(compare(baseline, report)) or "Nothing to compare.")
+    finally:
+        for service in services.values():
+            service.stop()
+        # start_services moved into the scratch directory; leave the caller where it was.
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+if __name__ == "__main__":
+    main()
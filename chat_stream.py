@@ -0,0 +1,67 @@
+# chat_stream.py
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+# Where events go while a streamed chat is running; None means nobody is listening.
+_emitter: ContextVar[Optional[Callable[[dict], None]]] = ContextVar("chat_event_emitter", default=None)
+_DONE = object()
+
+def emit(event_type: str, **data) -> None:
+    """Report an event to the streamed chat running in this context, if any.
+
+    Event types used by the agents:
+      tool_start  tool, input    a tool has been chosen and is starting
+      tool_end    tool, output   a tool has finished
+      progress    message        a status update from inside a tool
+      token       content        a piece of LLM output
+    """
+    callback = _emitter.get()
+    if callback is not None:
+        callback({"type": event_type, **data})
+
+def mute_when(stopped: Callable[[], bool]) -> None:
+    """Drop the events emitted in this context from the moment stopped() turns true.
+
+    resilience.Guard uses it so a tool call abandoned at its deadline stops
+    talking to the chat that has already moved on.
+    """
+    callback = _emitter.get()
+    if callback is not None:
+        _emitter.set(lambda event: None if stopped() else callback(event))
+
+def is_streaming() -> bool:
+    return _emitter.get() is not None
+
+def stream_events(fn: Callable[..., str], *args, **kwargs) -> Iterator[dict]:
+    """Run fn in a worker thread and yield the events it emits as they happen.
+
+    The last event is {"type": "final", "content": result}, or
+    {"type": "error", "content": message} if fn raised. Every event carries
+    "elapsed", the seconds since the call started, so time to first event is
+    easy to measure.
+    """
+    events: "queue.Queue" = queue.Queue()
+    start = time.perf_counter()
+
+    def put(event: dict):
+        event["elapsed"] = time.perf_counter() - start
+        events.put(event)
+
+    def run():
+        _emitter.set(put)
+        try:
+            put({"type": "final", "content": fn(*args, **kwargs)})
+        except Exception as e:
+            put({"type": "error", "content": f"Error: {str(e)}"})
+        finally:
+            events.put(_DONE)
+
+    threading.Thread(target=run, name="chat-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is _DONE:
+            return
+        yield event
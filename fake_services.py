@@ -0,0 +1,400 @@
+# fake_services.py
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-ins for the OpenAI, Wikipedia and Gmail APIs, so the agents can be
+# exercised and benchmarked without network access or accounts.
+
+FAKE_GAME_HTML = """```html
+<!DOCTYPE html>
+<html>
+<head>
+<title>Fake Game</title>
+<style>
+  body { background: #222; color: #eee; font-family: sans-serif; text-align: center; }
+  canvas { background: #000; border: 1px solid #555; }
+  button { margin: 4px; padding: 8px 16px; }
+</style>
+</head>
+<body>
+<h1>Fake Game</h1>
+<p>Score: <span id="score">0</span></p>
+<canvas id="board" width="320" height="240"></canvas>
+<div>
+  <button id="left">Left</button><button id="right">Right</button><button id="restart">Restart</button>
+</div>
+<script>
+  // A player square that collects a target; enough code to look like a real answer.
+  const canvas = document.getElementById('board');
+  const ctx = canvas.getContext('2d');
+  let player = { x: 150, y: 200 }, target = { x: 40, y: 40 }, score = 0, over = false;
+  function draw() {
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    ctx.fillStyle = '#4c4';
+    ctx.fillRect(player.x, player.y, 20, 20);
+    ctx.fillStyle = '#c44';
+    ctx.fillRect(target.x, target.y, 20, 20);
+  }
+  function move(dx) {
+    if (over) return;
+    player.x = Math.max(0, Math.min(canvas.width - 20, player.x + dx));
+    if (Math.abs(player.x - target.x) < 20) { score += 1; target.x = Math.random() * 300; }
+    document.getElementById('score').textContent = score;
+    draw();
+  }
+  document.getElementById('left').onclick = () => move(-20);
+  document.getElementById('right').onclick = () => move(20);
+  document.getElementById('restart').onclick = () => { score = 0; over = false; move(0); };
+  document.addEventListener('keydown', e => { if (e.key === 'ArrowLeft') move(-20); if (e.key === 'ArrowRight') move(20); });
+  draw();
+</script>
+</body>
+</html>
+```"""
+
+def fake_reply(messages: List[dict]) -> str:
+    """A plausible answer for the prompts this project sends."""
+    text = "\n".join(str(m.get("content") or "") for m in messages)
+    if "search/replace blocks" in text:
+        return "NO CHANGES"
+    if "Create a complete HTML game" in text or "Return the complete, improved HTML code" in text:
+        return FAKE_GAME_HTML
+    if "action_input" in text:
+        # Structured-chat ReAct format: go straight to the final answer.
+        return 'Action:\n```\n{"action": "Final Answer", "action_input": "This is a canned answer."}\n```'
+    return "pong"
+
+def split_tokens(text: str) -> List[str]:
+    """Cut text into pieces of about one token (four characters)."""
+    return [text[i:i + 4] for i in range(0, len(text), 4)] or [""]
+
+class FakeService:
+    """A ThreadingHTTPServer on a free local port, with a call counter per route.
+
+    inject() simulates an outage: each request stalls for `stall` extra
+    seconds, and `failure_rate` of them are answered with 503.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.stall = 0.0
+        self.failure_rate = 0.0
+        self.faults = 0
+        self._fault_random = random.Random(0)
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeService":
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; with Nagle's algorithm on, the
+            # client's delayed ACK would add about 40 ms to every keep-alive response.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                service.handle(self, "GET", b"")
+
+            def do_POST(self):
+                service.handle(self, "POST", self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        # A short poll interval lets stop() return quickly.
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, route: str) -> None:
+        with self._lock:
+            self.calls[route] = self.calls.get(route, 0) + 1
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+    def inject(self, stall: float = 0.0, failure_rate: float = 0.0) -> None:
+        """Start (or, with no arguments, end) a simulated outage."""
+        self.stall = stall
+        self.failure_rate = failure_rate
+
+    def fault(self, handler: BaseHTTPRequestHandler) -> bool:
+        """Apply the injected outage to one request; True if it was answered with an error."""
+        if self.stall:
+            time.sleep(self.stall)
+        with self._lock:
+            failed = bool(self.failure_rate) and self._fault_random.random() < self.failure_rate
+            self.faults += failed
+        if failed:
+            self.send(handler, 503, {"error": {"code": 503, "message": "Service unavailable (injected)"}})
+        return failed
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str, body: bytes) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def send(handler: BaseHTTPRequestHandler, status: int, body, content_type: str = "application/json",
+             headers: Optional[dict] = None) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+class FakeOpenAI(FakeService):
+    """Chat completions (plain and streamed) and legacy completions.
+
+    latency is the wait before the first token and token_rate the tokens per
+    second after it (None for instant). error_rate answers that share of calls
+    with a 429 or 500, and fail_first answers the first calls with 429. Those
+    errors carry a Retry-After of retry_after seconds.
+    """
+
+    def __init__(self, latency: float = 0.0, token_rate: Optional[float] = None, error_rate: float = 0.0,
+                 fail_first: int = 0, reply: Callable[[List[dict]], str] = fake_reply, seed: int = 0,
+                 retry_after: float = 0.05):
+        super().__init__(latency)
+        self.retry_after = retry_after
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.reply = reply
+        self.errors = 0
+        self.completion_tokens = 0
+        self._random = random.Random(seed)
+
+    def _error_status(self) -> Optional[int]:
+        with self._lock:
+            calls = sum(self.calls.values())
+            if calls <= self.fail_first:
+                status = 429
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status = self._random.choice((429, 500))
+            else:
+                return None
+            self.errors += 1
+            return status
+
+    def handle(self, handler, method, body):
+        path = urlparse(handler.path).path
+        if method != "POST" or not path.endswith(("/chat/completions", "/completions")):
+            return self.send(handler, 404, {"error": {"message": f"Unknown path {path}"}})
+        chat = path.endswith("/chat/completions")
+        request = json.loads(body or b"{}")
+        self.count("chat" if chat else "completions")
+        status = self._error_status()
+        if status is not None:
+            error = {"error": {"message": "Rate limit reached" if status == 429 else "Server error",
+                               "type": "requests" if status == 429 else "server_error"}}
+            return self.send(handler, status, error, headers={"Retry-After": str(self.retry_after)})
+
+        if self.fault(handler):
+            return
+        messages = request.get("messages") or [{"role": "user", "content": str(request.get("prompt", ""))}]
+        pieces = split_tokens(self.reply(messages))
+        with self._lock:
+            self.completion_tokens += len(pieces)
+        time.sleep(self.latency)
+        if request.get("stream"):
+            return self._stream(handler, request, pieces, chat)
+        if self.token_rate:
+            time.sleep(len(pieces) / self.token_rate)
+        content = "".join(pieces)
+        usage = {"prompt_tokens": sum(len(str(m.get("content"))) for m in messages) // 4,
+                 "completion_tokens": len(pieces)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if chat:
+            choice = {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}
+        else:
+            choice = {"index": 0, "finish_reason": "stop", "text": content, "logprobs": None}
+        self.send(handler, 200, {
+            "id": f"fake-{uuid.uuid4().hex[:12]}", "object": "chat.completion" if chat else "text_completion",
+            "created": int(time.time()), "model": request.get("model", "gpt-4o"), "choices": [choice], "usage": usage,
+        })
+
+    def _stream(self, handler, request, pieces, chat):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+        base = {"id": f"fake-{uuid.uuid4().hex[:12]}", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o"),
+                "object": "chat.completion.chunk" if chat else "text_completion"}
+        start = time.perf_counter()
+        try:
+            for i, piece in enumerate(pieces + [None]):
+                if chat:
+                    delta = {"content": piece} if piece is not None else {}
+                    choice = {"index": 0, "delta": delta, "finish_reason": None if piece is not None else "stop"}
+                else:
+                    choice = {"index": 0, "text": piece or "", "finish_reason": None if piece is not None else "stop"}
+                handler.wfile.write(f"data: {json.dumps({**base, 'choices': [choice]})}\n\n".encode())
+                if self.token_rate:
+                    # Sleep in steps of at least 5ms rather than once per token.
+                    wait = start + (i + 1) / self.token_rate - time.perf_counter()
+                    if wait > 0.005:
+                        handler.wfile.flush()
+                        time.sleep(wait)
+            handler.wfile.write(b"data: [DONE]\n\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early, e.g. once the HTML was complete.
+            pass
+
+FAKE_ARTICLES = {
+    "Python (programming language)": "Python is a high-level, general-purpose programming language. "
+                                     "Its design philosophy emphasizes code readability. It is dynamically typed.",
+    "Alan Turing": "Alan Turing was an English mathematician and computer scientist. "
+                   "He was highly influential in the development of theoretical computer science. He died in 1954.",
+    "Roman Empire": "The Roman Empire was the state ruled by the Romans after the Republic. "
+                    "It included territory around the Mediterranean. It was ruled by emperors.",
+    "Photosynthesis": "Photosynthesis is the process plants use to turn light into chemical energy. "
+                      "It releases oxygen as a by-product. Most life on Earth depends on it.",
+    "Mount Everest": "Mount Everest is Earth's highest mountain above sea level. "
+                     "It lies in the Mahalangur Himal range of the Himalayas. Its summit is 8,849 metres high.",
+}
+
+class FakeWikipedia(FakeService):
+    """The MediaWiki action API calls made by the `wikipedia` package: search, page info and extracts."""
+
+    def __init__(self, latency: float = 0.0, articles: Optional[Dict[str, str]] = None):
+        super().__init__(latency)
+        self.articles = dict(articles or FAKE_ARTICLES)
+        self._ids = {title: str(i) for i, title in enumerate(self.articles, start=1)}
+
+    def _search(self, query: str) -> List[str]:
+        words = set(re.findall(r"\w+", query.lower()))
+        scored = [(len(words & set(re.findall(r"\w+", title.lower()))), title) for title in self.articles]
+        return [title for score, title in sorted(scored, reverse=True) if score]
+
+    def handle(self, handler, method, body):
+        params = {k: v[0] for k, v in parse_qs(urlparse(handler.path).query, keep_blank_values=True).items()}
+        time.sleep(self.latency)
+        if self.fault(handler):
+            return
+        if params.get("list") == "search":
+            self.count("search")
+            titles = self._search(params.get("srsearch", ""))[:int(params.get("srlimit", 10))]
+            return self.send(handler, 200, {"query": {"search": [{"title": t} for t in titles]}})
+        title = params.get("titles", "")
+        if title not in self.articles:
+            self.count("missing")
+            return self.send(handler, 200, {"query": {"pages": {"-1": {"title": title, "missing": ""}}}})
+        page_id = self._ids[title]
+        page = {"pageid": int(page_id), "ns": 0, "title": title}
+        if "extracts" in params.get("prop", ""):
+            self.count("extract")
+            sentences = re.split(r"(?<=\.)\s+", self.articles[title])
+            page["extract"] = " ".join(sentences[:int(params.get("exsentences", 10))])
+        else:
+            self.count("info")
+            page["fullurl"] = f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
+        self.send(handler, 200, {"query": {"pages": {page_id: page}}})
+
+class FakeGmail(FakeService):
+    """The Gmail v1 calls this project makes: getProfile, messages.list/get, history.list and batch."""
+
+    def __init__(self, latency: float = 0.0, messages: int = 50):
+        super().__init__(latency)
+        now = int(time.time() * 1000)
+        self.messages = [
+            {
+                "id": f"m{i:05d}", "threadId": f"t{i:05d}", "labelIds": ["INBOX"],
+                "internalDate": str(now - i * 60_000), "snippet": f"Snippet of message {i}",
+                "payload": {"headers": [
+                    {"name": "Subject", "value": f"Message {i}"},
+                    {"name": "From", "value": f"sender{i % 7}@example.com"},
+                    {"name": "Date", "value": time.strftime("%a, %d %b %Y %H:%M:%S +0000",
+                                                            time.gmtime(now / 1000 - i * 60))},
+                ]},
+            }
+            for i in range(messages)
+        ]
+        self._by_id = {m["id"]: m for m in self.messages}
+        # Records history.list returns, and whether it answers 404 as for an expired historyId.
+        self.history: List[dict] = []
+        self.history_expired = False
+
+    def route(self, method: str, path: str, query: dict):
+        """Return (status, body) for one Gmail REST call."""
+        path = path.split("/gmail/v1/users/me/", 1)[-1]
+        if path == "profile":
+            self.count("profile")
+            return 200, {"emailAddress": "me@example.com", "historyId": "1000"}
+        if path == "history":
+            self.count("history")
+            if self.history_expired:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, {"history": self.history, "historyId": str(1000 + len(self.history))}
+        if path == "messages":
+            self.count("list")
+            count = int(query.get("maxResults", 100))
+            return 200, {"messages": [{"id": m["id"], "threadId": m["threadId"]} for m in self.messages[:count]],
+                         "resultSizeEstimate": len(self.messages)}
+        if path.startswith("messages/"):
+            self.count("get")
+            message = self._by_id.get(path.split("/", 1)[1])
+            if message is None:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, message
+        return 404, {"error": {"code": 404, "message": f"Unknown path {path}"}}
+
+    def handle(self, handler, method, body):
+        parsed = urlparse(handler.path)
+        time.sleep(self.latency)
+        if self.fault(handler):
+            return
+        if parsed.path.startswith("/batch"):
+            return self._batch(handler, body)
+        status, payload = self.route(method, parsed.path, {k: v[0] for k, v in parse_qs(parsed.query).items()})
+        self.send(handler, status, payload)
+
+    def _batch(self, handler, body):
+        self.count("batch")
+        boundary = re.search(r'boundary="?([^";]+)"?', handler.headers.get("Content-Type", "")).group(1)
+        out_boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in body.decode("utf-8").split(f"--{boundary}")[1:]:
+            if part.strip() in ("", "--"):
+                continue
+            content_id = re.search(r"Content-ID:\s*<(.+?)>", part, re.IGNORECASE).group(1)
+            method, url = re.search(r"^(GET|POST|PUT|DELETE|PATCH) (\S+) HTTP", part, re.MULTILINE).groups()
+            parsed = urlparse(url)
+            status, payload = self.route(method, parsed.path, {k: v[0] for k, v in parse_qs(parsed.query).items()})
+            parts.append(
+                f"--{out_boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+        data = ("".join(parts) + f"--{out_boundary}--\r\n").encode()
+        self.send(handler, 200, data, content_type=f"multipart/mixed; boundary={out_boundary}")
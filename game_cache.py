@@ -0,0 +1,172 @@
+# game_cache.py
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+GAME_CACHE_DIR = os.getenv("GAME_CACHE_DIR", "game_cache")
+GAME_CACHE_MAX_BYTES = int(float(os.getenv("GAME_CACHE_MAX_MB", "50")) * 1024 * 1024)
+# How many different games to keep for the same idea before serving from the cache.
+GAME_CACHE_VARIANTS = int(os.getenv("GAME_CACHE_VARIANTS", "1"))
+
+def normalize_game_idea(game_idea: str) -> str:
+    return " ".join(game_idea.lower().split())
+
+class GameCache:
+    """Content-addressed on-disk cache of validated game HTML.
+
+    Each HTML file is stored once under the SHA-256 of its content. A SQLite
+    index maps cache keys to files. A key can hold up to `variants` different
+    games, and one is picked at random on a hit. When the files grow past
+    `max_bytes`, the least recently used entries are evicted. Nothing is
+    created on disk until the first game is stored.
+    """
+
+    def __init__(self, directory: str = GAME_CACHE_DIR, max_bytes: int = GAME_CACHE_MAX_BYTES,
+                 variants: int = GAME_CACHE_VARIANTS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.variants = variants
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.db")
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The SQLite index, opened (with the directory created) on first use; callers hold _lock."""
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = sqlite3.connect(self._index_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT NOT NULL, content_hash TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (key, content_hash))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _exists(self) -> bool:
+        """Whether there is an index to read; lookups before the first put create nothing."""
+        return self._db is not None or os.path.exists(self._index_path)
+
+    @staticmethod
+    def make_key(game_idea: str, prompt_version, params: dict) -> str:
+        """Hash the normalized idea, prompt template version and model parameters."""
+        payload = json.dumps(
+            {"idea": normalize_game_idea(game_idea), "prompt_version": prompt_version, "params": params},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return one cached game for the key once all its variants are filled, else None."""
+        with self._lock:
+            if not self._exists():
+                self.misses += 1
+                return None
+            rows = self._conn.execute(
+                "SELECT content_hash FROM entries WHERE key = ?", (key,)
+            ).fetchall()
+            if len(rows) < max(self.variants, 1):
+                self.misses += 1
+                return None
+            content_hash = random.choice(rows)[0]
+            try:
+                with open(self._path(content_hash), encoding="utf-8") as f:
+                    html = f.read()
+            except OSError:
+                # The file went missing; forget the entry and regenerate.
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key = ? AND content_hash = ?", (key, content_hash)
+                )
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ? AND content_hash = ?",
+                (time.time(), key, content_hash),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return html
+
+    def put(self, key: str, html: str) -> None:
+        data = html.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            conn = self._conn
+            path = self._path(content_hash)
+            if not os.path.exists(path):
+                # Write to a temporary file first so readers never see a partial game.
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, content_hash, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, content_hash, len(data), now, now),
+            )
+            # Keep at most `variants` games per key, dropping the oldest.
+            stale = conn.execute(
+                "SELECT content_hash FROM entries WHERE key = ? ORDER BY created_at DESC LIMIT -1 OFFSET ?",
+                (key, max(self.variants, 1)),
+            ).fetchall()
+            for (old_hash,) in stale:
+                self._remove(key, old_hash)
+            self._evict()
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone() if self._exists() else (0, 0)
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, content_hash, size in self._conn.execute(
+            "SELECT key, content_hash, size FROM entries ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove(key, content_hash)
+            self.evictions += 1
+            total -= size
+
+    def _remove(self, key: str, content_hash: str):
+        self._conn.execute("DELETE FROM entries WHERE key = ? AND content_hash = ?", (key, content_hash))
+        # Files are shared between keys with identical content.
+        still_used = self._conn.execute(
+            "SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+        if not still_used:
+            try:
+                os.remove(self._path(content_hash))
+            except OSError:
+                pass
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.html")
@@ -1,34 +1,156 @@
 # game_generator.py
+import asyncio
+import hashlib
 import os
 import re
+import textwrap
 import webbrowser
 from pathlib import Path
-from html.parser import HTMLParser
 from dotenv import load_dotenv
-from openai import OpenAI
-from typing import Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from game_cache import GameCache
+from html_validator import Diagnostic, IncrementalHTMLValidator, check_html, summarize
+from chat_stream import emit, is_streaming
+from llm_cache import response_cache
+from tracing import annotate, span, traced
+from resilience import cancelled, remaining
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize the OpenAI client using the API key from .env
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+def get_client():
+    """Return the shared, rate-limited OpenAI client, creating it on first use."""
+    # Deferred so that importing game_maker stays cheap
+    from llm_client import get_openai_client
+    return get_openai_client()
+
+# Stream completions and abort doomed outputs early (set GAME_STREAMING=0 to disable)
+STREAM_GENERATION = os.getenv("GAME_STREAMING", "1") != "0"
+
+# Model parameters for each step; together with PROMPT_VERSION they are part of the cache key
+GENERATION_PARAMS = {"model": "gpt-4o", "max_tokens": 4000, "temperature": 0.7}
+REFINE_PARAMS = {"model": "gpt-4o", "max_tokens": 4000, "temperature": 0.5}
+# "patch" asks the reviewer for search/replace edits, "full" for the whole document again
+REFINE_MODE = os.getenv("GAME_REFINE_MODE", "patch")
+PATCH_REFINE_PARAMS = {"model": "gpt-4o", "max_tokens": 1500, "temperature": 0.5}
+# Bump whenever refine_game_prompt or refine_html_content changes, to invalidate cached games
+PROMPT_VERSION = 3
+
+# Speculative generation: candidates requested at once (1 keeps the sequential retry loop),
+# how many may be in flight together, and the total generation calls allowed per game
+SPECULATIVE_CANDIDATES = int(os.getenv("GAME_CANDIDATES", "1"))
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("GAME_MAX_CONCURRENCY", "3"))
+MAX_GENERATION_CALLS = int(os.getenv("GAME_MAX_CALLS", "6"))
+# Rough seconds one gpt-4o call takes. Retries and refinement are skipped when the
+# request's deadline leaves less than this, so a game never overruns its budget.
+GAME_STEP_SECONDS = float(os.getenv("GAME_STEP_SECONDS", "20"))
+# Turned off when the agents run behind server.py, where there is no local browser to open.
+OPEN_BROWSER = os.getenv("GAME_OPEN_BROWSER", "1") != "0"
+
+# Validated games, so repeated ideas skip the LLM calls entirely. The cache directory and
+# its index are only created when the first game is stored.
+game_cache = GameCache()
+
+def time_for_step() -> bool:
+    """Whether the current deadline leaves room for one more LLM call."""
+    if cancelled():
+        return False
+    left = remaining()
+    return left is None or left >= GAME_STEP_SECONDS
+
+def report(message: str) -> None:
+    """Print a progress message and pass it on to a streamed chat, if one is listening."""
+    print(message)
+    emit("progress", message=message)
+
+# One edit in the patch-mode refinement reply; the markers may be indented
+SEARCH_REPLACE_BLOCK = re.compile(
+    r"[ \t]*<<<<<<< SEARCH[ \t]*\r?\n(.*?)\r?\n?[ \t]*=======[ \t]*\r?\n(.*?)\r?\n?[ \t]*>>>>>>> REPLACE",
+    re.DOTALL,
+)
+
+class StreamingHTMLCheck:
+    """Incremental checks on a streamed completion, so doomed outputs can be cancelled early.
+
+    Feed chunks as they arrive. The HTML inside the ```html code fence (or
+    the whole reply, if it starts straight away with markup) is passed to an
+    IncrementalHTMLValidator. feed() returns the fatal diagnostic as soon as
+    one is seen, and `complete` turns true once the code fence has been
+    closed after </html>, after which the rest of the completion is never
+    used. Text after an earlier ``` is only validated once another one
+    arrives, so the validator stops at the last fence, as
+    extract_html_content does. close() then gives the diagnostics for the
+    whole document without a second pass.
+    """
+    # Hold back this many trailing characters, which may be a partial fence.
+    _OVERLAP = len("```html")
 
-class HTMLValidator(HTMLParser):
-    """Simple HTML parser to check for basic validity and count <script> tags."""
     def __init__(self):
-        super().__init__()
-        self.script_count = 0
-        self.errors = []
+        self.text = ""
+        self.complete = False
+        self.validator = IncrementalHTMLValidator()
+        self._fenced = None
+        self._fence_pos = 0
+        self._open_fence = False
+        self._start = 0
+        self._fed = 0
 
-    def handle_starttag(self, tag, attrs):
-        if tag.lower() == "script":
-            self.script_count += 1
+    def feed(self, chunk: str) -> Optional[Diagnostic]:
+        self.text += chunk
+        if self._fenced is None:
+            stripped = self.text.lstrip()
+            if not stripped:
+                return None
+            self._fenced = not stripped.startswith("<")
+        if not self._fenced:
+            limit = len(self.text)
+        else:
+            if self._fed == 0:
+                start = self.text.find("```html", self._fence_pos)
+                if start == -1:
+                    self._fence_pos = max(0, len(self.text) - self._OVERLAP)
+                    return None
+                self._start = self._fed = self._fence_pos = start + len("```html")
+            while True:
+                end = self.text.find("```", self._fence_pos)
+                if end == -1:
+                    self._fence_pos = max(self._fence_pos, len(self.text) - 2)
+                    # After a fence that may have been the last one, wait for the next.
+                    limit = self._fed if self._open_fence else self._fence_pos
+                    break
+                fatal = self._feed_to(end)
+                if fatal:
+                    return fatal
+                if self.validator.has_html_close:
+                    self.complete = True
+                    return None
+                # Before </html> a ``` may be part of the document (e.g. in a script's
+                # string), or close a fence around a document that lacks </html>.
+                self._open_fence = True
+                self._fence_pos = end + 3
+        return self._feed_to(limit)
 
-    def error(self, message):
-        self.errors.append(message)
+    def _feed_to(self, limit: int) -> Optional[Diagnostic]:
+        if limit > self._fed:
+            fatal = self.validator.feed(self.text[self._fed:limit])
+            self._fed = limit
+            return fatal
+        return None
 
-def refine_game_prompt(user_input: str, retry: bool = False) -> str:
+    def close(self, html_content: str) -> Optional[List[Diagnostic]]:
+        """The validator's diagnostics, if what it was fed is exactly html_content; otherwise None."""
+        fed = self.text[self._start:self._fed]
+        if fed.strip() != html_content:
+            return None
+        # Offsets are into html_content, which has the surrounding whitespace stripped.
+        lead = len(fed) - len(fed.lstrip())
+        return [d._replace(offset=min(max(d.offset - lead, 0), len(html_content))) for d in self.validator.close()]
+
+def refine_game_prompt(user_input: str, retry: bool = False,
+                       diagnostics: Optional[List[Diagnostic]] = None) -> str:
     """Refine the user's game idea into a detailed HTML game prompt."""
     base_prompt = f"""
     Create a complete HTML game based on the following user request: '{user_input}'
@@ -46,24 +168,183 @@ def refine_game_prompt(user_input: str, retry: bool = False) -> str:
     """
     if retry:
         base_prompt += "\n\nNote: Previous attempt had issues. Ensure one <script> tag and valid HTML."
+        if diagnostics:
+            base_prompt += "\nProblems found:\n" + "\n".join(f"- {d.message}" for d in diagnostics[:5])
     return base_prompt.strip()
 
+def generation_messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": "You are an expert HTML5 game developer."},
+        {"role": "user", "content": prompt}
+    ]
+
+def refine_messages(html_content: str) -> list:
+    refine_prompt = f"""
+    Review and improve the following HTML game code:
+    
+    {html_content}
+    
+    Ensure:
+    1. Full functionality and browser compatibility.
+    2. Optimized JavaScript for performance.
+    3. Enhanced CSS for visuals (no images).
+    4. Fixed syntax errors or inconsistencies.
+    5. Single <script> tag and valid HTML structure.
+    6. Clear, improved comments.
+    Return the complete, improved HTML code.
+    """
+    return [
+        {"role": "system", "content": "You are an expert HTML5 game developer and code reviewer."},
+        {"role": "user", "content": refine_prompt}
+    ]
+
+# Dedented before the code is filled in, so the example blocks start at column 0 like the edits we want back
+REFINE_PATCH_PROMPT = textwrap.dedent("""\
+    Review the following HTML game code and fix or improve it:
+
+    {html_content}
+
+    Look for:
+    1. Broken functionality or browser compatibility problems.
+    2. Slow JavaScript.
+    3. Syntax errors or inconsistencies.
+    4. Anything that breaks the single <script> tag or valid HTML structure.
+    Do NOT return the whole document. Return only edits, as search/replace blocks:
+    <<<<<<< SEARCH
+    exact lines copied from the code above
+    =======
+    replacement lines
+    >>>>>>> REPLACE
+    Each SEARCH section must match the code exactly, including indentation.
+    Return NO CHANGES if nothing needs fixing.
+    """)
+
+def refine_patch_messages(html_content: str) -> list:
+    refine_prompt = REFINE_PATCH_PROMPT.format(html_content=html_content)
+    return [
+        {"role": "system", "content": "You are an expert HTML5 game developer and code reviewer."},
+        {"role": "user", "content": refine_prompt}
+    ]
+
+def parse_search_replace(patch_text: str) -> List[Tuple[str, str]]:
+    """Extract (search, replace) pairs from search/replace blocks."""
+    return [(m.group(1), m.group(2)) for m in SEARCH_REPLACE_BLOCK.finditer(patch_text)]
+
+def _unindent(search: str, replace: str) -> Tuple[str, str]:
+    """Remove the search text's common indentation from both sides of an edit."""
+    lines = [line for line in search.splitlines() if line.strip()]
+    indent = os.path.commonprefix([line[:len(line) - len(line.lstrip())] for line in lines]) if lines else ""
+    if not indent:
+        return search, replace
+
+    def strip(text: str) -> str:
+        return "\n".join(line[len(indent):] if line.startswith(indent) else line for line in text.split("\n"))
+    return strip(search), strip(replace)
+
+def apply_search_replace(html_content: str, edits: List[Tuple[str, str]]) -> Optional[str]:
+    """Apply edits in order. Returns None if any search text is not found.
+
+    An edit whose whole block was indented by the reviewer is applied once
+    that extra indentation is removed, if the search text then matches.
+    """
+    for search, replace in edits:
+        if search and search not in html_content:
+            search, replace = _unindent(search, replace)
+        if not search or search not in html_content:
+            return None
+        html_content = html_content.replace(search, replace, 1)
+    return html_content
+
+def patched_html(html_content: str, patch_text: str) -> str:
+    """Apply the reviewer's edits, keeping the original if they do not apply cleanly."""
+    edits = parse_search_replace(patch_text)
+    if not edits:
+        if "NO CHANGES" not in patch_text:
+            print("Warning: Refinement returned no edits. Using original.")
+        return html_content
+    patched = apply_search_replace(html_content, edits)
+    if patched is None:
+        print("Warning: Refinement edits did not apply. Using original.")
+        return html_content
+    return patched
+
+def complete(messages: List[dict], params: dict, use_cache: Optional[bool] = None) -> str:
+    """Run a chat completion, answering from the LLM response cache when the parameters allow it.
+
+    use_cache overrides the cache's own rule (temperature 0, or LLM_CACHE_SAMPLING).
+    """
+    cached = response_cache.lookup(messages, params, use_cache)
+    if cached is not None:
+        annotate(llm_cache="hit")
+        return cached
+    response = get_client().chat.completions.create(messages=messages, **params)
+    content = response.choices[0].message.content
+    response_cache.store(messages, params, content, use_cache)
+    return content
+
+async def complete_async(async_client: "AsyncOpenAI", messages: List[dict], params: dict,
+                         use_cache: Optional[bool] = None) -> str:
+    """Async version of complete."""
+    cached = response_cache.lookup(messages, params, use_cache)
+    if cached is not None:
+        annotate(llm_cache="hit")
+        return cached
+    response = await async_client.chat.completions.create(messages=messages, **params)
+    content = response.choices[0].message.content
+    response_cache.store(messages, params, content, use_cache)
+    return content
+
 def generate_game_html(prompt: str) -> str:
     """Generate HTML game code using OpenAI's API."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert HTML5 game developer."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=4000,
-            temperature=0.7
-        )
-        return response.choices[0].message.content
+        return complete(generation_messages(prompt), GENERATION_PARAMS)
     except Exception as e:
         return f"Error generating game: {str(e)}"
 
+def generate_game_html_streaming(prompt: str) -> Tuple[str, Optional[Diagnostic], Optional[List[Diagnostic]]]:
+    """Stream HTML game code from OpenAI's API, cancelling as soon as the output is doomed.
+
+    Returns (content, error, diagnostics). On a fatal problem the stream is
+    closed right away and error is its diagnostic. Once the code fence closes,
+    the stream is also closed, since any trailing explanation would be thrown
+    away anyway. diagnostics are those of the extracted HTML, from the
+    validator that checked the stream, or None if it did not see all of it.
+    """
+    check = StreamingHTMLCheck()
+    messages = generation_messages(prompt)
+    cached = response_cache.lookup(messages, GENERATION_PARAMS)
+    if cached is not None:
+        annotate(llm_cache="hit")
+        # Only streams that finished without a fatal problem are cached.
+        if is_streaming():
+            emit("token", content=cached)
+        return cached, None, None
+    try:
+        stream = get_client().chat.completions.create(
+            messages=messages,
+            stream=True,
+            **GENERATION_PARAMS
+        )
+        try:
+            streaming_chat = is_streaming()
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content or ""
+                if streaming_chat and content:
+                    emit("token", content=content)
+                error = check.feed(content)
+                if error:
+                    return check.text, error, None
+                if check.complete:
+                    break
+        finally:
+            stream.close()
+        response_cache.store(messages, GENERATION_PARAMS, check.text)
+        return check.text, None, check.close(extract_html_content(check.text))
+    except Exception as e:
+        return f"Error generating game: {str(e)}", None, None
+
 def extract_html_content(raw_content: str) -> str:
     """Extracts HTML code from the API response."""
     if "```html" in raw_content and "```" in raw_content:
@@ -74,96 +355,241 @@ def extract_html_content(raw_content: str) -> str:
 
 def validate_html(html_content: str) -> Tuple[bool, str]:
     """Validate HTML content for structure and single script tag."""
-    validator = HTMLValidator()
+    return summarize(check_html(html_content))
+
+def refine_html_content(html_content: str, mode: str = REFINE_MODE) -> str:
+    """Send HTML back to LLM for final review and improvement."""
     try:
-        validator.feed(html_content)
-        if validator.script_count > 1:
-            return False, "Multiple script tags detected."
-        if not re.search(r"<!DOCTYPE html>", html_content, re.IGNORECASE) or \
-           not re.search(r"<html", html_content, re.IGNORECASE) or \
-           not re.search(r"</html>", html_content, re.IGNORECASE):
-            return False, "Missing essential HTML structure."
-        return True, "Basic validation passed."
+        if mode == "patch":
+            return patched_html(html_content, complete(refine_patch_messages(html_content), PATCH_REFINE_PARAMS))
+        return extract_html_content(complete(refine_messages(html_content), REFINE_PARAMS))
     except Exception as e:
-        return False, f"HTML parsing error: {str(e)}"
+        print(f"Error refining HTML: {str(e)}")
+        return html_content
 
-def refine_html_content(html_content: str) -> str:
-    """Send HTML back to LLM for final review and improvement."""
-    refine_prompt = f"""
-    Review and improve the following HTML game code:
-    
-    {html_content}
-    
-    Ensure:
-    1. Full functionality and browser compatibility.
-    2. Optimized JavaScript for performance.
-    3. Enhanced CSS for visuals (no images).
-    4. Fixed syntax errors or inconsistencies.
-    5. Single <script> tag and valid HTML structure.
-    6. Clear, improved comments.
-    Return the complete, improved HTML code.
-    """
+async def generate_game_html_async(async_client: "AsyncOpenAI", prompt: str, semaphore: asyncio.Semaphore) -> str:
+    """Generate HTML game code with the async client, waiting for a concurrency slot first."""
+    async with semaphore:
+        try:
+            # Not cached: the candidates share a prompt and must stay independent samples.
+            response = await async_client.chat.completions.create(
+                messages=generation_messages(prompt),
+                **GENERATION_PARAMS
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            return f"Error generating game: {str(e)}"
+
+async def refine_html_content_async(async_client: "AsyncOpenAI", html_content: str,
+                                    mode: str = REFINE_MODE) -> str:
+    """Async version of refine_html_content."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert HTML5 game developer and code reviewer."},
-                {"role": "user", "content": refine_prompt}
-            ],
-            max_tokens=4000,
-            temperature=0.5
-        )
-        return extract_html_content(response.choices[0].message.content)
+        if mode == "patch":
+            patch_text = await complete_async(async_client, refine_patch_messages(html_content), PATCH_REFINE_PARAMS)
+            return patched_html(html_content, patch_text)
+        return extract_html_content(await complete_async(async_client, refine_messages(html_content), REFINE_PARAMS))
     except Exception as e:
         print(f"Error refining HTML: {str(e)}")
         return html_content
 
+async def make_game_html_speculative(game_idea: str, candidates: int = SPECULATIVE_CANDIDATES,
+                                     max_concurrency: int = MAX_CONCURRENT_GENERATIONS,
+                                     max_calls: int = MAX_GENERATION_CALLS) -> Tuple[Optional[str], str]:
+    """Request several candidates at once, refine the first valid one and cancel the rest.
+
+    Each failed candidate is replaced by a retry-prompt request until
+    max_calls generation requests have been made. Returns (html, message);
+    html is None if no candidate passed validation.
+    """
+    from llm_client import async_openai_client
+    # The async client's connection pool is tied to the running event loop, so
+    # each run gets its own client; the rate limits are still shared.
+    async with async_openai_client() as async_client:
+        return await _speculate(async_client, game_idea, candidates, max_concurrency, max_calls)
+
+async def _speculate(async_client: "AsyncOpenAI", game_idea: str, candidates: int,
+                     max_concurrency: int, max_calls: int) -> Tuple[Optional[str], str]:
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+    pending = set()
+    calls = 0
+    message = "Error: Failed to generate valid HTML after multiple attempts."
+    diagnostics = None
+
+    def launch(retry: bool):
+        nonlocal calls
+        calls += 1
+        prompt = refine_game_prompt(game_idea, retry=retry, diagnostics=diagnostics)
+        pending.add(asyncio.ensure_future(generate_game_html_async(async_client, prompt, semaphore)))
+
+    for _ in range(min(candidates, max_calls)):
+        launch(retry=False)
+
+    html_content = None
+    try:
+        while pending and html_content is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                raw_output = task.result()
+                if raw_output.startswith("Error"):
+                    message = raw_output
+                    report(f"Candidate failed: {raw_output}")
+                    continue
+                candidate = extract_html_content(raw_output)
+                diagnostics = check_html(candidate)
+                valid, result = summarize(diagnostics)
+                report(f"Candidate: {result}")
+                if valid:
+                    html_content = candidate
+                    break
+            if html_content is None and time_for_step():
+                while len(pending) < candidates and calls < max_calls:
+                    launch(retry=True)
+    finally:
+        # Cancel the losers without waiting for them before refinement starts
+        for task in pending:
+            task.cancel()
+
+    if html_content is None:
+        await asyncio.gather(*pending, return_exceptions=True)
+        return None, message
+
+    if not time_for_step():
+        report("Skipping refinement to stay within the time budget.")
+        await asyncio.gather(*pending, return_exceptions=True)
+        return html_content, "Basic validation passed."
+    refined, _ = await asyncio.gather(
+        refine_html_content_async(async_client, html_content),
+        asyncio.gather(*pending, return_exceptions=True),
+    )
+    valid, result = validate_html(refined)
+    if not valid:
+        report(f"Warning: Refined HTML failed - {result}. Using original.")
+        refined = html_content
+    return refined, "Basic validation passed."
+
 def save_game_file(game_name: str, html_content: str) -> str:
-    """Saves HTML content to a file with a safe filename."""
+    """Saves HTML content to a file with a safe filename.
+
+    The name ends in a hash of the content, so concurrent requests for games
+    with the same name never overwrite each other's files.
+    """
+    if cancelled():
+        return "Error: The game request was cancelled before the game was saved."
     safe_name = "".join(c for c in game_name if c.isalnum() or c in " -_").strip()
-    filename = f"{safe_name.lower().replace(' ', '_')}.html"
+    digest = hashlib.sha256(html_content.encode("utf-8")).hexdigest()[:12]
+    filename = f"{safe_name.lower().replace(' ', '_')}_{digest}.html"
     try:
-        with open(filename, 'w', encoding='utf-8') as file:
-            file.write(html_content)
+        with span("game.save", path=filename, bytes=len(html_content)):
+            with open(filename, 'w', encoding='utf-8') as file:
+                file.write(html_content)
         return filename
     except Exception as e:
         return f"Error saving file: {str(e)}"
 
-def make_game(game_idea: str, open_browser: bool = True) -> str:
+def finish_game(game_name: str, html_content: str, open_browser: bool) -> str:
+    """Save the game and open it in the browser."""
+    filename = save_game_file(game_name, html_content)
+    if "Error" not in filename and open_browser:
+        webbrowser.open(f"file://{Path(filename).absolute()}")
+        return "Successfully created game"
+    return filename
+
+def game_created(result: str) -> bool:
+    """Whether a make_game() result is a success: the browser message, or the saved file's name."""
+    return result == "Successfully created game" or (result.endswith(".html") and not result.startswith("Error"))
+
+def game_cache_key(game_idea: str) -> str:
+    return GameCache.make_key(
+        game_idea, PROMPT_VERSION, {
+            "generate": GENERATION_PARAMS,
+            "refine_mode": REFINE_MODE,
+            "refine": PATCH_REFINE_PARAMS if REFINE_MODE == "patch" else REFINE_PARAMS,
+        }
+    )
+
+def make_game_from_cache(game_idea: str, open_browser: bool = OPEN_BROWSER) -> Optional[str]:
+    """Finish a game from the cache without any LLM calls, or return None if it is not cached."""
+    if not game_idea.strip():
+        return None
+    cached_html = game_cache.get(game_cache_key(game_idea))
+    if cached_html is None:
+        return None
+    report("Using cached game.")
+    annotate(cache="hit")
+    return finish_game(game_idea.split()[0] + "_game", cached_html, open_browser)
+
+@traced("make_game")
+def make_game(game_idea: str, open_browser: bool = OPEN_BROWSER, stream: bool = STREAM_GENERATION,
+              use_cache: bool = True, candidates: int = SPECULATIVE_CANDIDATES) -> str:
     """Generate an HTML game, save it, and open it in the browser if successful."""
     if not game_idea.strip():
         return "Error: No game idea provided."
 
     game_name = game_idea.split()[0] + "_game"
-    max_attempts = 3
-    html_content = ""
-
-    for attempt in range(max_attempts):
-        prompt = refine_game_prompt(game_idea, retry=(attempt > 0))
-        raw_output = generate_game_html(prompt)
-        if raw_output.startswith("Error"):
-            return raw_output
+    cache_key = game_cache_key(game_idea)
+    if use_cache:
+        cached = make_game_from_cache(game_idea, open_browser)
+        if cached is not None:
+            return cached
+
+    if candidates > 1:
+        report(f"Generating {candidates} candidate games in parallel...")
+        with span("game.speculative", candidates=candidates):
+            enhanced_html, message = asyncio.run(make_game_html_speculative(game_idea, candidates))
+        if enhanced_html is None:
+            return message
+    else:
+        max_attempts = 3
+        html_content = ""
+        diagnostics = None
+
+        for attempt in range(max_attempts):
+            if attempt > 0 and not time_for_step():
+                return "Error: Ran out of time before a valid game was generated."
+            with span("game.attempt", attempt=attempt + 1, stream=stream) as attempt_span:
+                report(f"Generating game (attempt {attempt + 1})...")
+                prompt = refine_game_prompt(game_idea, retry=(attempt > 0), diagnostics=diagnostics)
+                if stream:
+                    raw_output, stream_error, streamed = generate_game_html_streaming(prompt)
+                else:
+                    raw_output, stream_error, streamed = generate_game_html(prompt), None, None
+                if raw_output.startswith("Error"):
+                    return raw_output
         
-        html_content = extract_html_content(raw_output)
-        valid, message = validate_html(html_content)
-        print(f"Attempt {attempt + 1}: {message}")
+                if stream_error:
+                    # The stream was cancelled early, so retry straight away
+                    diagnostics = [stream_error]
+                    valid, message = False, f"{stream_error.message} Stream aborted."
+                else:
+                    html_content = extract_html_content(raw_output)
+                    diagnostics = streamed if streamed is not None else check_html(html_content)
+                    valid, message = summarize(diagnostics)
+                report(f"Attempt {attempt + 1}: {message}")
+                attempt_span.set(valid=valid)
         
-        if valid:
-            break
-        if attempt == max_attempts - 1:
-            return "Error: Failed to generate valid HTML after multiple attempts."
+                if valid:
+                    break
+                if attempt == max_attempts - 1:
+                    return "Error: Failed to generate valid HTML after multiple attempts."
 
-    enhanced_html = refine_html_content(html_content)
-    valid, message = validate_html(enhanced_html)
-    if not valid:
-        print(f"Warning: Refined HTML failed - {message}. Using original.")
-        enhanced_html = html_content
-    
-    filename = save_game_file(game_name, enhanced_html)
-    if "Error" not in filename and open_browser:
-        webbrowser.open(f"file://{Path(filename).absolute()}")
-        return "Successfully created game"
-    return filename
+        if time_for_step():
+            report("Refining game...")
+            with span("game.refine", mode=REFINE_MODE):
+                enhanced_html = refine_html_content(html_content)
+            valid, message = validate_html(enhanced_html)
+            if not valid:
+                report(f"Warning: Refined HTML failed - {message}. Using original.")
+                enhanced_html = html_content
+        else:
+            report("Skipping refinement to stay within the time budget.")
+            enhanced_html = html_content
+
+    if cancelled():
+        # The caller gave up at its deadline; leave no files or cache entries behind.
+        return "Error: The game request was cancelled before the game was saved."
+    if use_cache:
+        game_cache.put(cache_key, enhanced_html)
+    return finish_game(game_name, enhanced_html, open_browser)
 
 if __name__ == "__main__":
     idea = input("Enter your game idea: ").strip()
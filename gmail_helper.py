@@ -1,58 +1,236 @@
 # gmail_helper.py
 import os
-import pickle
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
+import threading
+from datetime import datetime, timedelta
+from tracing import span
+
+# The Google client libraries are imported where they are first needed, so that
+# importing an agent does not pay for them until the Gmail tool is actually used.
 
 # Define the scope for read-only access to Gmail.
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
-def get_most_recent_email():
-    """Get the subject and snippet of the most recent email."""
-    creds = None
-    # token.json stores the user's access and refresh tokens.
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    # If there are no (valid) credentials, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+TOKEN_PATH = 'token.json'
+CREDENTIALS_PATH = 'credentials.json'
+# Local copy of the Gmail discovery document, so the client is built without a fetch.
+DISCOVERY_PATH = os.getenv('GMAIL_DISCOVERY_PATH', 'gmail_discovery.json')
+# Refresh the access token this many seconds before it expires.
+REFRESH_MARGIN = 300
+# Send API calls to another server, such as the local stand-in in fake_services.py; no login is done then.
+API_ENDPOINT = os.getenv('GMAIL_API_ENDPOINT')
+
+class GmailService:
+    """Long-lived, thread-safe holder for the Gmail client and its credentials.
+
+    The discovery client is built once and shared. httplib2 connections are
+    not thread-safe, so each thread gets its own authorized connection. A
+    background thread refreshes the token ahead of expiry, and token.json is
+    only rewritten when the token actually changes.
+    """
+
+    def __init__(self, token_path=TOKEN_PATH, credentials_path=CREDENTIALS_PATH,
+                 discovery_path=DISCOVERY_PATH, refresh_margin=REFRESH_MARGIN):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.discovery_path = discovery_path
+        self.refresh_margin = refresh_margin
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._creds = None
+        self._service = None
+        self._saved_token = None
+        self._refresher = None
+        self._stop = threading.Event()
+
+    @property
+    def service(self):
+        """The shared Gmail discovery client, built on first use."""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    with span('gmail.build'):
+                        self._creds = self._load_credentials()
+                        self._service = self._build_service(self._creds)
+                    self._start_refresher()
+        return self._service
+
+    def execute(self, request):
+        """Execute a request built from `service` on this thread's connection."""
+        self.service  # load credentials and build the client on first use
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            http = AuthorizedHttp(self._creds, http=httplib2.Http())
+            self._local.http = http
+        with span('gmail.execute', request=getattr(request, 'methodId', None) or type(request).__name__):
+            return request.execute(http=http)
+
+    def close(self):
+        """Stop the background refresher."""
+        self._stop.set()
+
+    def _load_credentials(self):
+        if API_ENDPOINT:
+            from google.auth.credentials import AnonymousCredentials
+            return AnonymousCredentials()
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        creds = None
+        # token.json stores the user's access and refresh tokens.
+        if os.path.exists(self.token_path):
+            with open(self.token_path) as token:
+                self._saved_token = token.read()
+            creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+        # If there are no (valid) credentials, let the user log in.
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                # This will open a browser window for authentication.
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+            self._save_token(creds)
+        return creds
+
+    def _save_token(self, creds):
+        """Write token.json only when its contents would change."""
+        token_json = creds.to_json()
+        if token_json != self._saved_token:
+            with open(self.token_path, 'w') as token:
+                token.write(token_json)
+            self._saved_token = token_json
+
+    def _build_service(self, creds):
+        from googleapiclient.discovery import build, build_from_document
+        from googleapiclient.discovery_cache import get_static_doc
+        doc = None
+        if os.path.exists(self.discovery_path):
+            with open(self.discovery_path, encoding='utf-8') as f:
+                doc = f.read()
         else:
-            # This will open a browser window for authentication.
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run.
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    
-    # Build the Gmail service.
-    service = build('gmail', 'v1', credentials=creds)
-    
-    # List messages with maxResults=1 to get the most recent email.
-    results = service.users().messages().list(userId='me', maxResults=1).execute()
-    messages = results.get('messages', [])
-    if not messages:
+            doc = get_static_doc('gmail', 'v1')
+            if doc:
+                with open(self.discovery_path, 'w', encoding='utf-8') as f:
+                    f.write(doc)
+        if doc and API_ENDPOINT:
+            # Batch requests are sent to rootUrl, so the document itself is pointed at the endpoint.
+            import json
+            desc = json.loads(doc)
+            desc['rootUrl'] = API_ENDPOINT.rstrip('/') + '/'
+            desc['baseUrl'] = desc['rootUrl'] + desc['servicePath']
+            doc = json.dumps(desc)
+        if doc:
+            return build_from_document(doc, credentials=creds)
+        return build('gmail', 'v1', credentials=creds)
+
+    def _start_refresher(self):
+        if getattr(self._creds, 'refresh_token', None) and self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name='gmail-token-refresh', daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        from google.auth.transport.requests import Request
+        while not self._stop.is_set():
+            expiry = self._creds.expiry
+            if expiry is None:
+                return
+            # google-auth stores expiry as a naive UTC datetime.
+            wait = (expiry - timedelta(seconds=self.refresh_margin) - datetime.utcnow()).total_seconds()
+            if wait > 0 and self._stop.wait(wait):
+                return
+            try:
+                with self._lock:
+                    self._creds.refresh(Request())
+                    self._save_token(self._creds)
+            except Exception as e:
+                print(f"Error refreshing Gmail token: {str(e)}")
+                # Retry later rather than spinning on a failing refresh.
+                if self._stop.wait(60):
+                    return
+
+# Shared service holder; nothing is loaded until the first call.
+gmail_service = GmailService()
+
+# Headers requested with format='metadata'; the body is never downloaded.
+METADATA_HEADERS = ['Subject', 'From', 'Date']
+# Gmail accepts at most 100 calls in one batch request.
+MAX_BATCH_SIZE = 100
+
+def _parse_metadata(message):
+    """Turn a format='metadata' message resource into a flat dict."""
+    headers = {h.get('name'): h.get('value') for h in message.get('payload', {}).get('headers', [])}
+    return {
+        'id': message.get('id'),
+        'thread_id': message.get('threadId'),
+        'internal_date': int(message.get('internalDate', 0)),
+        'label_ids': message.get('labelIds', []),
+        'subject': headers.get('Subject', 'No subject found'),
+        'from': headers.get('From', ''),
+        'date': headers.get('Date', ''),
+        'snippet': message.get('snippet', 'No snippet available'),
+    }
+
+def fetch_email_metadata(message_ids):
+    """Fetch metadata for the given message ids, batching the messages.get calls.
+
+    Messages that fail to load (e.g. deleted in the meantime) are skipped.
+    The result keeps the order of `message_ids`.
+    """
+    service = gmail_service.service
+    emails = {}
+    def collect(request_id, response, exception):
+        if exception is not None:
+            print(f"Error fetching message {request_id}: {str(exception)}")
+            return
+        emails[request_id] = _parse_metadata(response)
+
+    def metadata_request(message_id):
+        return service.users().messages().get(
+            userId='me', id=message_id, format='metadata', metadataHeaders=METADATA_HEADERS
+        )
+
+    if len(message_ids) == 1:
+        # A single message is cheaper without the multipart batch envelope.
+        from googleapiclient.errors import HttpError
+        try:
+            response, exception = gmail_service.execute(metadata_request(message_ids[0])), None
+        except HttpError as e:
+            response, exception = None, e
+        collect(message_ids[0], response, exception)
+    else:
+        for start in range(0, len(message_ids), MAX_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=collect)
+            for message_id in message_ids[start:start + MAX_BATCH_SIZE]:
+                batch.add(metadata_request(message_id), request_id=message_id)
+            gmail_service.execute(batch)
+
+    return [emails[i] for i in message_ids if i in emails]
+
+def get_recent_emails(count=10):
+    """Get the subject, sender, date and snippet of the `count` most recent emails.
+
+    The messages.get calls for all messages go out in one batch HTTP request.
+    """
+    service = gmail_service.service
+    results = gmail_service.execute(service.users().messages().list(userId='me', maxResults=count))
+    return fetch_email_metadata([m['id'] for m in results.get('messages', [])])
+
+def format_emails(emails):
+    """Format a list of emails from get_recent_emails for display."""
+    if not emails:
         return "No messages found."
-        
-    # Get the ID of the most recent message.
-    message_id = messages[0]['id']
-    # Retrieve the message details.
-    message = service.users().messages().get(userId='me', id=message_id, format='full').execute()
-    
-    # Extract some useful details: snippet and subject.
-    snippet = message.get('snippet', 'No snippet available')
-    
-    subject = "No subject found"
-    headers = message.get('payload', {}).get('headers', [])
-    for header in headers:
-        if header.get('name') == 'Subject':
-            subject = header.get('value')
-            break
-    
-    # Return the formatted result
-    return f"Most Recent Email:\nSubject: {subject}\nSnippet: {snippet}"
+    if len(emails) == 1:
+        return f"Most Recent Email:\nSubject: {emails[0]['subject']}\nSnippet: {emails[0]['snippet']}"
+    lines = [f"{len(emails)} Most Recent Emails:"]
+    for number, email in enumerate(emails, start=1):
+        lines.append(f"{number}. {email['subject']} - {email['from']} ({email['date']})\n   {email['snippet']}")
+    return "\n".join(lines)
+
+def get_most_recent_email():
+    """Get the subject and snippet of the most recent email."""
+    return format_emails(get_recent_emails(1))
 
 if __name__ == '__main__':
-    print(get_most_recent_email())
\ No newline at end of file
+    print(get_most_recent_email())
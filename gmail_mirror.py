@@ -0,0 +1,211 @@
+# gmail_mirror.py
+import json
+import os
+import sqlite3
+import threading
+from gmail_helper import fetch_email_metadata, get_recent_emails, gmail_service
+from tracing import traced
+
+MIRROR_PATH = os.getenv('GMAIL_MIRROR_DB', 'gmail_mirror.db')
+# How many of the newest messages a full resync mirrors.
+FULL_SYNC_SIZE = int(os.getenv('GMAIL_MIRROR_SIZE', '200'))
+# Seconds between background syncs.
+REFRESH_INTERVAL = float(os.getenv('GMAIL_MIRROR_REFRESH', '60'))
+# Messages with these labels are not part of the mailbox view.
+HIDDEN_LABELS = {'SPAM', 'TRASH'}
+
+class GmailMirror:
+    """Local SQLite mirror of recent Gmail message metadata.
+
+    After the first full sync, changes are pulled incrementally with
+    users.history.list from the last stored historyId. Gmail only keeps
+    history for a limited time; when it has expired (HTTP 404) the mirror
+    falls back to a full resync. Reads never touch the network; `ready` is
+    set once the mirror has synced in this process.
+    """
+
+    def __init__(self, path=MIRROR_PATH, full_sync_size=FULL_SYNC_SIZE):
+        self.path = path
+        self.full_sync_size = full_sync_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id TEXT PRIMARY KEY, thread_id TEXT, internal_date INTEGER NOT NULL,"
+            " subject TEXT, sender TEXT, date TEXT, snippet TEXT, label_ids TEXT);"
+            "CREATE INDEX IF NOT EXISTS messages_by_date ON messages (internal_date DESC);"
+            "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);"
+        )
+        self._conn.commit()
+        self._refresher = None
+        self._stop = threading.Event()
+        self.ready = threading.Event()
+
+    @property
+    def history_id(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = 'history_id'").fetchone()
+        return row[0] if row else None
+
+    @traced('gmail.sync')
+    def sync(self):
+        """Bring the mirror up to date, incrementally when possible."""
+        if self.history_id is None:
+            self.full_sync()
+        else:
+            self.incremental_sync()
+        self.ready.set()
+
+    def full_sync(self):
+        service = gmail_service.service
+        # Read the historyId first so changes made during the sync are replayed next time.
+        history_id = gmail_service.execute(service.users().getProfile(userId='me'))['historyId']
+        results = gmail_service.execute(
+            service.users().messages().list(userId='me', maxResults=self.full_sync_size)
+        )
+        emails = fetch_email_metadata([m['id'] for m in results.get('messages', [])])
+        with self._lock:
+            self._conn.execute("DELETE FROM messages")
+            self._store(emails)
+            self._set_history_id(history_id)
+            self._conn.commit()
+
+    def incremental_sync(self):
+        """Replay the changes since the stored historyId, or resync fully if Gmail no longer has them.
+
+        Only a 404 from history.list means the history has expired. A message
+        deleted before its metadata is fetched is skipped by
+        fetch_email_metadata and dropped from the mirror.
+        """
+        from googleapiclient.errors import HttpError
+        service = gmail_service.service
+        added, removed = set(), set()
+        history_id = self.history_id
+        page_token = None
+        while True:
+            try:
+                response = gmail_service.execute(service.users().history().list(
+                    userId='me', startHistoryId=history_id, pageToken=page_token,
+                    historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'],
+                ))
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                # The stored historyId is too old; start over.
+                self.full_sync()
+                return
+            for record in response.get('history', []):
+                for change in record.get('messagesAdded', []) + record.get('labelsRemoved', []):
+                    message_id = change['message']['id']
+                    added.add(message_id)
+                    removed.discard(message_id)
+                for change in record.get('messagesDeleted', []):
+                    message_id = change['message']['id']
+                    removed.add(message_id)
+                    added.discard(message_id)
+                for change in record.get('labelsAdded', []):
+                    if HIDDEN_LABELS.intersection(change.get('labelIds', [])):
+                        removed.add(change['message']['id'])
+                        added.discard(change['message']['id'])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+
+        emails = fetch_email_metadata(sorted(added)) if added else []
+        # Messages that could not be fetched have been deleted since; hidden ones are dropped too.
+        removed.update(added - {e['id'] for e in emails})
+        removed.update(e['id'] for e in emails if HIDDEN_LABELS.intersection(e['label_ids']))
+        with self._lock:
+            self._conn.executemany("DELETE FROM messages WHERE id = ?", [(i,) for i in removed])
+            self._store(emails)
+            self._conn.execute(
+                "DELETE FROM messages WHERE id NOT IN ("
+                "SELECT id FROM messages ORDER BY internal_date DESC LIMIT ?)",
+                (self.full_sync_size,),
+            )
+            self._set_history_id(response.get('historyId', history_id))
+            self._conn.commit()
+
+    def recent(self, count=1):
+        """Return the `count` newest mirrored messages, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, thread_id, internal_date, subject, sender, date, snippet, label_ids"
+                " FROM messages ORDER BY internal_date DESC LIMIT ?",
+                (count,),
+            ).fetchall()
+        return [
+            {
+                'id': row[0], 'thread_id': row[1], 'internal_date': row[2], 'subject': row[3],
+                'from': row[4], 'date': row[5], 'snippet': row[6], 'label_ids': json.loads(row[7]),
+            }
+            for row in rows
+        ]
+
+    def start_background_refresh(self, interval=REFRESH_INTERVAL):
+        """Sync now and then every `interval` seconds on a daemon thread."""
+        if self._refresher is not None:
+            return
+        self._refresher = threading.Thread(
+            target=self._refresh_loop, args=(interval,), name='gmail-mirror-refresh', daemon=True
+        )
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self, interval):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error syncing Gmail mirror: {str(e)}")
+            if self._stop.wait(interval):
+                return
+
+    def _store(self, emails):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO messages"
+            " (id, thread_id, internal_date, subject, sender, date, snippet, label_ids)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (e['id'], e['thread_id'], e['internal_date'], e['subject'], e['from'],
+                 e['date'], e['snippet'], json.dumps(e['label_ids']))
+                for e in emails
+                if not HIDDEN_LABELS.intersection(e['label_ids'])
+            ],
+        )
+
+    def _set_history_id(self, history_id):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('history_id', ?)", (str(history_id),)
+        )
+
+# Shared mirror; the database file is opened lazily on first use.
+_mirror = None
+_mirror_lock = threading.Lock()
+
+def get_mirror():
+    """Return the shared mirror, starting its first sync and the refresher in the background on first use.
+
+    A full sync of FULL_SYNC_SIZE messages takes a while, so the first
+    request does not wait for it; see recent_emails().
+    """
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            mirror = GmailMirror()
+            mirror.start_background_refresh()
+            _mirror = mirror
+    return _mirror
+
+def recent_emails(count=1):
+    """The `count` newest messages: from the mirror once it has synced, else from the Gmail API."""
+    mirror = get_mirror()
+    if mirror.ready.is_set():
+        return mirror.recent(count)
+    return get_recent_emails(count)
+
+if __name__ == '__main__':
+    for email in recent_emails(5):
+        print(f"{email['subject']} - {email['from']}")
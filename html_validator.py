@@ -0,0 +1,296 @@
+# html_validator.py
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+VOID_ELEMENTS = frozenset(
+    "area base br col embed hr img input link meta param source track wbr".split()
+)
+# Elements whose content is raw text, so tags inside them are not markup.
+RAW_TEXT_END = {
+    "script": re.compile(r"</script\s*>", re.IGNORECASE),
+    "style": re.compile(r"</style\s*>", re.IGNORECASE),
+}
+# Keep reporting imbalance up to this many diagnostics, then stop adding more.
+MAX_WARNINGS = 20
+
+_TOKEN = re.compile(
+    r"<!--"
+    r"|<!(?P<decl>[^>]*)>"
+    r"|<(?P<close>/?)(?P<tag>[a-zA-Z][a-zA-Z0-9:-]*)(?P<attrs>(?:[^>\"']|\"[^\"]*\"|'[^']*')*)>"
+)
+_DOCTYPE = re.compile(r"doctype\s+html\b", re.IGNORECASE)
+_TAG_START = re.compile(r"/?[a-zA-Z]")
+# Inside a tag, only these end it or start a quoted attribute value.
+_TAG_DELIMITER = re.compile(r"[>\"']")
+# The end of a raw-text chunk that may still become its end tag, e.g. "</scr".
+_PARTIAL_END_TAG = re.compile(r"<(?:/[a-zA-Z]*\s*)?\Z")
+
+class Diagnostic(NamedTuple):
+    """One problem found in a document."""
+    code: str
+    message: str
+    fatal: bool
+    offset: int
+
+class IncrementalHTMLValidator:
+    """Single-pass HTML checker that can be fed a document in chunks.
+
+    Tracks the DOCTYPE, the <html> open and close tags, the number of
+    <script> tags and the balance of open tags. Script and style bodies are
+    skipped as raw text. A token cut off at the end of a chunk is held back
+    from its "<", and the scan of it resumes where it stopped (quote state
+    included), so each character is scanned once however the document is
+    split. After the first fatal problem (a second <script> tag) the
+    validator stops scanning. close() adds the end-of-document checks and
+    returns every diagnostic.
+    """
+
+    def __init__(self):
+        self.diagnostics: List[Diagnostic] = []
+        self.script_count = 0
+        self.has_doctype = False
+        self.has_html_open = False
+        self.has_html_close = False
+        self.fatal: Optional[Diagnostic] = None
+        self._stack: List[str] = []
+        self._buffer = ""
+        self._consumed = 0
+        # None, "comment", or the raw-text element we are inside.
+        self._state: Optional[str] = None
+        # (scan offset, open quote) of the unfinished tag at the start of the buffer.
+        self._resume: Optional[Tuple[int, Optional[str]]] = None
+        self._warnings = 0
+
+    def feed(self, chunk: str) -> Optional[Diagnostic]:
+        """Scan a chunk. Returns the fatal diagnostic once one has been found."""
+        if self.fatal is not None:
+            return self.fatal
+        self._buffer += chunk
+        self._scan(final=False)
+        return self.fatal
+
+    def _scan(self, final: bool) -> None:
+        buffer = self._buffer
+        pos = 0
+        keep_from = None
+        while self.fatal is None:
+            if self._state == "comment":
+                end = buffer.find("-->", pos)
+                if end == -1:
+                    keep_from = max(pos, len(buffer) - 2)
+                    break
+                pos = end + 3
+                self._state = None
+                continue
+            if self._state is not None:
+                match = RAW_TEXT_END[self._state].search(buffer, pos)
+                if match is None:
+                    partial = _PARTIAL_END_TAG.search(buffer, pos)
+                    keep_from = partial.start() if partial else len(buffer)
+                    break
+                pos = match.end()
+                self._end_tag(self._state, self._consumed + match.start())
+                self._state = None
+                continue
+            if not (pos == 0 and self._resume):
+                # Fast path: the next token, when no "<" before it could be an unfinished tag around it.
+                match = _TOKEN.search(buffer, pos)
+                if match is not None and buffer.find("<", pos, match.start()) == -1:
+                    pos = match.end()
+                    self._token(match)
+                    continue
+            start = buffer.find("<", pos)
+            if start == -1:
+                pos = len(buffer)
+                break
+            end = self._token_end(buffer, start, final)
+            if end is None:
+                # An unfinished token may still be completed by the next chunk.
+                keep_from = start
+                break
+            match = _TOKEN.match(buffer, start, end) if end != -1 else None
+            if match is None:
+                pos = start + 1
+                continue
+            pos = match.end()
+            self._token(match)
+        if keep_from is None:
+            keep_from = pos
+        self._consumed += keep_from
+        self._buffer = buffer[keep_from:]
+
+    def _token_end(self, buffer: str, start: int, final: bool) -> Optional[int]:
+        """Where the token at `start` ends: -1 if no token starts there, None if it is unfinished.
+
+        Reads tags the way _TOKEN does: the first ">" outside a quoted
+        attribute value ends them. When the buffer runs out first, the scan
+        position and open quote are saved in _resume for the next chunk. At
+        the end of the document (final) an unfinished token is not a token.
+        """
+        rest = buffer[start:start + 4]
+        if len(rest) < 4 and "<!--".startswith(rest) or rest == "</":
+            return -1 if final else None
+        if rest == "<!--":
+            return start + 4
+        declaration = rest[1] == "!"
+        if not declaration and not _TAG_START.match(buffer, start + 1):
+            return -1
+        scan, quote = (start + self._resume[0], self._resume[1]) if start == 0 and self._resume else (start + 1, None)
+        self._resume = None
+        while True:
+            if quote:
+                close = buffer.find(quote, scan)
+                if close == -1:
+                    break
+                scan, quote = close + 1, None
+                continue
+            found = buffer.find(">", scan) if declaration else _TAG_DELIMITER.search(buffer, scan)
+            if found is None or found == -1:
+                break
+            if declaration:
+                return found + 1
+            if found.group() == ">":
+                return found.end()
+            scan, quote = found.end(), found.group()
+        if final:
+            return -1
+        self._resume = (len(buffer) - start, quote)
+        return None
+
+    def close(self) -> List[Diagnostic]:
+        """Finish the document and return all diagnostics, fatal ones first."""
+        offset = self._consumed + len(self._buffer)
+        if self.fatal is None and self._buffer:
+            self._resume = None
+            self._scan(final=True)
+        if self.fatal is None:
+            if self._state in RAW_TEXT_END:
+                self._warn("unclosed_tag", f"<{self._state}> is never closed.", offset)
+            if not self.has_doctype:
+                self._add("missing_doctype", "Missing <!DOCTYPE html> declaration.", True, offset)
+            if not self.has_html_open:
+                self._add("missing_html_open", "Missing <html> opening tag.", True, offset)
+            if not self.has_html_close:
+                self._add("missing_html_close", "Missing </html> closing tag.", True, offset)
+            for tag in reversed(self._stack):
+                if tag not in ("html", "head", "body"):
+                    self._warn("unclosed_tag", f"<{tag}> is never closed.", offset)
+        self._buffer = ""
+        return sorted(self.diagnostics, key=lambda d: not d.fatal)
+
+    def _token(self, match):
+        offset = self._consumed + match.start()
+        if match.group(0) == "<!--":
+            self._state = "comment"
+        elif match.group("decl") is not None:
+            if _DOCTYPE.match(match.group("decl").strip()):
+                self.has_doctype = True
+        elif match.group("close"):
+            self._end_tag(match.group("tag").lower(), offset)
+        else:
+            self._start_tag(match.group("tag").lower(), match.group("attrs").rstrip().endswith("/"), offset)
+
+    def _start_tag(self, tag: str, self_closing: bool, offset: int):
+        if tag == "html":
+            self.has_html_open = True
+        if tag == "script":
+            self.script_count += 1
+            if self.script_count > 1:
+                self.fatal = self._add("multiple_scripts", "Multiple script tags detected.", True, offset)
+                return
+        if self_closing or tag in VOID_ELEMENTS:
+            return
+        if tag in RAW_TEXT_END:
+            self._state = tag
+        self._stack.append(tag)
+
+    def _end_tag(self, tag: str, offset: int):
+        if tag == "html":
+            self.has_html_close = True
+        if tag in self._stack:
+            while self._stack:
+                open_tag = self._stack.pop()
+                if open_tag == tag:
+                    break
+                self._warn("unclosed_tag", f"<{open_tag}> is closed implicitly by </{tag}>.", offset)
+        elif tag not in VOID_ELEMENTS:
+            self._warn("unexpected_end_tag", f"</{tag}> has no matching opening tag.", offset)
+
+    def _warn(self, code: str, message: str, offset: int):
+        self._warnings += 1
+        if self._warnings <= MAX_WARNINGS:
+            self._add(code, message, False, offset)
+
+    def _add(self, code: str, message: str, fatal: bool, offset: int) -> Diagnostic:
+        diagnostic = Diagnostic(code, message, fatal, offset)
+        self.diagnostics.append(diagnostic)
+        return diagnostic
+
+def check_html(html_content: str) -> List[Diagnostic]:
+    """Validate a whole document in one pass and return its diagnostics."""
+    validator = IncrementalHTMLValidator()
+    validator.feed(html_content)
+    return validator.close()
+
+def summarize(diagnostics: List[Diagnostic]) -> Tuple[bool, str]:
+    """Collapse diagnostics into the (valid, message) pair used by game_maker."""
+    fatal = [d for d in diagnostics if d.fatal]
+    if not fatal:
+        return True, "Basic validation passed."
+    if fatal[0].code == "multiple_scripts":
+        return False, fatal[0].message
+    return False, "Missing essential HTML structure. " + " ".join(d.message for d in fatal)
+
+def _legacy_validate(html_content: str) -> Tuple[bool, str]:
+    """The original HTMLParser plus regex validation, kept for benchmarking."""
+    from html.parser import HTMLParser
+
+    class HTMLValidator(HTMLParser):
+        def __init__(self):
+            super().__init__()
+            self.script_count = 0
+
+        def handle_starttag(self, tag, attrs):
+            if tag.lower() == "script":
+                self.script_count += 1
+
+    validator = HTMLValidator()
+    validator.feed(html_content)
+    if validator.script_count > 1:
+        return False, "Multiple script tags detected."
+    if not re.search(r"<!DOCTYPE html>", html_content, re.IGNORECASE) or \
+       not re.search(r"<html", html_content, re.IGNORECASE) or \
+       not re.search(r"</html>", html_content, re.IGNORECASE):
+        return False, "Missing essential HTML structure."
+    return True, "Basic validation passed."
+
+def _sample_game(sections: int) -> str:
+    body = "".join(
+        f'<div class="panel" id="p{i}"><h2>Level {i}</h2><p>Score: <span>0</span></p>'
+        f'<button onclick="move({i}, \'left\')">Left</button><br><img src="x.png" alt="{i} > 0"></div>\n'
+        for i in range(sections)
+    )
+    script = "".join(f"function f{i}(a, b) {{ if (a < b && b > 0) {{ return '<b>' + a; }} return b; }}\n" for i in range(sections))
+    return (
+        "<!DOCTYPE html>\n<html>\n<head><style>.panel > h2 { color: red; }</style></head>\n"
+        f"<body>\n<!-- game <div> layout -->\n{body}<script>\n{script}</script>\n</body>\n</html>\n"
+    )
+
+if __name__ == "__main__":
+    import timeit
+
+    game = _sample_game(400)
+    chunks = [game[i:i + 7] for i in range(0, len(game), 7)]
+    print(f"Document size: {len(game) / 1024:.0f} KiB")
+
+    for name, fn in (("legacy", lambda: _legacy_validate(game)), ("single-pass", lambda: check_html(game))):
+        seconds = min(timeit.repeat(fn, number=10, repeat=5)) / 10
+        print(f"{name:>12}: {seconds * 1000:.2f} ms per document")
+
+    def stream():
+        validator = IncrementalHTMLValidator()
+        for chunk in chunks:
+            validator.feed(chunk)
+        validator.close()
+    seconds = min(timeit.repeat(stream, number=3, repeat=3)) / 3
+    print(f"{'streamed':>12}: {seconds * 1000:.2f} ms per document in 7-char chunks")
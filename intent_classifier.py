@@ -0,0 +1,175 @@
+# intent_classifier.py
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from router import IntentRouter
+
+# Labelled prompts: one {"text", "label", "split"} object per line, split is "train" or "eval".
+INTENT_DATA = os.getenv("INTENT_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_prompts.jsonl"))
+# Only answer without the LLM agent when the classifier is at least this sure.
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.9"))
+# The label for prompts that need the LLM agent.
+AGENT_LABEL = "Agent"
+
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|[a-z]+|[+\-*/=?,]")
+_WIKI_PREFIX = re.compile(
+    r"^(?:please\s+)?(?:what\s+(?:is|are|was|were)|what's|who\s+(?:is|was)|tell\s+me\s+about|explain|describe|"
+    r"look\s+up|search\s+wikipedia\s+for|wikipedia|wiki|information\s+about|give\s+me\s+a\s+summary\s+of|history\s+of)\s+",
+    re.IGNORECASE,
+)
+# Questions about how or why to do something ask for advice rather than for a tool to run,
+# even when they name one ("how do I make a game in unity"), so they always go to the agent.
+_ADVICE_QUESTION = re.compile(
+    r"^(?:please\s+)?(?:how\s+(?:do|does|did|can|could|should|would|to)|why|which|is\s+it|should|"
+    r"what(?:\s+is|'s)\s+the\s+(?:best|easiest|fastest|right|difference))\b",
+    re.IGNORECASE,
+)
+# Words that describe the request rather than the game itself.
+_GAME_FILLER = frozenset(
+    "a an the me my i we us let's lets can you could please want to play make build create generate write "
+    "design game games simple html html5 in of about where clone".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words and symbols, with numbers collapsed to <num>, plus adjacent bigrams."""
+    words = ["<num>" if w[0].isdigit() else w for w in _TOKEN.findall(text.lower())]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class NaiveBayesIntentClassifier:
+    """Multinomial naive Bayes over word unigrams and bigrams with Laplace smoothing."""
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.labels: List[str] = []
+        self._log_prior: Dict[str, float] = {}
+        self._log_likelihood: Dict[str, Dict[str, float]] = {}
+        self._log_unseen: Dict[str, float] = {}
+
+    def fit(self, examples: Iterable[Tuple[str, str]]) -> "NaiveBayesIntentClassifier":
+        doc_counts: Counter = Counter()
+        token_counts: Dict[str, Counter] = defaultdict(Counter)
+        for text, label in examples:
+            doc_counts[label] += 1
+            token_counts[label].update(tokenize(text))
+        vocabulary = {token for counts in token_counts.values() for token in counts}
+        total_docs = sum(doc_counts.values())
+        self.labels = sorted(doc_counts)
+        for label in self.labels:
+            counts = token_counts[label]
+            denominator = sum(counts.values()) + self.alpha * (len(vocabulary) + 1)
+            self._log_prior[label] = math.log(doc_counts[label] / total_docs)
+            self._log_likelihood[label] = {
+                token: math.log((count + self.alpha) / denominator) for token, count in counts.items()
+            }
+            self._log_unseen[label] = math.log(self.alpha / denominator)
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        tokens = tokenize(text)
+        scores = {}
+        for label in self.labels:
+            likelihood = self._log_likelihood[label]
+            unseen = self._log_unseen[label]
+            scores[label] = self._log_prior[label] + sum(likelihood.get(token, unseen) for token in tokens)
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exp.values())
+        return {label: value / total for label, value in exp.items()}
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        """Return the most likely label and its probability."""
+        probabilities = self.predict_proba(text)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+def load_examples(path: str = INTENT_DATA, split: Optional[str] = None) -> List[Tuple[str, str]]:
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if split is None or row.get("split") == split:
+                    examples.append((row["text"], row["label"]))
+    return examples
+
+def extract_input(label: str, message: str) -> Optional[str]:
+    """Turn the message into the tool input the agent would have chosen, or None if unclear."""
+    if label == "Calculator":
+        return message
+    if label == "WikipediaTool":
+        topic = _WIKI_PREFIX.sub("", message.strip()).strip(" ?.!")
+        return topic or None
+    if label == "GameGenerator":
+        words = [w for w in re.findall(r"[\w'-]+", message.lower()) if w not in _GAME_FILLER]
+        return " ".join(words) or None
+    return None
+
+_classifier: Optional[NaiveBayesIntentClassifier] = None
+_router = IntentRouter()
+_lock = threading.Lock()
+
+def get_classifier() -> NaiveBayesIntentClassifier:
+    """Train on the shipped prompts on first use; that takes a few milliseconds."""
+    global _classifier
+    with _lock:
+        if _classifier is None:
+            _classifier = NaiveBayesIntentClassifier().fit(load_examples(split="train"))
+        return _classifier
+
+def predict_tool(message: str, threshold: float = INTENT_THRESHOLD) -> Optional[Tuple[str, str]]:
+    """Return (tool name, tool input) when the message can skip the LLM agent, else None."""
+    # Compound requests need the agent to chain several tools.
+    if _ADVICE_QUESTION.match(message.strip()) or len(_router.route_all(message)) > 1:
+        return None
+    label, confidence = get_classifier().classify(message)
+    if label == AGENT_LABEL or confidence < threshold:
+        return None
+    tool_input = extract_input(label, message)
+    return (label, tool_input) if tool_input else None
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Evaluate the intent pre-router on the labelled eval split.")
+    parser.add_argument("--threshold", type=float, default=INTENT_THRESHOLD)
+    # A ReAct run needs at least one call to pick the tool and one to phrase the answer.
+    parser.add_argument("--llm-calls", type=int, default=2, help="LLM calls per agent run that a shortcut saves")
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="assumed seconds per gpt-4o call")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    classifier = get_classifier()
+    train_ms = (time.perf_counter() - start) * 1000
+    examples = load_examples(split="eval")
+
+    correct = shortcut = wrong_shortcut = 0
+    start = time.perf_counter()
+    for text, label in examples:
+        predicted, _ = classifier.classify(text)
+        correct += predicted == label
+        routed = predict_tool(text, args.threshold)
+        if routed is not None:
+            shortcut += 1
+            if routed[0] != label:
+                wrong_shortcut += 1
+                print(f"  wrong shortcut: {text!r} -> {routed[0]} (labelled {label})")
+    per_prompt_ms = (time.perf_counter() - start) * 1000 / len(examples)
+
+    calls_saved = shortcut * args.llm_calls
+    print(json.dumps({
+        "eval_prompts": len(examples),
+        "accuracy": round(correct / len(examples), 3),
+        "threshold": args.threshold,
+        "short_circuited": shortcut,
+        "wrong_short_circuits": wrong_shortcut,
+        "llm_calls_saved": calls_saved,
+        "llm_calls_saved_per_prompt": round(calls_saved / len(examples), 2),
+        "estimated_seconds_saved": round(calls_saved * args.llm_latency, 1),
+        "classifier_ms_per_prompt": round(per_prompt_ms, 3),
+        "training_ms": round(train_ms, 1),
+    }, indent=2))
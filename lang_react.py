@@ -1,47 +1,59 @@
 import os
+from typing import Optional
 from langchain.agents import initialize_agent, Tool, AgentType
 from langchain_openai import ChatOpenAI
+from langchain_core.caches import BaseCache
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.load import dumps, loads
 from dotenv import load_dotenv
-from game_maker import make_game
-from wiki import wiki_summary
+from game_maker import game_created, make_game
+from wiki import local_summary, wiki_summary
+import arithmetic
+from chat_stream import emit, stream_events
+from llm_client import langchain_client_kwargs
+from cache import MISSING
+from llm_cache import response_cache
+from intent_classifier import predict_tool
+from memory import get_memory
+from tracing import is_enabled as tracing_enabled, span, start_span
+from resilience import Guard, request_budget
+from tool_registry import GAME_TIMEOUT, WIKI_TIMEOUT
 
 # Load environment variables
 load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
+# Answer clear single-tool prompts locally instead of through the ReAct loop (set INTENT_PREROUTER=0 to disable)
+INTENT_PREROUTER = os.getenv("INTENT_PREROUTER", "1") != "0"
 
 # Define Tools
 def generate_game(game_name: str):
     result = make_game(game_name.lower())
-    if result == "Successfully created game":
-        return f"Game '{game_name}' created successfully!"
-    else:
-        return f"Failed to create game '{game_name}'."
+    if not game_created(result):
+        return f"Error: Failed to create game '{game_name}'."
+    # With the browser off (server, batch runs) the game is only saved to a file
+    saved = f" Saved as {result}." if result.endswith(".html") else ""
+    return f"Game '{game_name}' created successfully!{saved}"
 
 def calculator(input_string: str):
     try:
-        if ',' in input_string:
-            numbers = [int(num.strip()) for num in input_string.split(',')]
-        elif '+' in input_string:
-            numbers = [int(''.join(filter(str.isdigit, part))) for part in input_string.split('+')]
-        else:
-            return "Could not parse two numbers clearly."
-        
-        if len(numbers) != 2:
-            return "Provide exactly two numbers."
-        return f"The sum of {numbers[0]} and {numbers[1]} is {numbers[0] + numbers[1]}."
-    except:
-        return "Please provide two valid integers separated by a comma or '+' sign."
+        return arithmetic.answer(input_string)
+    except arithmetic.ExpressionError as e:
+        return str(e)
 
 def get_wiki_summary(query: str):
     """Get a summary from Wikipedia for the given query."""
     return wiki_summary(query)
 
+# The network tools get deadlines and share circuit breakers with the other agents
+generate_game = Guard("GameGenerator", generate_game, GAME_TIMEOUT)
+get_wiki_summary = Guard("WikiTool", get_wiki_summary, WIKI_TIMEOUT, fallback=local_summary)
+
 # Define tools explicitly with clear descriptions
 tools = [
     Tool(
         name="Calculator",
         func=calculator,
-        description="Perform addition when exactly two numbers are provided, e.g., 'calculate 2+2'.",
+        description="Add numbers or evaluate arithmetic with + - * / ** and parentheses, e.g., '2+2' or '(3 + 4) * 2'.",
     ),
     Tool(
         name="GameGenerator",
@@ -55,8 +67,37 @@ tools = [
     ),
 ]
 
+# Serve repeated LLM calls from the shared response cache
+class ResponseCache(BaseCache):
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        return response_cache.make_key([{"role": "prompt", "content": prompt}], {"llm": llm_string})
+
+    def lookup(self, prompt: str, llm_string: str):
+        if not self.enabled:
+            return None
+        cached = response_cache.get(self._key(prompt, llm_string))
+        return None if cached is MISSING else [loads(generation) for generation in cached]
+
+    def update(self, prompt: str, llm_string: str, return_val):
+        if self.enabled:
+            response_cache.set(self._key(prompt, llm_string), [dumps(generation) for generation in return_val])
+
+    def clear(self, **kwargs):
+        response_cache.clear()
+
 # Load environment variables and initialize the OpenAI Chat Model
-llm = ChatOpenAI(api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4o")
+# The model samples at its default temperature, so its steps are only cached with LLM_CACHE_SAMPLING=1.
+LLM_PARAMS = {"model": "gpt-4o"}
+llm = ChatOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    streaming=True,
+    cache=ResponseCache(response_cache.should_cache(LLM_PARAMS)),
+    **LLM_PARAMS,
+    **langchain_client_kwargs(),
+)
 
 # Initialize the Structured ReAct-style agent for multiple tool calls
 agent = initialize_agent(
@@ -68,10 +109,96 @@ agent = initialize_agent(
     verbose=True,
 )
 
+# Forward the agent's callbacks to a streamed chat
+class ChatEventHandler(BaseCallbackHandler):
+    def on_llm_new_token(self, token: str, **kwargs):
+        emit("token", content=token)
+
+    def on_tool_start(self, serialized: dict, input_str: str, **kwargs):
+        emit("tool_start", tool=serialized.get("name"), input=input_str)
+
+    def on_tool_end(self, output, **kwargs):
+        emit("tool_end", tool=kwargs.get("name"), output=str(output))
+
+# Time each ReAct step (LLM call or tool run) as a span of the current chat's trace
+class TracingCallbackHandler(BaseCallbackHandler):
+    def __init__(self):
+        self.spans = {}
+        self.iterations = 0
+
+    def on_chat_model_start(self, serialized: dict, messages, *, run_id, **kwargs):
+        self.iterations += 1
+        self.spans[run_id] = start_span("react.llm", iteration=self.iterations)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self.spans.pop(run_id, None)
+        if span is not None:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            span.set(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
+            span.end()
+
+    def on_tool_start(self, serialized: dict, input_str: str, *, run_id, **kwargs):
+        self.spans[run_id] = start_span(f"tool.{serialized.get('name')}", input=input_str[:200])
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        span = self.spans.pop(run_id, None)
+        if span is not None:
+            span.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        span = self.spans.pop(run_id, None)
+        if span is not None:
+            span.end(error)
+
+    on_tool_error = on_llm_error
+
+# Tools the local pre-router may call directly
+direct_tools = {"Calculator": calculator, "WikipediaTool": get_wiki_summary, "GameGenerator": generate_game}
+
+def direct_answer(prompt: str):
+    """Run the tool for a confidently classified prompt, or return None to use the agent."""
+    if not INTENT_PREROUTER:
+        return None
+    routed = predict_tool(prompt)
+    if routed is None:
+        return None
+    tool_name, tool_input = routed
+    output = None
+    if tool_name == "Calculator":
+        # Leave requests the calculator cannot parse for the agent to reformat
+        try:
+            output = arithmetic.answer(tool_input)
+        except arithmetic.ExpressionError:
+            return None
+    emit("tool_start", tool=tool_name, input=tool_input)
+    if output is None:
+        with span(f"tool.{tool_name}", input=tool_input[:200], prerouted=True):
+            output = direct_tools[tool_name](tool_input)
+    emit("tool_end", tool=tool_name, output=output)
+    return output
+
 # Chat function to interact with agent
-def chat(prompt: str) -> str:
-    result = agent.invoke({"input": prompt})
-    return result.get("output", "No valid response.")
+def chat(prompt: str, session_id: Optional[str] = None, callbacks: Optional[list] = None) -> str:
+    memory = get_memory(session_id) if session_id else None
+    with span("chat", agent="lang_react", prompt_chars=len(prompt)) as chat_span, request_budget():
+        answer = direct_answer(prompt)
+        chat_span.set(prerouted=answer is not None)
+        if answer is None:
+            # The agent sees the conversation summary and recent turns ahead of the prompt
+            agent_input = memory.prompt(prompt) if memory else prompt
+            callbacks = (callbacks or []) + ([TracingCallbackHandler()] if tracing_enabled() else [])
+            result = agent.invoke({"input": agent_input}, config={"callbacks": callbacks})
+            answer = result.get("output", "No valid response.")
+    if memory:
+        memory.add_exchange(prompt, answer)
+    return answer
+
+def _chat_with_events(prompt: str, session_id: Optional[str] = None) -> str:
+    return chat(prompt, session_id, callbacks=[ChatEventHandler()])
+
+# Streaming variant for the UI: yields tool events and LLM tokens, then the final answer
+def chat_stream(prompt: str, session_id: Optional[str] = None):
+    return stream_events(_chat_with_events, prompt, session_id)
 
 # Run the agent interactively
 if __name__ == "__main__":
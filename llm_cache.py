@@ -0,0 +1,99 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+from typing import Any, Optional, Sequence
+from cache import MISSING, SQLiteCache, TieredCache, TTLCache
+
+# Cache settings. Set LLM_CACHE_DB to a file path to keep responses across restarts.
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+# Sampled (temperature > 0) completions are only cached when this is set.
+LLM_CACHE_SAMPLING = os.getenv("LLM_CACHE_SAMPLING", "0") != "0"
+
+# Request fields that do not change what the model returns.
+IGNORED_PARAMS = frozenset({"stream", "stream_options", "user", "timeout", "extra_headers"})
+
+def normalize_text(text: str) -> str:
+    """Trim whitespace at the edges of a message and unify line endings.
+
+    Whitespace inside a message is kept: an HTML document sent for review
+    with different indentation needs its own answer, since search/replace
+    edits must match it exactly.
+    """
+    return text.replace("\r\n", "\n").strip()
+
+def normalize_messages(messages: Sequence[dict]) -> list:
+    normalized = []
+    for message in messages:
+        content = message.get("content") or ""
+        if not isinstance(content, str):
+            content = json.dumps(content, sort_keys=True)
+        normalized.append({"role": message.get("role", "user"), "content": normalize_text(content)})
+    return normalized
+
+def is_deterministic(params: dict) -> bool:
+    """Only temperature 0 asks for a repeatable answer; the API default samples."""
+    return params.get("temperature") == 0
+
+class LLMResponseCache:
+    """Cache of LLM completions keyed by model, parameters and normalized messages.
+
+    Temperature 0 calls are cached by default. Sampling calls are cached only
+    when cache_sampling is set or the caller passes use_cache=True, because
+    caching them would make every "random" answer the same.
+    """
+
+    def __init__(self, backend: Any, cache_sampling: bool = LLM_CACHE_SAMPLING):
+        self.backend = backend
+        self.cache_sampling = cache_sampling
+        self.skipped = 0
+
+    @staticmethod
+    def make_key(messages: Sequence[dict], params: dict) -> str:
+        payload = json.dumps(
+            {
+                "messages": normalize_messages(messages),
+                "params": {k: v for k, v in params.items() if k not in IGNORED_PARAMS},
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def should_cache(self, params: dict, use_cache: Optional[bool] = None) -> bool:
+        if use_cache is not None:
+            return use_cache
+        return self.cache_sampling or is_deterministic(params)
+
+    def lookup(self, messages: Sequence[dict], params: dict, use_cache: Optional[bool] = None) -> Optional[str]:
+        """Return the cached completion text for a chat request, or None."""
+        if not self.should_cache(params, use_cache):
+            self.skipped += 1
+            return None
+        cached = self.backend.get(self.make_key(messages, params))
+        return None if cached is MISSING else cached
+
+    def store(self, messages: Sequence[dict], params: dict, content: str,
+              use_cache: Optional[bool] = None) -> None:
+        if content and self.should_cache(params, use_cache):
+            self.backend.set(self.make_key(messages, params), content)
+
+    def get(self, key: str) -> Any:
+        return self.backend.get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        self.backend.set(key, value)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return {"skipped": self.skipped, **self.backend.stats()}
+
+response_cache = LLMResponseCache(TieredCache(
+    TTLCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL),
+    SQLiteCache(LLM_CACHE_DB, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES) if LLM_CACHE_DB else None,
+))
@@ -0,0 +1,403 @@
+# llm_client.py
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional
+import httpx
+from dotenv import load_dotenv
+from tracing import NOOP_SPAN, start_span
+from resilience import remaining
+
+# Load environment variables
+load_dotenv()
+
+# Limits shared by every OpenAI call in the process.
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "20"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+# Exponential backoff: a random wait up to BASE * 2**attempt, capped at MAX seconds.
+BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (httpx.ConnectError, httpx.RemoteProtocolError)
+
+class TokenBucket:
+    """Thread-safe token bucket holding at most `per_minute` units, refilled continuously.
+
+    reserve() takes the units right away, even if that drives the bucket
+    negative, and returns how long the caller must wait before it is covered.
+    Sync and async callers can then sleep in their own way while sharing one bucket.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+            self._updated = now
+            # A request larger than the bucket would otherwise never be allowed.
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+class RateLimiter:
+    """Request and token budgets, a concurrency cap and retry counters for the OpenAI API."""
+
+    def __init__(self, rpm: float = OPENAI_RPM, tpm: float = OPENAI_TPM,
+                 max_concurrency: int = OPENAI_MAX_CONCURRENCY, max_retries: int = OPENAI_MAX_RETRIES):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.slots = threading.BoundedSemaphore(max(max_concurrency, 1))
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "retries": 0, "rate_limited": 0, "server_errors": 0,
+                         "connection_errors": 0, "throttled_seconds": 0.0}
+
+    def reserve(self, request: httpx.Request) -> float:
+        """Take one request and the estimated tokens; return the seconds to wait."""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimate_tokens(request)))
+        self.count("throttled_seconds", wait)
+        return wait
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Full-jitter backoff, but never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get("retry-after", 0)))
+            except ValueError:
+                pass
+        return delay
+
+    def should_retry(self, attempt: int, response: Optional[httpx.Response]) -> bool:
+        if response is None:
+            self.count("connection_errors")
+        elif response.status_code == 429:
+            self.count("rate_limited")
+        elif response.status_code >= 500:
+            self.count("server_errors")
+        if attempt >= self.max_retries:
+            return False
+        self.count("retries")
+        return True
+
+    def count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """Rough token cost of a request: about 4 characters per prompt token plus the completion budget."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return 1
+    prompt = body.get("messages") or body.get("prompt") or ""
+    completion = body.get("max_tokens") or body.get("max_completion_tokens") or 256
+    return len(json.dumps(prompt)) // 4 + int(completion)
+
+class _UsageCounter:
+    """Reads token usage out of a completion body as it streams past, for the request's trace span."""
+
+    def __init__(self, span, streamed: bool):
+        self.span = span
+        self.streamed = streamed
+        self.events = 0
+        self._body = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        if self.streamed:
+            self.events += chunk.count(b"data: {")
+        elif len(self._body) < 1 << 20:
+            self._body += chunk
+
+    def finish(self) -> None:
+        if self.streamed:
+            # About one event per token, plus the closing event.
+            self.span.set(completion_tokens=max(self.events - 1, 0))
+        else:
+            try:
+                usage = json.loads(bytes(self._body)).get("usage") or {}
+            except (ValueError, AttributeError):
+                usage = {}
+            if usage:
+                self.span.set(prompt_tokens=usage.get("prompt_tokens"),
+                              completion_tokens=usage.get("completion_tokens"))
+        self.span.end()
+
+def _request_span(request: httpx.Request):
+    """Start the trace span for an API call; returns (span, usage counter or None)."""
+    span = start_span("llm.request", path=request.url.path)
+    if span is NOOP_SPAN:
+        return span, None
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        body = {}
+    streamed = bool(body.get("stream"))
+    prompt = body.get("messages") or body.get("prompt") or ""
+    span.set(model=body.get("model"), stream=streamed, prompt_tokens=len(json.dumps(prompt)) // 4)
+    return span, _UsageCounter(span, streamed)
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees the concurrency slot once the body is closed."""
+
+    def __init__(self, stream, release: Callable[[], None], usage: Optional[_UsageCounter] = None):
+        self._stream = stream
+        self._release = release
+        self._usage = usage
+
+    def __iter__(self):
+        for chunk in self._stream:
+            if self._usage is not None:
+                self._usage.feed(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+            if self._usage is not None:
+                self._usage.finish()
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release: Callable[[], None], usage: Optional[_UsageCounter] = None):
+        self._stream = stream
+        self._release = release
+        self._usage = usage
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            if self._usage is not None:
+                self._usage.feed(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+            if self._usage is not None:
+                self._usage.finish()
+
+def _once(fn: Callable[[], None]) -> Callable[[], None]:
+    done = threading.Lock()
+
+    def wrapper():
+        if done.acquire(blocking=False):
+            fn()
+    return wrapper
+
+def _apply_deadline(request: httpx.Request, span) -> None:
+    """Cap the request's timeouts at the time left before the caller's deadline; raise once it has passed."""
+    left = remaining()
+    if left is None:
+        return
+    if left <= 0:
+        error = httpx.TimeoutException("Request deadline passed", request=request)
+        span.end(error)
+        raise error
+    timeout = request.extensions.get("timeout") or dict.fromkeys(("connect", "read", "write", "pool"))
+    request.extensions["timeout"] = {k: left if v is None else min(v, left) for k, v in timeout.items()}
+
+def _backoff_within_deadline(delay: float) -> float:
+    """A retry backoff, shortened so it never sleeps past the caller's deadline."""
+    left = remaining()
+    return delay if left is None else max(0.0, min(delay, left))
+
+def _wrap(response: httpx.Response, stream) -> httpx.Response:
+    return httpx.Response(response.status_code, headers=response.headers, stream=stream,
+                          extensions=response.extensions)
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport that throttles, caps concurrency and retries 429/5xx with jittered backoff.
+
+    The concurrency slot is held until the response body is closed, so a
+    streamed completion counts against the cap for as long as it streams.
+    """
+
+    def __init__(self, limiter: RateLimiter, pool_size: int = OPENAI_POOL_SIZE):
+        self.limiter = limiter
+        self._transport = httpx.HTTPTransport(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self.limiter
+        request.read()
+        span, usage = _request_span(request)
+        attempt = 0
+        throttled = 0.0
+        while True:
+            _apply_deadline(request, span)
+            wait = limiter.reserve(request)
+            throttled += wait
+            time.sleep(wait)
+            limiter.slots.acquire()
+            release = _once(limiter.slots.release)
+            limiter.count("requests")
+            try:
+                response = self._transport.handle_request(request)
+            except RETRY_ERRORS as e:
+                release()
+                if not limiter.should_retry(attempt, None):
+                    span.end(e)
+                    raise
+                response = None
+            except BaseException as e:
+                release()
+                span.end(e)
+                raise
+            if response is not None:
+                if response.status_code not in RETRY_STATUSES or not limiter.should_retry(attempt, response):
+                    span.set(status=response.status_code, attempts=attempt + 1, throttled_ms=round(throttled * 1000, 1))
+                    return _wrap(response, _ReleasingStream(response.stream, release, usage))
+                response.close()
+                release()
+            time.sleep(_backoff_within_deadline(limiter.backoff(attempt, response)))
+            attempt += 1
+
+    def close(self):
+        self._transport.close()
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of RateLimitedTransport, sharing the same RateLimiter."""
+
+    def __init__(self, limiter: RateLimiter, pool_size: int = OPENAI_POOL_SIZE):
+        self.limiter = limiter
+        self._transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        import asyncio
+        limiter = self.limiter
+        await request.aread()
+        span, usage = _request_span(request)
+        attempt = 0
+        throttled = 0.0
+        while True:
+            _apply_deadline(request, span)
+            wait = limiter.reserve(request)
+            throttled += wait
+            await asyncio.sleep(wait)
+            # The slots are shared with sync callers, so poll instead of blocking the event loop.
+            while not limiter.slots.acquire(blocking=False):
+                await asyncio.sleep(0.01)
+            release = _once(limiter.slots.release)
+            limiter.count("requests")
+            try:
+                response = await self._transport.handle_async_request(request)
+            except RETRY_ERRORS as e:
+                release()
+                if not limiter.should_retry(attempt, None):
+                    span.end(e)
+                    raise
+                response = None
+            except BaseException as e:
+                release()
+                span.end(e)
+                raise
+            if response is not None:
+                if response.status_code not in RETRY_STATUSES or not limiter.should_retry(attempt, response):
+                    span.set(status=response.status_code, attempts=attempt + 1, throttled_ms=round(throttled * 1000, 1))
+                    return _wrap(response, _AsyncReleasingStream(response.stream, release, usage))
+                await response.aclose()
+                release()
+            await asyncio.sleep(_backoff_within_deadline(limiter.backoff(attempt, response)))
+            attempt += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+# One limiter and one keep-alive pool for the whole process
+limiter = RateLimiter()
+_http_client = None
+_openai_client = None
+_lock = threading.Lock()
+
+def get_http_client() -> httpx.Client:
+    """The shared httpx client behind every sync OpenAI call."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(transport=RateLimitedTransport(limiter), timeout=OPENAI_TIMEOUT)
+        return _http_client
+
+def get_openai_client():
+    """The shared OpenAI SDK client. Retries are handled by the transport, not the SDK."""
+    global _openai_client
+    from openai import OpenAI
+    http_client = get_http_client()
+    with _lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+        return _openai_client
+
+def async_openai_client():
+    """A new AsyncOpenAI client that shares the process-wide limits.
+
+    Async connection pools are tied to their event loop, so each caller gets
+    its own client and should close it (e.g. `async with async_openai_client() as c`).
+    """
+    from openai import AsyncOpenAI
+    http_client = httpx.AsyncClient(transport=AsyncRateLimitedTransport(limiter), timeout=OPENAI_TIMEOUT)
+    return AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+
+def langchain_client_kwargs() -> dict:
+    """Keyword arguments that make langchain_openai models use the shared client."""
+    return {"http_client": get_http_client(), "max_retries": 0}
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    from fake_services import FakeOpenAI
+
+    server = FakeOpenAI(fail_first=3).start()
+    base_url = f"{server.url}/v1"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+
+    # Retries: the first three calls get 429 and the client must ride them out.
+    client = get_openai_client()
+    reply = client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "ping"}])
+    assert reply.choices[0].message.content == "pong"
+    print(f"Retried through 3 x 429: {limiter.stats()}")
+
+    # Request rate: 20 calls against a 600 RPM budget with only 10 in the bucket take about 1s.
+    limiter.requests = TokenBucket(600)
+    limiter.requests.level = 10
+    start = time.perf_counter()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: client.chat.completions.create(
+            model="gpt-4o", messages=[{"role": "user", "content": "ping"}], max_tokens=5), range(20)))
+    elapsed = time.perf_counter() - start
+    assert 0.9 < elapsed < 2.0, elapsed
+    print(f"20 calls at 600 RPM with 10 in the bucket: {elapsed:.2f}s, {limiter.stats()}")
+
+    # The async client shares the same limiter and hands every slot back when done.
+    import asyncio
+
+    async def async_calls():
+        async with async_openai_client() as async_client:
+            return await asyncio.gather(*[async_client.chat.completions.create(
+                model="gpt-4o", messages=[{"role": "user", "content": "ping"}], max_tokens=5) for _ in range(5)])
+    assert all(r.choices[0].message.content == "pong" for r in asyncio.run(async_calls()))
+    assert all(limiter.slots.acquire(blocking=False) for _ in range(OPENAI_MAX_CONCURRENCY))
+    print(f"Async calls done, all {OPENAI_MAX_CONCURRENCY} concurrency slots released.")
+    server.stop()
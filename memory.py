@@ -0,0 +1,286 @@
+# memory.py
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+# Token budget for the recent turns sent to the agent verbatim.
+MEMORY_WINDOW_TOKENS = int(os.getenv("MEMORY_WINDOW_TOKENS", "1500"))
+# Token budget for the running summary of older turns.
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "400"))
+# Set MEMORY_DB to a file path to keep conversations across restarts.
+MEMORY_DB = os.getenv("MEMORY_DB")
+# Sessions kept in memory at once; older ones are reloaded from MEMORY_DB when they come back.
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "256"))
+# Longest text a single turn contributes to the summary.
+SUMMARY_LINE_CHARS = 160
+
+def count_tokens(text: str) -> int:
+    """Roughly four characters per token for English, which is close enough for budgeting."""
+    return (len(text) + 3) // 4
+
+class Turn(NamedTuple):
+    seq: int
+    role: str
+    content: str
+    tokens: int
+
+def summarize_turns(summary: str, turns: List[Turn], max_tokens: int = MEMORY_SUMMARY_TOKENS) -> str:
+    """Fold turns into the running summary: one line per turn, holding its first sentence.
+
+    The oldest lines are dropped once the summary is over max_tokens. This
+    needs no LLM call, so compaction never slows a chat down.
+    """
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        text = re.sub(r"\s+", " ", turn.content).strip()
+        text = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS - 3].rstrip() + "..."
+        lines.append(f"{turn.role}: {text}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+class ConversationStore:
+    """Append-only SQLite log of each session's turns and summary checkpoints.
+
+    Rows are never updated or deleted. Each compaction appends a summary row
+    that records the last turn it covers, so a session is reloaded from its
+    latest checkpoint instead of by replaying its whole history.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "session TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "upto INTEGER, turn_count INTEGER, created_at REAL NOT NULL, PRIMARY KEY (session, seq)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def _append(self, session: str, role: str, content: str,
+                upto: Optional[int] = None, turn_count: Optional[int] = None) -> int:
+        with self._lock:
+            seq = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM turns WHERE session = ?", (session,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO turns (session, seq, role, content, upto, turn_count, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session, seq, role, content, upto, turn_count, time.time()),
+            )
+            self._conn.commit()
+            return seq
+
+    def append(self, session: str, role: str, content: str) -> int:
+        """Record a turn and return its sequence number within the session."""
+        return self._append(session, role, content)
+
+    def checkpoint(self, session: str, summary: str, upto: int, turn_count: int) -> None:
+        """Record the running summary of every turn up to and including seq `upto`, and how many turns that is."""
+        self._append(session, "summary", summary, upto, turn_count)
+
+    def load(self, session: str) -> Tuple[str, List[Tuple[int, str, str]], int]:
+        """Return (summary, turns after the summary, number of turns) for a session."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, upto, turn_count FROM turns WHERE session = ? AND role = 'summary' "
+                "ORDER BY seq DESC LIMIT 1", (session,),
+            ).fetchone()
+            summary, upto, count = row if row else ("", 0, 0)
+            turns = self._conn.execute(
+                "SELECT seq, role, content FROM turns WHERE session = ? AND seq > ? AND role != 'summary' "
+                "ORDER BY seq", (session, upto),
+            ).fetchall()
+        return summary, turns, count + len(turns)
+
+    def history(self, session: str, limit: int = 50, before: Optional[int] = None) -> List[Tuple[int, str, str]]:
+        """Up to `limit` turns before seq `before` (default: the latest), oldest first, for paging."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, role, content FROM turns WHERE session = ? AND role != 'summary' AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?", (session, before or 2 ** 62, limit),
+            ).fetchall()
+        return rows[::-1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows, sessions = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT session) FROM turns").fetchone()
+            pages = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        return {"rows": rows, "sessions": sessions, "bytes": pages * page_size}
+
+class ConversationMemory:
+    """One session's memory: recent turns within a token window, plus a summary of older ones.
+
+    Whenever the window goes over window_tokens, its oldest turns are folded
+    into the summary, so the context given to an agent stays bounded however
+    long the conversation runs.
+    """
+
+    def __init__(self, session_id: str, store: Optional[ConversationStore] = None,
+                 window_tokens: int = MEMORY_WINDOW_TOKENS, summary_tokens: int = MEMORY_SUMMARY_TOKENS,
+                 summarize: Callable[[str, List[Turn], int], str] = summarize_turns):
+        self.session_id = session_id
+        self.store = store
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.summary = ""
+        self.turns: deque = deque()
+        self.turn_count = 0
+        self.compactions = 0
+        self._window_used = 0
+        self._lock = threading.Lock()
+        if store is not None:
+            self.summary, turns, self.turn_count = store.load(session_id)
+            for seq, role, content in turns:
+                self._push(seq, role, content)
+            self._compact()
+
+    def _push(self, seq: int, role: str, content: str) -> None:
+        # A single turn never takes more than the whole window.
+        content = content[:self.window_tokens * 4]
+        turn = Turn(seq, role, content, count_tokens(content))
+        self.turns.append(turn)
+        self._window_used += turn.tokens
+
+    def _compact(self) -> None:
+        evicted = []
+        while len(self.turns) > 1 and self._window_used > self.window_tokens:
+            turn = self.turns.popleft()
+            self._window_used -= turn.tokens
+            evicted.append(turn)
+        if evicted:
+            self.summary = self.summarize(self.summary, evicted, self.summary_tokens)
+            self.compactions += 1
+            if self.store is not None:
+                self.store.checkpoint(self.session_id, self.summary, evicted[-1].seq,
+                                      self.turn_count - len(self.turns))
+
+    def add(self, role: str, content: str) -> None:
+        with self._lock:
+            self.turn_count += 1
+            seq = self.store.append(self.session_id, role, content) if self.store is not None else self.turn_count
+            self._push(seq, role, content)
+            self._compact()
+
+    def add_exchange(self, prompt: str, response: str) -> None:
+        self.add("user", prompt)
+        self.add("assistant", response)
+
+    def context(self) -> List[dict]:
+        """The summary (as a system message) and the recent turns, as {"role", "content"} dicts."""
+        with self._lock:
+            messages = [{"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}] \
+                if self.summary else []
+            return messages + [{"role": turn.role, "content": turn.content} for turn in self.turns]
+
+    def prompt(self, message: str) -> str:
+        """The message with the conversation so far in front of it, for agents that take plain text."""
+        context = self.context()
+        if not context:
+            return message
+        history = "\n".join(f"{m['role']}: {m['content']}" for m in context)
+        return f"Conversation so far:\n{history}\n\nCurrent request: {message}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            summary_tokens = count_tokens(self.summary)
+            return {
+                "session": self.session_id,
+                "turns": self.turn_count,
+                "window_turns": len(self.turns),
+                "window_tokens": self._window_used,
+                "summary_tokens": summary_tokens,
+                "prompt_tokens": self._window_used + summary_tokens,
+                "compactions": self.compactions,
+                "bytes": len(self.summary) + sum(len(turn.content) for turn in self.turns),
+            }
+
+def as_langchain_messages(context: List[dict]) -> list:
+    """Convert context() dicts into LangChain messages."""
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    types = {"system": SystemMessage, "user": HumanMessage, "assistant": AIMessage}
+    return [types[m["role"]](content=m["content"]) for m in context]
+
+_store = ConversationStore(MEMORY_DB) if MEMORY_DB else None
+_sessions: "OrderedDict[str, ConversationMemory]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+def get_memory(session_id: str) -> ConversationMemory:
+    """The memory for a session, shared by every agent in the process.
+
+    At most MEMORY_MAX_SESSIONS are kept, least recently used first out.
+    An evicted session is reloaded from MEMORY_DB when it returns, or starts
+    over if no database is configured.
+    """
+    with _sessions_lock:
+        memory = _sessions.get(session_id)
+        if memory is None:
+            memory = _sessions[session_id] = ConversationMemory(session_id, _store)
+            while len(_sessions) > MEMORY_MAX_SESSIONS:
+                evicted, _ = _sessions.popitem(last=False)
+                if _store is None:
+                    print(f"Memory: dropped session {evicted!r} after {MEMORY_MAX_SESSIONS} newer ones; "
+                          "set MEMORY_DB to keep sessions across evictions.")
+        else:
+            _sessions.move_to_end(session_id)
+        return memory
+
+def get_store() -> Optional[ConversationStore]:
+    return _store
+
+def memory_stats() -> dict:
+    """Totals across the sessions held in memory, plus the store's size."""
+    with _sessions_lock:
+        sessions = [memory.stats() for memory in _sessions.values()]
+    return {
+        "sessions": len(sessions),
+        "bytes": sum(s["bytes"] for s in sessions),
+        "max_prompt_tokens": max((s["prompt_tokens"] for s in sessions), default=0),
+        "compactions": sum(s["compactions"] for s in sessions),
+        "store": _store.stats() if _store is not None else None,
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Simulate a long conversation and track memory and prompt size.")
+    parser.add_argument("--exchanges", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ConversationStore(os.path.join(tmp, "memory.db"))
+        memory = ConversationMemory("demo", store)
+        unbounded_tokens = 0
+        start = time.perf_counter()
+        for i in range(1, args.exchanges + 1):
+            prompt = f"What is {i} times {i + 1}? Also tell me something about topic number {i}."
+            response = f"{i} * {i + 1} = {i * (i + 1)}. " + "Here is a longer explanation of the topic. " * (i % 7 + 1)
+            memory.add_exchange(prompt, response)
+            unbounded_tokens += count_tokens(prompt) + count_tokens(response)
+            if i in (10, 100, 1000) or i == args.exchanges:
+                stats = memory.stats()
+                print(json.dumps({"exchanges": i, "prompt_tokens": stats["prompt_tokens"],
+                                  "unbounded_prompt_tokens": unbounded_tokens, "memory_bytes": stats["bytes"],
+                                  "store_bytes": store.stats()["bytes"]}))
+        elapsed = time.perf_counter() - start
+        print(f"{elapsed / args.exchanges * 1000:.3f} ms per exchange, including the SQLite appends")
+
+        # Reloading from the store gives back the same context.
+        reloaded = ConversationMemory("demo", store)
+        assert reloaded.context() == memory.context(), "reloaded context differs"
+        assert reloaded.turn_count == memory.turn_count
+        start = time.perf_counter()
+        ConversationMemory("demo", store)
+        print(f"Reloaded a {memory.turn_count}-turn session in {(time.perf_counter() - start) * 1000:.2f} ms")
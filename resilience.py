@@ -0,0 +1,322 @@
+# resilience.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, Optional, Tuple
+from chat_stream import mute_when
+from tracing import annotate
+
+# Seconds one agent request may spend in total, across all of its tool and LLM calls (0 for no limit).
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET", "120"))
+# Consecutive failures (errors or timeouts) that open a tool's circuit breaker.
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+# Seconds an open breaker waits before letting one trial call through.
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Tool calls with a deadline that may run at once. A call abandoned at its deadline keeps
+# its slot until it returns, so a hung dependency cannot pile up unbounded threads.
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "32"))
+# Last good answers kept per tool, served while the tool is failing.
+FALLBACK_CACHE_SIZE = int(os.getenv("FALLBACK_CACHE_SIZE", "256"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+# One event per guarded call this code runs inside; set when the caller stops waiting.
+_cancel: ContextVar[Tuple[threading.Event, ...]] = ContextVar("cancel", default=())
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Give the code inside at most `seconds`; an earlier outer deadline still applies."""
+    if seconds is None:
+        yield
+        return
+    current = _deadline.get()
+    end = time.monotonic() + seconds
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def cancelled() -> bool:
+    """Whether a guarded call this code runs inside was abandoned at its deadline.
+
+    Work that outlives its caller checks this before writing files or
+    caching results nobody will read.
+    """
+    return any(event.is_set() for event in _cancel.get())
+
+def request_budget():
+    """The deadline for one whole agent request (REQUEST_BUDGET seconds)."""
+    return deadline(REQUEST_BUDGET or None)
+
+class CircuitBreaker:
+    """Stops calling a dependency after repeated failures, then lets one trial call through.
+
+    Closed: calls go through. After `failures` consecutive failures it opens
+    and rejects calls for `reset_seconds`. Then it is half-open: one call is
+    let through, and its outcome closes or reopens the breaker.
+    """
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ("calls", "successes", "failures", "timeouts", "rejected", "degraded", "fallbacks",
+             "budget_exhausted", "opened"), 0)
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; a rejected call is counted."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+                self.counters["rejected"] += 1
+                return False
+            if self.state == HALF_OPEN:
+                self._probing = True
+            self.counters["calls"] += 1
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.counters["successes"] += 1
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self._probing = False
+
+    def record_failure(self, timeout: bool = False) -> None:
+        with self._lock:
+            self.counters["failures"] += 1
+            self.counters["timeouts"] += timeout
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failures:
+                if self.state != OPEN:
+                    self.counters["opened"] += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def record_inconclusive(self) -> None:
+        """A call cut short by the request budget: free the trial slot without judging the dependency."""
+        with self._lock:
+            self.counters["budget_exhausted"] += 1
+            self._probing = False
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures, **self.counters}
+
+class NoFreeSlot(TimeoutError):
+    """Every tool slot stayed busy until the call's deadline; the tool itself was never called."""
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(TOOL_WORKERS)
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker for a dependency, shared by every agent that calls it."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+def is_error(result) -> bool:
+    """Tools report failures as text starting with "Error"."""
+    return isinstance(result, str) and result.startswith("Error")
+
+class Guard:
+    """Calls a tool with a per-call deadline, a circuit breaker and a degraded fallback.
+
+    The call gets `timeout` seconds, or less if the request budget has less
+    left; a tool without a timeout (a local one) runs inline. When the call
+    times out, fails, or its breaker is open, the answer comes from
+    `fallback(tool_input)` if that returns one, else from the tool's last good
+    answer for the same input, else a short "try again" message.
+    """
+
+    def __init__(self, name: str, fn: Callable[[str], str], timeout: Optional[float] = None,
+                 fallback: Optional[Callable[[str], Optional[str]]] = None,
+                 is_failure: Callable[[object], bool] = is_error):
+        self.name = name
+        self.fn = fn
+        self.timeout = timeout
+        self.fallback = fallback
+        self.is_failure = is_failure
+        self.breaker = get_breaker(name)
+        self._last_good: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, tool_input: str) -> str:
+        limit = self.timeout
+        left = remaining()
+        if left is not None and left <= 0:
+            self.breaker.count("budget_exhausted")
+            return self.degraded(tool_input, "out of time for this request")
+        if limit is not None and left is not None:
+            limit = min(limit, left)
+        if not self.breaker.allow():
+            return self.degraded(tool_input, "unavailable")
+        try:
+            if limit is None:
+                result = self._call(tool_input)
+            else:
+                result = self._call_with_deadline(tool_input, limit)
+        except NoFreeSlot:
+            # Other tools' abandoned calls hold every slot; that says nothing about this one.
+            self.breaker.record_inconclusive()
+            return self.degraded(tool_input, "busy")
+        except TimeoutError:
+            if limit is not None and limit < self.timeout:
+                # Cut short by the request budget rather than the tool's own deadline.
+                self.breaker.record_inconclusive()
+            else:
+                self.breaker.record_failure(timeout=True)
+            return self.degraded(tool_input, "not responding")
+        except Exception as e:
+            print(f"{self.name} failed: {type(e).__name__}: {e}")
+            self.breaker.record_failure()
+            return self.degraded(tool_input, "failing")
+        if self.is_failure(result):
+            self.breaker.record_failure()
+            return self.degraded(tool_input, "failing", default=result)
+        self.breaker.record_success()
+        return result
+
+    def _call(self, tool_input: str) -> str:
+        result = self.fn(tool_input)
+        if not self.is_failure(result):
+            self._remember(tool_input, result)
+        return result
+
+    def _call_with_deadline(self, tool_input: str, limit: float) -> str:
+        """Run the tool on a daemon thread and stop waiting for it after `limit` seconds.
+
+        An abandoned call finishes in the background (a good answer it returns
+        late is still kept for next time) without holding up process exit.
+        It is told through cancelled(), and its chat events are dropped.
+        """
+        start = time.monotonic()
+        slots = _slots
+        if not slots.acquire(timeout=limit):
+            raise NoFreeSlot()
+        # The thread sees this request's trace, stream and deadline.
+        context = copy_context()
+        outcome = {}
+        done = threading.Event()
+        cancel = threading.Event()
+
+        def run():
+            _cancel.set(_cancel.get() + (cancel,))
+            mute_when(cancelled)
+            try:
+                with deadline(limit):
+                    outcome["result"] = self._call(tool_input)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                slots.release()
+                done.set()
+
+        threading.Thread(target=context.run, args=(run,), name=f"tool-{self.name}", daemon=True).start()
+        if not done.wait(max(0.0, limit - (time.monotonic() - start))):
+            cancel.set()
+            raise TimeoutError()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def _remember(self, tool_input: str, result: str) -> None:
+        key = " ".join(tool_input.split()).casefold()
+        with self._lock:
+            self._last_good[key] = result
+            self._last_good.move_to_end(key)
+            while len(self._last_good) > FALLBACK_CACHE_SIZE:
+                self._last_good.popitem(last=False)
+
+    def degraded(self, tool_input: str, reason: str, default: Optional[str] = None) -> str:
+        """The best answer available without calling the tool."""
+        self.breaker.count("degraded")
+        annotate(degraded=reason)
+        answer = None
+        if self.fallback is not None:
+            try:
+                answer = self.fallback(tool_input)
+            except Exception as e:
+                print(f"{self.name} fallback failed: {type(e).__name__}: {e}")
+        if answer is None:
+            with self._lock:
+                cached = self._last_good.get(" ".join(tool_input.split()).casefold())
+            if cached is not None:
+                answer = f"{cached}\n\n(Saved answer: {self.name} is {reason} right now.)"
+        if answer is not None:
+            self.breaker.count("fallbacks")
+            return answer
+        return default or f"Error: {self.name} is {reason} right now. Please try again shortly."
+
+def resilience_stats() -> dict:
+    """Breaker state and call, failure, timeout and fallback counts for each guarded tool."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+if __name__ == "__main__":
+    outage = threading.Event()
+
+    def flaky_lookup(query: str) -> str:
+        if outage.is_set():
+            time.sleep(2)
+        return f"Answer about {query}"
+
+    breaker = CircuitBreaker("demo", failures=3, reset_seconds=0.5)
+    with _breakers_lock:
+        _breakers["demo"] = breaker
+    guard = Guard("demo", flaky_lookup, timeout=0.2)
+
+    assert guard("python") == "Answer about python"
+    outage.set()
+    latencies = []
+    for i in range(10):
+        start = time.perf_counter()
+        answer = guard("python" if i % 2 else f"topic {i}")
+        latencies.append(time.perf_counter() - start)
+    stats = breaker.stats()
+    assert stats["state"] == OPEN and stats["timeouts"] == 3 and stats["rejected"] == 7, stats
+    assert guard("python").startswith("Answer about python\n\n(Saved answer"), guard("python")
+    print(f"Outage: 10 calls, slowest {max(latencies) * 1000:.0f} ms, "
+          f"{sum(latencies[3:]) / 7 * 1e6:.0f} µs per call once the breaker opened")
+
+    # After reset_seconds one trial call goes through; its success closes the breaker.
+    outage.clear()
+    time.sleep(0.6)
+    assert guard("rust") == "Answer about rust" and breaker.stats()["state"] == CLOSED
+
+    # A request budget caps the total time spent across calls.
+    outage.set()
+    start = time.perf_counter()
+    with deadline(0.3):
+        answers = [guard(f"budget {i}") for i in range(5)]
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.45 and breaker.stats()["budget_exhausted"] >= 1, (elapsed, breaker.stats())
+    print(f"Budget: 5 calls under a 0.3 s request budget took {elapsed * 1000:.0f} ms")
+    print(resilience_stats())
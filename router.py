@@ -0,0 +1,320 @@
+# router.py
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# How a route turns the message into the input for its tool.
+TOPIC_MESSAGE = "message"        # the full original message
+TOPIC_NONE = "none"              # the tool takes no input
+TOPIC_AFTER_TRIGGER = "after"    # the text after the last trigger phrase
+
+class Route(NamedTuple):
+    """A tool and the phrases that select it."""
+    tool: str
+    triggers: Tuple[str, ...]
+    # Phrases that only select the tool when the message also contains a digit.
+    numeric_triggers: Tuple[str, ...] = ()
+    topic: str = TOPIC_MESSAGE
+    # Split the topic out of the original text instead of the lowercased one.
+    keep_case: bool = False
+    # A regex over the lowercased message that selects the tool only when no other route matches.
+    expression: Optional[str] = None
+
+# Clause boundaries in compound requests: sentence punctuation, or a joining word.
+CLAUSE_BREAK = re.compile(r"[;,.!?]+\s+(?:(?:and|then|also)\s+)*|\s+(?:and|then|also)(?:\s+(?:and|then|also))*\s+", re.IGNORECASE)
+
+# Words that do not make a clause's topic on their own, as in "and tell me about it".
+FILLER_WORDS = frozenset(
+    "it its that this these those them they he she him her one something anything everything stuff "
+    "the a an about of on for with to more too please me my".split()
+)
+
+# Filler words at the start of a topic, as in "about dragons".
+LEADING_FILLER = re.compile(r"^(?:(?:%s)\s+)+" % "|".join(sorted(FILLER_WORDS)), re.IGNORECASE)
+
+# Words that point back at the previous message, as in "make a game about it".
+REFERENCE = re.compile(r"\b(?:it|its|that|this|these|those|them|they|he|she|him|her)\b")
+
+# A calculation written out with an operator between its numbers: "6 times 7", "84 / 2", "multiply 6
+# by 7", or a bare expression like "84/2". Operator words alone ("times tables", "subtract points")
+# are not enough, and neither is a date like "from 3/4".
+CALCULATION = (r"^[\d\s.()+\-*/]*\d\s*[-*/]\s*[(\-]?\s*\d[\d\s.()+\-*/]*$"
+               r"|\d\s*(?:\*|\s/\s|times|minus|multiplied\s+by|divided\s+by)\s*[-(]?\s*\d"
+               r"|\b(?:multiply|divide|subtract)\s+-?\d[\d.]*\s+(?:and|by|from|with)\s+-?\d")
+
+# Routes in priority order: the first route with a matching trigger wins.
+ROUTES: Tuple[Route, ...] = (
+    Route("Calculator", ("addition", "add", "+", "plus", "sum"),
+          numeric_triggers=("what is", "calculate"), expression=CALCULATION),
+    Route("GmailReader", ("email",)),
+    Route("GameGenerator", ("game",), topic=TOPIC_AFTER_TRIGGER, keep_case=True),
+    Route("WikiTool", ("what is", "who is", "tell me about", "wikipedia", "wiki"), topic=TOPIC_AFTER_TRIGGER),
+)
+
+def _trie_pattern(phrases: Sequence[str]) -> str:
+    """Build a regex alternation that shares common prefixes, longest match first."""
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+class IntentRouter:
+    """Routes a message to a tool with one precompiled scan over the lowercased text.
+
+    The trigger phrases are compiled into a single prefix-trie regex. Each
+    search resumes one character after the previous match start, so
+    overlapping phrases are still found, and shorter phrases that are prefixes
+    of a match (e.g. "wiki" in "wikipedia") are credited at the same position.
+    That makes the scan equivalent to testing every phrase with `in`.
+    """
+
+    def __init__(self, routes: Sequence[Route] = ROUTES):
+        self.routes = tuple(routes)
+        phrases = {p for r in self.routes for p in r.triggers + r.numeric_triggers}
+        self._prefixes = {
+            p: tuple(q for q in phrases if p.startswith(q))
+            for p in phrases
+        }
+        # For each phrase, the routes it selects and whether it needs a digit.
+        self._selects: Dict[str, List[Tuple[int, bool]]] = {p: [] for p in phrases}
+        for index, r in enumerate(self.routes):
+            for phrase in r.triggers:
+                self._selects[phrase].append((index, False))
+            for phrase in r.numeric_triggers:
+                self._selects[phrase].append((index, True))
+        self._pattern = re.compile(_trie_pattern(sorted(phrases)))
+        self._expressions = [(index, re.compile(r.expression)) for index, r in enumerate(self.routes) if r.expression]
+
+    def scan(self, lowered: str) -> Dict[str, int]:
+        """Return the end offset of the last occurrence of each trigger phrase."""
+        last_end: Dict[str, int] = {}
+        prefixes = self._prefixes
+        search = self._pattern.search
+        match = search(lowered)
+        while match:
+            start = match.start()
+            for phrase in prefixes[match.group()]:
+                last_end[phrase] = start + len(phrase)
+            match = search(lowered, start + 1)
+        return last_end
+
+    def route(self, message: str) -> Optional[Tuple[str, str]]:
+        """Return (tool name, tool input) for the message, or None if nothing matches."""
+        lowered = message.lower()
+        last_end = self.scan(lowered)
+        best = len(self.routes)
+        has_digit = None
+        for phrase in last_end:
+            for index, numeric in self._selects[phrase]:
+                if index >= best:
+                    continue
+                if numeric:
+                    # The digit check only runs for the rare messages that need it.
+                    if has_digit is None:
+                        has_digit = any(char.isdigit() for char in message)
+                    if not has_digit:
+                        continue
+                best = index
+        if best == len(self.routes):
+            best = next((index for index, pattern in self._expressions if pattern.search(lowered)), best)
+        if best == len(self.routes):
+            return None
+
+        route = self.routes[best]
+        if route.topic == TOPIC_NONE:
+            return route.tool, ""
+        if route.topic == TOPIC_MESSAGE:
+            return route.tool, message
+        matched = [p for p in route.triggers if p in last_end]
+        if has_digit:
+            matched += [p for p in route.numeric_triggers if p in last_end]
+        if route.keep_case:
+            return route.tool, message.rpartition(matched[0])[2].strip()
+        # Try triggers in table order and take the first non-empty topic.
+        for phrase in matched:
+            topic = lowered[last_end[phrase]:].strip()
+            if topic:
+                return route.tool, topic
+        return route.tool, ""
+
+    def _clause_route(self, clause: str) -> Optional[Tuple[str, str]]:
+        """route() for one clause of a compound message, or None if the clause has no input of its own.
+
+        "tell me about it" selects WikiTool, but only refers back to the
+        clause before it, so it is not an intent by itself.
+        """
+        routed = self.route(clause)
+        if routed is None or not self._has_topic(*routed):
+            return None
+        return routed
+
+    def _has_topic(self, tool: str, tool_input: str) -> bool:
+        """Whether a routed input says something beyond trigger phrases and filler words."""
+        route = next(r for r in self.routes if r.tool == tool)
+        if route.topic == TOPIC_NONE:
+            return True
+        text = tool_input.lower()
+        if route.topic == TOPIC_MESSAGE:
+            for phrase in sorted(route.triggers + route.numeric_triggers, key=len, reverse=True):
+                text = text.replace(phrase, " ")
+        words = re.findall(r"[\w+*/-]+", text)
+        return any(word not in FILLER_WORDS for word in words)
+
+    def route_all(self, message: str) -> List[Tuple[str, str]]:
+        """Return (tool name, tool input) for every intent in a compound message.
+
+        The message is split into clauses at CLAUSE_BREAK. Clauses that select
+        no tool, or whose input is only filler words ("and tell me about it"),
+        are joined back onto the clause before them (or after them, at the
+        start), so "add 3 and 4" stays one clause. Each clause is then
+        routed with route(). Only the first clause for each tool is kept,
+        since a tool runs at most once per agent run. A message with a single
+        intent gives the same answer as route().
+        """
+        groups: List[List] = []
+        start = 0
+        for end, next_start in [(m.start(), m.end()) for m in CLAUSE_BREAK.finditer(message)] + [(len(message), None)]:
+            routed = self._clause_route(message[start:end])
+            if routed is None and groups:
+                groups[-1][1] = end
+            elif routed is not None and groups and groups[-1][2] is None:
+                groups[-1][1:] = [end, routed]
+            else:
+                groups.append([start, end, routed])
+            start = next_start
+        if len(groups) == 1:
+            routed = self.route(message)
+            return [routed] if routed else []
+
+        intents: List[Tuple[str, str]] = []
+        seen = set()
+        for start, end, routed in groups:
+            if routed is None:
+                continue
+            routed = self.route(message[start:end])
+            if routed[0] not in seen:
+                seen.add(routed[0])
+                intents.append(routed)
+        return intents
+
+    def route_followup(self, message: str, previous: Optional[str]) -> List[Tuple[str, str]]:
+        """route_all() for a message that may refer back to the user's previous message.
+
+        An intent whose input is only "it", "that" and the like ("what is
+        it", "make a game about that") takes its topic from the previous
+        message: that message's input for the same tool, else the first topic
+        it gave any tool that takes one, without leading filler ("about").
+        Anything else is routed as it is.
+        """
+        intents = self.route_all(message)
+        if not previous or not REFERENCE.search(message.lower()):
+            return intents
+        earlier = dict(self.route_all(previous))
+        topics = [LEADING_FILLER.sub("", text) for tool, text in earlier.items()
+                  if next(r for r in self.routes if r.tool == tool).topic == TOPIC_AFTER_TRIGGER
+                  and self._has_topic(tool, text)]
+        if not topics:
+            return intents
+        resolved = []
+        for tool, text in intents:
+            route = next(r for r in self.routes if r.tool == tool)
+            if route.topic == TOPIC_AFTER_TRIGGER and not self._has_topic(tool, text):
+                text = earlier[tool] if tool in earlier and self._has_topic(tool, earlier[tool]) else topics[0]
+            resolved.append((tool, text))
+        return resolved
+
+def _legacy_route(message: str, gmail: bool = True) -> Optional[Tuple[str, str]]:
+    """The original if/elif cascade from agent_node, kept for benchmarking."""
+    if "addition" in message.lower() or "add" in message.lower() or "+" in message or "plus" in message.lower() or "sum" in message.lower() or (any(char.isdigit() for char in message) and ("what is" in message.lower() or "calculate" in message.lower())):
+        return "Calculator", message
+    elif gmail and "email" in message.lower():
+        return "GmailReader", message
+    elif "game" in message.lower():
+        return "GameGenerator", message.split("game")[-1].strip()
+    elif any(wiki_trigger in message.lower() for wiki_trigger in ["what is", "who is", "tell me about", "wikipedia", "wiki"]):
+        for trigger in ["what is", "who is", "tell me about", "wikipedia", "wiki"]:
+            if trigger in message.lower():
+                topic = message.lower().split(trigger)[-1].strip()
+                if topic:
+                    return "WikiTool", topic
+        return "WikiTool", ""
+    return None
+
+# Compound requests and the intents route_all should find in them.
+COMPOUND_PROMPTS = [
+    ("add 3+4 and tell me about Python and make a game about snakes",
+     [("Calculator", "add 3+4"), ("WikiTool", "python"), ("GameGenerator", "about snakes")]),
+    ("Who is Ada Lovelace? Then add 2 and 3",
+     [("WikiTool", "ada lovelace"), ("Calculator", "add 2 and 3")]),
+    ("please, calculate 7, 8", [("Calculator", "please, calculate 7, 8")]),
+    ("tell me about the Roman Empire and Carthage", [("WikiTool", "the roman empire and carthage")]),
+    ("add 1 and 2 and add 3 and 4", [("Calculator", "add 1 and 2")]),
+    ("check my email and tell me about it", [("GmailReader", "check my email and tell me about it")]),
+    ("make a game about space, then tell me more", [("GameGenerator", "about space, then tell me more")]),
+    ("multiply 6 by 7, then tell me about Douglas Adams",
+     [("Calculator", "multiply 6 by 7"), ("WikiTool", "douglas adams")]),
+]
+
+GOLDEN_PROMPTS = [
+    "What is 5 + 10",
+    "what is 12 and 30",
+    "calculate 7, 8",
+    "Please add 3 and 4",
+    "sum of 2, 2",
+    "Check my most recent email",
+    "show my last 10 emails",
+    "Make a game about snake",
+    "Make a Game about Tetris",
+    "build a snake game",
+    "game",
+    "What is Python programming",
+    "who is Ada Lovelace?",
+    "Tell me about the Roman Empire",
+    "wikipedia Alan Turing",
+    "search wiki for pandas",
+    "what is",
+    "tell me about wikipedia",
+    "hello there",
+    "email me a game about addition",
+    "What is the plus sign",
+    # Operator words and digits that belong to another tool's request
+    "make a game about times tables for 7 year olds",
+    "check my email from 3/4",
+    "who is the 44th president who multiplied taxes",
+    "build a 2 player game where you subtract points",
+]
+
+# Calculations with no trigger phrase, which the legacy cascade did not recognise.
+CALCULATION_PROMPTS = ["6 times 7", "84 / 2", "84/2", "6*7", "10-3", "10 minus 3", "multiply 6 by 7", "divide 8 by 2",
+                       "subtract 3 from 10", "6 multiplied by 7"]
+
+if __name__ == "__main__":
+    import timeit
+
+    router = IntentRouter()
+    no_gmail_router = IntentRouter([r for r in ROUTES if r.tool != "GmailReader"])
+    for prompt in GOLDEN_PROMPTS:
+        assert router.route(prompt) == _legacy_route(prompt), prompt
+        assert no_gmail_router.route(prompt) == _legacy_route(prompt, gmail=False), prompt
+        assert router.route_all(prompt) == ([_legacy_route(prompt)] if _legacy_route(prompt) else []), prompt
+    for prompt in CALCULATION_PROMPTS:
+        assert router.route(prompt) == ("Calculator", prompt), prompt
+    for prompt, expected in COMPOUND_PROMPTS:
+        assert router.route_all(prompt) == expected, (prompt, router.route_all(prompt))
+    print(f"Golden corpus: {len(GOLDEN_PROMPTS)} prompts route identically, {len(COMPOUND_PROMPTS)} compound prompts split.")
+
+    padding = " please answer this as quickly as you possibly can" * 20
+    for label, corpus in (("short", GOLDEN_PROMPTS * 50), ("long", [p + padding for p in GOLDEN_PROMPTS] * 5)):
+        for name, fn in (("cascade", _legacy_route), ("router", router.route)):
+            seconds = min(timeit.repeat(lambda: [fn(p) for p in corpus], number=20, repeat=5))
+            print(f"{label:>5} {name:>8}: {len(corpus) * 20 / seconds:,.0f} messages/s")
@@ -0,0 +1,226 @@
+# server.py
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+import agent_registry
+from memory import memory_stats
+from resilience import resilience_stats
+
+# Agents the service will load, by module name.
+AGENT_MODULES = ("lang", "lang_no_gmail", "lang_react")
+DEFAULT_AGENT = os.getenv("DEFAULT_AGENT", "lang_no_gmail")
+# Threads for blocking agent calls (LLM requests, make_game, wiki_summary, Gmail).
+WORKERS = int(os.getenv("SERVER_WORKERS", "32"))
+# Requests admitted at once (running or waiting for a thread); beyond this we answer 503.
+MAX_PENDING = int(os.getenv("SERVER_MAX_PENDING", "128"))
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class ServerMetrics:
+    """Request and queue counters for the /metrics endpoint."""
+
+    def __init__(self, workers: int, max_pending: int, window: int = 1000):
+        self.started = time.time()
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.per_agent = {}
+        self._latencies = deque(maxlen=window)
+        # running is updated from worker threads, everything else from the event loop.
+        self._lock = threading.Lock()
+
+    def worker_started(self):
+        with self._lock:
+            self.running += 1
+
+    def worker_finished(self):
+        with self._lock:
+            self.running -= 1
+
+    def record(self, agent: str, seconds: float, ok: bool):
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        self.per_agent[agent] = self.per_agent.get(agent, 0) + 1
+        self._latencies.append(seconds)
+
+    def snapshot(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))], 4)
+
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "pending": self.pending,
+            "running": self.running,
+            "queued": self.pending - self.running,
+            "max_pending": self.max_pending,
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "per_agent": dict(self.per_agent),
+            "latency_seconds": {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)},
+        }
+
+class AgentServer:
+    """Asyncio HTTP/JSON front end that serves every agent's chat() concurrently.
+
+    Endpoints:
+      POST /chat     {"agent": "lang_no_gmail", "prompt": "...", "session": "..."} -> {"response": "...", ...}
+      GET  /metrics  request, queue and latency counters, memory and tool breaker stats
+      GET  /health   liveness check
+
+    Agent calls block, so they run in a bounded thread pool. Each call builds
+    its own AgentState; only requests that pass the same optional "session"
+    share conversation memory. Once
+    max_pending requests are admitted, new ones are rejected with 503 and a
+    Retry-After header instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent")
+        self.max_pending = max_pending
+        self.metrics = ServerMetrics(workers, max_pending)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving agents on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            await self._write_response(writer, 400, {"error": str(e)}, False)
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, {**self.metrics.snapshot(), "memory": memory_stats(), "tools": resilience_stats()}
+        if path != "/chat":
+            return 404, {"error": f"Unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST /chat"}
+        try:
+            data = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return 400, {"error": "Body must be JSON"}
+        prompt = data.get("prompt")
+        agent = data.get("agent", DEFAULT_AGENT)
+        session = data.get("session")
+        if not isinstance(prompt, str) or not prompt.strip():
+            return 400, {"error": "'prompt' must be a non-empty string"}
+        if agent not in AGENT_MODULES:
+            return 400, {"error": f"'agent' must be one of {list(AGENT_MODULES)}"}
+        if session is not None and not isinstance(session, str):
+            return 400, {"error": "'session' must be a string"}
+        return await self.chat(agent, prompt, session)
+
+    async def chat(self, agent: str, prompt: str, session: Optional[str] = None) -> Tuple[int, dict]:
+        if self.metrics.pending >= self.max_pending:
+            self.metrics.rejected += 1
+            return 503, {"error": "Server busy, try again later"}
+        self.metrics.pending += 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.executor, self._run_chat, agent, prompt, session)
+            ok = True
+            return 200, {"agent": agent, "response": response, "seconds": round(time.perf_counter() - start, 4)}
+        except Exception as e:
+            return 500, {"agent": agent, "error": str(e)}
+        finally:
+            self.metrics.pending -= 1
+            self.metrics.record(agent, time.perf_counter() - start, ok)
+
+    def _run_chat(self, agent: str, prompt: str, session: Optional[str] = None) -> str:
+        self.metrics.worker_started()
+        try:
+            return agent_registry.get_chat(agent)(prompt, session)
+        finally:
+            self.metrics.worker_finished()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[tuple]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise ValueError("Malformed request line")
+        method, target, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve the agents over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    parser.add_argument("--preload", nargs="*", default=[], help="agents to import before serving")
+    args = parser.parse_args(argv)
+    # Games are saved on the server; do not try to open them in a browser there. Set before any
+    # agent is imported, and only when serving, so importing this module changes nothing.
+    os.environ.setdefault("GAME_OPEN_BROWSER", "0")
+    for name in args.preload:
+        agent_registry.load_agent(name)
+    asyncio.run(AgentServer(args.workers, args.max_pending).serve(args.host, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# tests/conftest.py
+import atexit
+import os
+import shutil
+import tempfile
+
+# Set before any project module is imported: nothing opens a browser, calls the real
+# OpenAI API, or writes caches and mirrors into the working tree.
+_scratch = tempfile.mkdtemp(prefix="agentlang-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ["GAME_OPEN_BROWSER"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["GAME_CACHE_DIR"] = os.path.join(_scratch, "game_cache")
+os.environ["GMAIL_MIRROR_DB"] = os.path.join(_scratch, "gmail_mirror.db")
+
+import pytest
+from fake_services import FakeGmail, FakeOpenAI
+
+@pytest.fixture
+def fake_gmail(monkeypatch, tmp_path):
+    """A FakeGmail server, with gmail_helper talking to it through a new GmailService."""
+    import gmail_helper
+    with FakeGmail(messages=30) as fake:
+        monkeypatch.setattr(gmail_helper, "API_ENDPOINT", fake.url)
+        service = gmail_helper.GmailService(token_path=str(tmp_path / "token.json"),
+                                            discovery_path=str(tmp_path / "gmail_discovery.json"))
+        monkeypatch.setattr(gmail_helper, "gmail_service", service)
+        yield fake
+        service.close()
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """A FakeOpenAI server, with the shared OpenAI client and an empty response cache pointed at it."""
+    import llm_client
+    from llm_cache import response_cache
+    with FakeOpenAI() as fake:
+        monkeypatch.setenv("OPENAI_BASE_URL", fake.url + "/v1")
+        monkeypatch.setattr(llm_client, "_openai_client", None)
+        response_cache.clear()
+        yield fake
+        response_cache.clear()
+
+@pytest.fixture
+def lang_react(fake_openai):
+    """lang_react, reloaded so its ReAct agent's chat model talks to this test's FakeOpenAI.
+
+    ChatOpenAI reads OPENAI_BASE_URL once, when the model is built at import.
+    """
+    import importlib
+    module = pytest.importorskip("lang_react", exc_type=ImportError)
+    return importlib.reload(module)
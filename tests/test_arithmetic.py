@@ -0,0 +1,95 @@
+# tests/test_arithmetic.py
+import random
+import pytest
+import arithmetic
+from arithmetic import ExpressionError, answer, evaluate, evaluate_batch, format_number
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os')", "(1).real", "x + 1", "[1, 2]", "1 if 1 else 2", "1 < 2", "7 % 2", "7 // 2",
+    "'a' + 'b'", "True + 1", "lambda: 1", "abs(-1)",
+])
+def test_anything_but_numbers_and_operators_is_rejected(expression):
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+
+@pytest.mark.parametrize("expression, limit", [
+    ("99 ** 1000", "bits"),
+    ("2 ** 1000 * 2 ** 1000 * 2 ** 1000 * 2 ** 1000 * 2 ** 1000", "bits"),
+    ("2 ** 5000", "Exponents"),
+    ("9 ** 999 ** 9", "Exponents"),
+    ("1 + " * 60 + "1", "syntax nodes"),
+    ("1" * 501, "characters"),
+    ("1 / 0", "Division by zero"),
+    ("0 ** -1", "Division by zero"),
+])
+def test_limits_are_enforced(expression, limit):
+    with pytest.raises(ExpressionError, match=limit):
+        evaluate(expression)
+
+@pytest.mark.parametrize("expression, expected", [
+    ("0.1 + 0.2", "0.3"), ("(3 + 4) * 2", "14"), ("7 / 2", "3.5"), ("2 ** -2", "0.25"),
+    ("-(2 ** 64) * 2", str(-(2 ** 65))),
+])
+def test_evaluate_is_exact(expression, expected):
+    assert format_number(evaluate(expression)) == expected
+
+@pytest.mark.parametrize("request_text", arithmetic.GOLDEN_REQUESTS)
+def test_golden_requests_are_answered_as_before(request_text):
+    assert answer(request_text) == arithmetic._legacy_add(request_text)
+
+@pytest.mark.parametrize("request_text, expected", [
+    ("1,000 plus 2", "The sum of 1000 and 2 is 1002."),
+    ("1,000,000 * 2", "1000000 * 2 = 2000000"),
+    ("add 1,000 and 250", "The sum of 1000 and 250 is 1250."),
+    ("3,4", "The sum of 3 and 4 is 7."),
+    ("what is (3 + 4) * 2?", "(3 + 4) * 2 = 14"),
+    ("subtract 3 from 10", "10 - 3 = 7"),
+    ("6 times 7", "6 * 7 = 42"),
+])
+def test_requests_are_parsed(request_text, expected):
+    assert answer(request_text) == expected
+
+@pytest.mark.parametrize("request_text", ["1,000,00 + 1", "1,5 + 2", "hello"])
+def test_unclear_requests_are_refused(request_text):
+    with pytest.raises(ExpressionError):
+        answer(request_text)
+
+def batch_of_expressions():
+    rng = random.Random(0)
+    batch = [f"{rng.randint(0, 10 ** 6)} * {rng.randint(0, 10 ** 6)} + {rng.randint(0, 999)}"
+             for _ in range(2 * arithmetic.VECTOR_MIN_BATCH)]
+    # Rows that overflow int64, and rows that fail, in the middle of the batch.
+    batch[5] = "9223372036854775807 * 3 + 1"
+    batch[6] = "123456789012345678 * 123456789012345678 + 0"
+    batch[7] = "08 * 1 + 1"
+    batch[8] = "1 / 0"
+    return batch
+
+def outcome(result):
+    return ("error", str(result)) if isinstance(result, ExpressionError) else result
+
+def test_a_batch_matches_one_expression_at_a_time(monkeypatch):
+    batch = batch_of_expressions()
+    expected = [outcome(arithmetic._evaluate_or_error(e)) for e in batch]
+    assert expected[5] == 9223372036854775807 * 3 + 1 and expected[7][0] == "error"
+    monkeypatch.setattr(arithmetic, "_numpy", lambda: None)
+    assert [outcome(r) for r in evaluate_batch(batch)] == expected
+
+def test_numpy_batches_match_the_scalar_path(monkeypatch):
+    pytest.importorskip("numpy")
+    vectorized = []
+    evaluate_vector = arithmetic._evaluate_vector
+
+    def counting(np, compiled, members, results):
+        left = evaluate_vector(np, compiled, members, results)
+        vectorized.append(len(members) - len(left))
+        return left
+
+    monkeypatch.setattr(arithmetic, "_evaluate_vector", counting)
+    batch = batch_of_expressions()
+    expected = [outcome(arithmetic._evaluate_or_error(e)) for e in batch]
+    results = evaluate_batch(batch)
+    assert [outcome(r) for r in results] == expected
+    assert all(type(r) is int for r in results if not isinstance(r, ExpressionError))
+    # Every row but the overflowing ones and the leading zero went through NumPy.
+    assert vectorized == [len(batch) - 4]
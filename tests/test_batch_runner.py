@@ -0,0 +1,67 @@
+# tests/test_batch_runner.py
+import json
+import types
+import pytest
+import agent_registry
+from batch_runner import run_batch
+
+ITEMS = [
+    {"id": "a", "prompt": "one"},
+    {"id": "b", "prompt": "two"},
+    {"id": "c", "prompt": "three"},
+    {"id": "d", "prompt": "boom"},
+    {"id": "e", "title": ""},
+    {"id": "f", "prompt": "four", "agent": "nope"},
+]
+
+@pytest.fixture
+def agent(monkeypatch):
+    """A stub lang_no_gmail that echoes prompts and fails on the ones in agent.failing.
+
+    It is registered before run_batch starts its pool, so forked workers find
+    it already loaded.
+    """
+    stub = types.ModuleType("lang_no_gmail")
+    stub.failing = {"boom"}
+
+    def chat(prompt):
+        if prompt in stub.failing:
+            raise RuntimeError(f"cannot answer {prompt}")
+        return prompt.upper()
+
+    stub.chat = chat
+    monkeypatch.setitem(agent_registry._agents, "lang_no_gmail", stub)
+    return stub
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_a_second_run_skips_finished_items_and_retries_failures_on_request(agent, tmp_path):
+    source, output = tmp_path / "prompts.jsonl", tmp_path / "results.jsonl"
+    source.write_text("".join(json.dumps(item) + "\n" for item in ITEMS), encoding="utf-8")
+
+    def run(**kwargs):
+        return run_batch(str(source), str(output), workers=2, progress_every=0, **kwargs)
+
+    summary = run()
+    assert (summary["completed"], summary["failed"], summary["invalid"], summary["skipped"]) == (3, 3, 2, 0)
+    results = {row["id"]: row for row in read_results(output)}
+    assert results["a"]["response"] == "ONE" and results["d"]["error"] == "RuntimeError: cannot answer boom"
+    assert results["e"]["error"] == "Missing prompt" and results["f"]["error"] == "Unknown agent nope"
+
+    # A crash mid-write: "c" never made it to the file and its line is cut short.
+    rows = [line for line in output.read_text(encoding="utf-8").splitlines() if json.loads(line)["id"] != "c"]
+    output.write_text("\n".join(rows) + '\n{"id": "c", "agent": "lang_no_gm', encoding="utf-8")
+    summary = run()
+    assert (summary["completed"], summary["failed"], summary["skipped"]) == (1, 0, 5)
+    assert sorted(row["id"] for row in read_results(output)) == ["a", "b", "c", "d", "e", "f"]
+
+    # Failures are only run again with retry_failed.
+    agent.failing.clear()
+    summary = run()
+    assert (summary["completed"], summary["failed"], summary["skipped"]) == (0, 0, 6)
+    summary = run(retry_failed=True)
+    assert (summary["completed"], summary["failed"], summary["invalid"], summary["skipped"]) == (1, 2, 2, 3)
+    latest = {row["id"]: row for row in read_results(output)}
+    assert latest["d"]["ok"] and latest["d"]["response"] == "BOOM"
+    assert len(read_results(output)) == 9
@@ -0,0 +1,49 @@
+# tests/test_chat_stream.py
+import time
+from agent_graph import Agent
+from chat_stream import emit, is_streaming, stream_events
+
+def test_events_arrive_while_the_chat_is_still_running():
+    def slow_chat(prompt):
+        assert is_streaming()
+        emit("progress", message="thinking")
+        time.sleep(0.3)
+        emit("token", content=prompt.upper())
+        return "done"
+
+    events = []
+    for event in stream_events(slow_chat, "hi"):
+        event["received"] = time.perf_counter()
+        events.append(event)
+    assert [e["type"] for e in events] == ["progress", "token", "final"]
+    assert events[1]["content"] == "HI" and events[2]["content"] == "done"
+    assert events[0]["elapsed"] < 0.1 and events[2]["elapsed"] >= 0.3
+    # The first event is handed over as it happens, not when the chat returns.
+    assert events[2]["received"] - events[0]["received"] >= 0.25
+
+def test_an_exception_ends_the_stream_with_an_error_event():
+    def failing_chat(prompt):
+        raise RuntimeError("no luck")
+    assert list(stream_events(failing_chat, "hi"))[-1]["type"] == "error"
+    assert not is_streaming()
+
+def test_game_tokens_stream_long_before_the_answer(fake_openai, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    fake_openai.token_rate = 500        # the generated game takes about a second to stream
+    agent = Agent("test", gmail=False)
+    # The OpenAI SDK, and its chat resources, are imported on first use; measure a warm
+    # process, as a server would be.
+    import llm_client
+    llm_client.get_openai_client().chat.completions
+    events = list(agent.chat_stream("make a game about pong"))
+    kinds = [e["type"] for e in events]
+    assert kinds[-1] == "final" and kinds.index("tool_start") < kinds.index("token")
+    first_token = next(e["elapsed"] for e in events if e["type"] == "token")
+    total = events[-1]["elapsed"]
+    assert first_token < 0.2 and total > 0.8, (first_token, total)
+    assert "".join(e["content"] for e in events if e["type"] == "token").startswith("```html")
+
+def test_react_agent_streams_llm_tokens(lang_react):
+    events = list(lang_react.chat_stream("tell me a joke"))
+    assert events[-1]["type"] == "final"
+    assert any(e["type"] == "token" for e in events)
@@ -0,0 +1,90 @@
+# tests/test_game_cache.py
+import os
+import subprocess
+import sys
+import time
+from game_cache import GameCache
+
+GAME = "<!DOCTYPE html><html><head><title>Game</title></head><body></body></html>"
+
+def test_nothing_is_created_until_a_game_is_stored(tmp_path):
+    directory = tmp_path / "game_cache"
+    cache = GameCache(str(directory))
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0 and cache.misses == 1
+    assert not directory.exists()
+    cache.put("key", GAME)
+    assert (directory / "index.db").exists()
+    assert cache.get("key") == GAME
+
+def test_a_new_cache_reads_what_an_earlier_one_stored(tmp_path):
+    GameCache(str(tmp_path)).put("key", GAME)
+    cache = GameCache(str(tmp_path))
+    assert cache.get("key") == GAME and cache.stats()["entries"] == 1
+
+def test_importing_game_maker_creates_no_cache_directory(tmp_path):
+    directory = tmp_path / "game_cache"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", "import game_maker"], cwd=root, check=True,
+                   env={**os.environ, "GAME_CACHE_DIR": str(directory)})
+    assert not directory.exists()
+
+def game(n):
+    return GAME.replace("Game", f"Game {n}")
+
+def files(directory):
+    return sorted(p.name for p in directory.glob("*.html"))
+
+def test_least_recently_used_games_are_evicted_past_max_bytes(tmp_path):
+    size = len(game(1).encode("utf-8"))
+    cache = GameCache(str(tmp_path), max_bytes=2 * size)
+    cache.put("one", game(1))
+    time.sleep(0.01)
+    cache.put("two", game(2))
+    time.sleep(0.01)
+    assert cache.get("one") == game(1)
+    time.sleep(0.01)
+    cache.put("three", game(3))
+    assert cache.get("two") is None
+    assert cache.get("one") == game(1) and cache.get("three") == game(3)
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2 and stats["bytes"] <= 2 * size
+    assert len(files(tmp_path)) == 2
+
+def test_a_key_is_served_once_all_its_variants_are_filled(tmp_path):
+    cache = GameCache(str(tmp_path), variants=2)
+    cache.put("key", game(1))
+    assert cache.get("key") is None
+    time.sleep(0.01)
+    cache.put("key", game(2))
+    assert {cache.get("key") for _ in range(30)} == {game(1), game(2)}
+    time.sleep(0.01)
+    # A third variant replaces the oldest, and its file goes with it.
+    cache.put("key", game(3))
+    assert {cache.get("key") for _ in range(30)} == {game(2), game(3)}
+    assert cache.stats()["entries"] == 2 and len(files(tmp_path)) == 2
+
+def test_a_file_shared_by_two_keys_stays_until_neither_uses_it(tmp_path):
+    cache = GameCache(str(tmp_path), variants=1)
+    cache.put("one", GAME)
+    cache.put("two", GAME)
+    assert len(files(tmp_path)) == 1
+    time.sleep(0.01)
+    cache.put("one", game(1))
+    assert cache.get("two") == GAME and len(files(tmp_path)) == 2
+    time.sleep(0.01)
+    cache.put("two", game(2))
+    assert cache.get("one") == game(1) and cache.get("two") == game(2)
+    assert len(files(tmp_path)) == 2 and cache.stats()["entries"] == 2
+
+def test_a_cached_game_is_made_without_calling_the_llm(fake_openai, tmp_path, monkeypatch):
+    import game_maker
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(game_maker, "game_cache", GameCache(str(tmp_path / "game_cache")))
+    first = game_maker.make_game("snake", open_browser=False, stream=False, candidates=1)
+    assert game_maker.game_created(first) and fake_openai.total_calls() > 0
+    calls = fake_openai.total_calls()
+    second = game_maker.make_game("  Snake ", open_browser=False, stream=False, candidates=1)
+    # Saved files are named by their content, so the cached game lands in the same file.
+    assert second == first and fake_openai.total_calls() == calls
+    assert game_maker.game_cache.stats()["hits"] == 1
@@ -0,0 +1,204 @@
+# tests/test_game_maker.py
+import random
+import re
+import time
+import pytest
+import game_maker
+from fake_services import FAKE_GAME_HTML, fake_reply
+from html_validator import check_html
+
+# A game that is doomed from its second <script> tag on, followed by a long tail.
+DOOMED_GAME = ("```html\n<!DOCTYPE html><html><body><script>start()</script><script>again()</script>\n"
+               + "<p>more and more of the page</p>\n" * 400 + "</body></html>\n```")
+
+@pytest.fixture(autouse=True)
+def workdir(monkeypatch, tmp_path):
+    """Saved games go to a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def _generation_calls(messages) -> bool:
+    return "Create a complete HTML game" in messages[-1]["content"]
+
+def test_a_doomed_stream_is_cancelled_at_the_second_script_tag(fake_openai):
+    fake_openai.reply = lambda messages: DOOMED_GAME
+    fake_openai.token_rate = 1000      # the whole reply would take about 3.5 s
+    start = time.perf_counter()
+    text, error, diagnostics = game_maker.generate_game_html_streaming(game_maker.refine_game_prompt("snake"))
+    elapsed = time.perf_counter() - start
+    assert error.code == "multiple_scripts" and diagnostics is None
+    assert len(text) < len(DOOMED_GAME) // 10
+    assert elapsed < 1.0, elapsed
+
+def test_the_stream_is_closed_once_the_code_fence_ends(fake_openai):
+    # A ``` inside the document does not end it; the fence after </html> does.
+    game = FAKE_GAME_HTML.replace("<script>", '<script>\nconst fence = "```";', 1)
+    fake_openai.reply = lambda messages: game + "\n\nHere is how the game works. " * 300
+    fake_openai.token_rate = 1000
+    start = time.perf_counter()
+    text, error, diagnostics = game_maker.generate_game_html_streaming(game_maker.refine_game_prompt("snake"))
+    assert time.perf_counter() - start < 1.5
+    assert error is None and diagnostics == []
+    assert text.count("Here is how the game works") < 10
+    assert game_maker.extract_html_content(text) == game_maker.extract_html_content(game)
+
+def test_make_game_retries_straight_away_after_an_aborted_stream(fake_openai):
+    prompts = []
+
+    def reply(messages):
+        if _generation_calls(messages):
+            prompts.append(messages[-1]["content"])
+            return DOOMED_GAME if len(prompts) == 1 else FAKE_GAME_HTML
+        return fake_reply(messages)
+    fake_openai.reply = reply
+    assert re.fullmatch(r"snake_game_[0-9a-f]{12}\.html",
+                        game_maker.make_game("snake", open_browser=False, stream=True, use_cache=False))
+    assert len(prompts) == 2
+    assert "Multiple script tags detected." in prompts[1]
+    # Two generations and the refine pass.
+    assert fake_openai.calls["chat"] == 3
+
+def test_streamed_diagnostics_match_a_whole_document_check():
+    rng = random.Random(0)
+    html = game_maker.extract_html_content(FAKE_GAME_HTML)
+    stray_fence = FAKE_GAME_HTML.replace("<script>", '<script>\nconst fence = "```";', 1)
+    for reply in (FAKE_GAME_HTML, html, FAKE_GAME_HTML.replace("</html>", ""), "Sure!\n" + FAKE_GAME_HTML,
+                  stray_fence, stray_fence.replace("</html>", "") + "\nThat's it."):
+        check, i = game_maker.StreamingHTMLCheck(), 0
+        while i < len(reply) and not check.complete:
+            step = rng.randint(1, 9)
+            check.feed(reply[i:i + step])
+            i += step
+        extracted = game_maker.extract_html_content(check.text)
+        assert check.close(extracted) == check_html(extracted)
+
+INVALID_GAME = "```html\n<div>No document structure</div>\n```"
+
+class CountingReply:
+    """A fake_reply that answers generation calls from a list and tracks how many run at once."""
+
+    def __init__(self, games, seconds: float = 0.0):
+        self.games = list(games)
+        self.seconds = seconds
+        self.generations = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    def __call__(self, messages):
+        if not _generation_calls(messages):
+            return fake_reply(messages)
+        self.generations += 1
+        game = self.games[min(self.generations, len(self.games)) - 1]
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.seconds)
+        self.in_flight -= 1
+        return game
+
+def test_speculative_mode_takes_the_first_valid_candidate(fake_openai):
+    fake_openai.reply = reply = CountingReply([INVALID_GAME, FAKE_GAME_HTML, FAKE_GAME_HTML], seconds=0.3)
+    start = time.perf_counter()
+    assert game_maker.make_game("snake", open_browser=False, use_cache=False, candidates=3).startswith("snake_game_")
+    elapsed = time.perf_counter() - start
+    assert reply.generations == 3 and reply.peak == 3
+    # One round of parallel candidates, not a 0.3 s call per attempt.
+    assert elapsed < 0.6, elapsed
+
+def test_speculative_mode_stops_at_max_calls(fake_openai):
+    fake_openai.reply = reply = CountingReply([INVALID_GAME])
+    html, message = game_maker.asyncio.run(
+        game_maker.make_game_html_speculative("snake", candidates=2, max_concurrency=2, max_calls=5))
+    assert html is None and message.startswith("Error: Failed to generate valid HTML")
+    assert reply.generations == 5
+
+def test_speculative_mode_respects_max_concurrency(fake_openai):
+    fake_openai.reply = reply = CountingReply([INVALID_GAME, INVALID_GAME, FAKE_GAME_HTML], seconds=0.05)
+    html, _ = game_maker.asyncio.run(
+        game_maker.make_game_html_speculative("snake", candidates=3, max_concurrency=1, max_calls=3))
+    assert html is not None and reply.peak == 1
+
+def test_speculative_mode_rides_out_server_errors(fake_openai):
+    fake_openai.error_rate = 0.3
+    fake_openai.reply = reply = CountingReply([FAKE_GAME_HTML])
+    html, message = game_maker.asyncio.run(
+        game_maker.make_game_html_speculative("snake", candidates=3, max_concurrency=3, max_calls=6))
+    assert html is not None and message == "Basic validation passed."
+    assert fake_openai.errors > 0
+    # The client retries the errors itself, so they cost no extra generations.
+    assert reply.generations == 3
+
+# Canned refinement replies for patch mode.
+GAME = game_maker.extract_html_content(FAKE_GAME_HTML)
+PATCH = """Here are the fixes:
+
+<<<<<<< SEARCH
+<title>Fake Game</title>
+=======
+<title>Fake Game 2</title>
+>>>>>>> REPLACE
+
+<<<<<<< SEARCH
+    document.getElementById('score').textContent = score;
+=======
+    document.getElementById('score').textContent = 'Score: ' + score;
+>>>>>>> REPLACE
+"""
+
+def test_the_patch_prompt_shows_unindented_example_blocks():
+    prompt = game_maker.refine_patch_messages(GAME)[-1]["content"]
+    assert GAME in prompt
+    lines = prompt.splitlines()
+    for marker in ("<<<<<<< SEARCH", "=======", ">>>>>>> REPLACE"):
+        assert marker in lines
+
+def test_canned_edits_are_parsed_and_applied():
+    edits = game_maker.parse_search_replace(PATCH)
+    assert edits[0] == ("<title>Fake Game</title>", "<title>Fake Game 2</title>")
+    patched = game_maker.patched_html(GAME, PATCH)
+    assert "<title>Fake Game 2</title>" in patched
+    assert "textContent = 'Score: ' + score;" in patched
+    assert patched.replace("Fake Game 2", "Fake Game").replace("'Score: ' + score", "score") == GAME
+
+def test_indented_blocks_and_crlf_replies_still_apply():
+    indented = "\n".join("    " + line if line else line for line in PATCH.splitlines())
+    assert game_maker.patched_html(GAME, indented) == game_maker.patched_html(GAME, PATCH) != GAME
+    assert game_maker.patched_html(GAME, PATCH.replace("\n", "\r\n")) == game_maker.patched_html(GAME, PATCH)
+
+@pytest.mark.parametrize("reply", [
+    "NO CHANGES",
+    "I think it looks great!",
+    "<<<<<<< SEARCH\n<title>Not in the document</title>\n=======\n<title>x</title>\n>>>>>>> REPLACE",
+    # Applied in order, so the second edit no longer finds its text.
+    PATCH + "\n<<<<<<< SEARCH\n<title>Fake Game</title>\n=======\n<title>Again</title>\n>>>>>>> REPLACE",
+])
+def test_replies_that_do_not_apply_keep_the_original(reply):
+    assert game_maker.patched_html(GAME, reply) == GAME
+
+def test_make_game_keeps_the_original_when_the_patched_game_is_invalid(fake_openai, workdir):
+    broken = "<<<<<<< SEARCH\n</html>\n=======\n\n>>>>>>> REPLACE"
+    fake_openai.reply = lambda messages: broken if "search/replace blocks" in messages[-1]["content"] \
+        else fake_reply(messages)
+    filename = game_maker.make_game("catch", open_browser=False, stream=False, use_cache=False)
+    assert (workdir / filename).read_text() == GAME
+
+def test_make_game_saves_the_patched_game(fake_openai, workdir):
+    fake_openai.reply = lambda messages: PATCH if "search/replace blocks" in messages[-1]["content"] \
+        else fake_reply(messages)
+    filename = game_maker.make_game("catch", open_browser=False, stream=False, use_cache=False)
+    assert "<title>Fake Game 2</title>" in (workdir / filename).read_text()
+
+def test_games_with_the_same_name_get_their_own_files(workdir):
+    first = game_maker.save_game_file("snake_game", GAME)
+    second = game_maker.save_game_file("snake_game", GAME.replace("Fake Game", "Other Game"))
+    assert first != second and first.startswith("snake_game_") and second.startswith("snake_game_")
+    assert (workdir / first).read_text() == GAME
+    assert game_maker.save_game_file("snake_game", GAME) == first
+
+@pytest.mark.parametrize("result, created", [
+    ("Successfully created game", True),
+    ("snake_game_0123456789ab.html", True),
+    ("Error: Failed to generate valid HTML after multiple attempts.", False),
+    ("Error saving file: disk full.html", False),
+])
+def test_game_created_accepts_a_saved_file_name(result, created):
+    assert game_maker.game_created(result) is created
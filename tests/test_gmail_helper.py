@@ -0,0 +1,204 @@
+# tests/test_gmail_helper.py
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+import gmail_helper
+from gmail_helper import GmailService, get_recent_emails
+
+def _count_builds(monkeypatch) -> list:
+    builds = []
+    build = GmailService._build_service
+
+    def counting_build(self, creds):
+        builds.append(self)
+        return build(self, creds)
+    monkeypatch.setattr(GmailService, "_build_service", counting_build)
+    return builds
+
+def test_the_client_is_built_once_and_reused(fake_gmail, monkeypatch):
+    builds = _count_builds(monkeypatch)
+    timings = []
+    for _ in range(6):
+        start = time.perf_counter()
+        assert get_recent_emails(1)[0]["subject"] == "Message 0"
+        timings.append(time.perf_counter() - start)
+    assert len(builds) == 1
+    # The first call pays for loading the discovery document and building the client; later calls do not.
+    assert sorted(timings[1:])[2] * 3 < timings[0], timings
+
+def test_the_discovery_document_is_kept_locally(fake_gmail, monkeypatch, tmp_path):
+    get_recent_emails(1)
+    assert os.path.exists(tmp_path / "gmail_discovery.json")
+
+    def no_fetch(*args):
+        raise AssertionError("the discovery document was fetched again")
+    monkeypatch.setattr("googleapiclient.discovery_cache.get_static_doc", no_fetch)
+    monkeypatch.setattr(gmail_helper, "gmail_service", GmailService(discovery_path=str(tmp_path / "gmail_discovery.json")))
+    assert get_recent_emails(1)[0]["subject"] == "Message 0"
+
+def test_threads_share_the_client_but_not_connections(fake_gmail, monkeypatch):
+    builds = _count_builds(monkeypatch)
+    connections, results = set(), []
+
+    def read():
+        results.append([e["id"] for e in get_recent_emails(3)])
+        connections.add(id(gmail_helper.gmail_service._local.http))
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [["m00000", "m00001", "m00002"]] * 8
+    assert len(builds) == 1 and len(connections) == 8
+
+class FakeCredentials:
+    """Just enough of google.oauth2.credentials.Credentials for the refresher."""
+
+    def __init__(self, token: str, expires_in: float):
+        self.token = token
+        self.refresh_token = "refresh"
+        self.expiry = datetime.utcnow() + timedelta(seconds=expires_in)
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = f"token-{self.refreshes}"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    def to_json(self) -> str:
+        return json.dumps({"token": self.token, "refresh_token": self.refresh_token})
+
+def test_token_json_is_only_written_when_the_token_changes(tmp_path):
+    path = tmp_path / "token.json"
+    service = GmailService(token_path=str(path))
+    creds = FakeCredentials("token-0", expires_in=3600)
+    service._save_token(creds)
+    assert json.loads(path.read_text())["token"] == "token-0"
+    path.unlink()
+    service._save_token(creds)
+    assert not path.exists()
+    creds.refresh(None)
+    service._save_token(creds)
+    assert json.loads(path.read_text())["token"] == "token-1"
+
+def test_the_token_is_refreshed_in_the_background_before_it_expires(tmp_path):
+    path = tmp_path / "token.json"
+    service = GmailService(token_path=str(path), refresh_margin=60)
+    # Within the margin already, so the refresher renews it straight away.
+    service._creds = creds = FakeCredentials("token-0", expires_in=30)
+    service._start_refresher()
+    try:
+        deadline = time.monotonic() + 5
+        while creds.refreshes == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert creds.refreshes == 1
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert json.loads(path.read_text())["token"] == "token-1"
+    finally:
+        service.close()
+
+def _record_queries(fake, monkeypatch) -> list:
+    queries = []
+    route = fake.route
+
+    def recording_route(method, path, query):
+        queries.append((path.rsplit("/", 1)[-1], query))
+        return route(method, path, query)
+    monkeypatch.setattr(fake, "route", recording_route)
+    return queries
+
+def test_recent_emails_are_fetched_as_metadata_in_one_batch(fake_gmail, monkeypatch):
+    queries = _record_queries(fake_gmail, monkeypatch)
+    emails = get_recent_emails(10)
+    assert [e["id"] for e in emails] == [f"m{i:05d}" for i in range(10)]
+    assert emails[3]["subject"] == "Message 3" and emails[3]["from"] == "sender3@example.com"
+    assert emails[3]["snippet"] == "Snippet of message 3" and emails[3]["date"]
+    # One list call and one batch request carrying the ten gets, instead of eleven round trips.
+    assert fake_gmail.calls == {"list": 1, "batch": 1, "get": 10}
+    assert all(query["format"] == "metadata" for name, query in queries if name.startswith("m0"))
+
+def test_a_single_email_skips_the_batch_envelope(fake_gmail):
+    assert [e["id"] for e in get_recent_emails(1)] == ["m00000"]
+    assert fake_gmail.calls == {"list": 1, "get": 1}
+
+def test_large_requests_are_split_into_batches(fake_gmail, monkeypatch):
+    monkeypatch.setattr(gmail_helper, "MAX_BATCH_SIZE", 4)
+    assert len(get_recent_emails(10)) == 10
+    assert fake_gmail.calls == {"list": 1, "batch": 3, "get": 10}
+
+def test_messages_that_fail_to_load_are_skipped(fake_gmail):
+    emails = gmail_helper.fetch_email_metadata(["m00002", "deleted", "m00001"])
+    assert [e["id"] for e in emails] == ["m00002", "m00001"]
+
+def test_a_single_message_that_fails_to_load_is_skipped(fake_gmail, capsys):
+    assert gmail_helper.fetch_email_metadata(["deleted"]) == []
+    assert "Error fetching message deleted" in capsys.readouterr().out
+    assert fake_gmail.calls == {"get": 1}
+
+def test_the_gmail_tool_reads_several_emails(fake_gmail, monkeypatch):
+    import tool_registry
+
+    def no_mirror(count):
+        raise RuntimeError("no mirror")
+    monkeypatch.setattr(tool_registry, "recent_emails", no_mirror)
+    reply = tool_registry.recent_email("show me my last 3 emails")
+    assert reply.startswith("3 Most Recent Emails:\n1. Message 0 - sender0@example.com")
+    assert tool_registry.recent_email("check my email") == "Most Recent Email:\nSubject: Message 0\nSnippet: Snippet of message 0"
+
+@pytest.fixture
+def new_mirror(fake_gmail, monkeypatch, tmp_path):
+    """get_mirror() builds a fresh mirror of 10 messages in tmp_path."""
+    import gmail_mirror
+    mirrors = []
+    GmailMirror = gmail_mirror.GmailMirror
+
+    def make():
+        mirrors.append(GmailMirror(str(tmp_path / "mirror.db"), full_sync_size=10))
+        return mirrors[-1]
+    monkeypatch.setattr(gmail_mirror, "gmail_service", gmail_helper.gmail_service)
+    monkeypatch.setattr(gmail_mirror, "_mirror", None)
+    monkeypatch.setattr(gmail_mirror, "GmailMirror", make)
+    yield gmail_mirror
+    for mirror in mirrors:
+        mirror.stop()
+
+def test_the_mirror_syncs_in_the_background_and_the_api_answers_meanwhile(new_mirror, fake_gmail):
+    fake_gmail.inject(stall=0.3)
+    start = time.perf_counter()
+    mirror = new_mirror.get_mirror()
+    assert time.perf_counter() - start < 0.2
+    assert not mirror.ready.is_set()
+    fake_gmail.inject()
+    assert new_mirror.recent_emails(2)[0]["subject"] == "Message 0"
+    assert mirror.ready.wait(5)
+    calls = fake_gmail.total_calls()
+    assert [e["subject"] for e in new_mirror.recent_emails(3)] == ["Message 0", "Message 1", "Message 2"]
+    assert fake_gmail.total_calls() == calls
+
+@pytest.fixture
+def synced_mirror(fake_gmail, monkeypatch, tmp_path):
+    """A mirror of the 10 newest FakeGmail messages, fully synced once."""
+    import gmail_mirror
+    monkeypatch.setattr(gmail_mirror, "gmail_service", gmail_helper.gmail_service)
+    mirror = gmail_mirror.GmailMirror(str(tmp_path / "mirror.db"), full_sync_size=10)
+    mirror.sync()
+    fake_gmail.calls.clear()
+    return mirror
+
+def test_a_message_deleted_before_it_is_fetched_does_not_force_a_full_resync(synced_mirror, fake_gmail):
+    fake_gmail.history = [{"messagesAdded": [{"message": {"id": "gone"}}]},
+                          {"messagesDeleted": [{"message": {"id": "m00000"}}]}]
+    synced_mirror.sync()
+    assert fake_gmail.calls == {"history": 1, "get": 1}
+    assert [e["id"] for e in synced_mirror.recent(2)] == ["m00001", "m00002"]
+    assert synced_mirror.history_id == "1002"
+
+def test_expired_history_forces_a_full_resync(synced_mirror, fake_gmail):
+    fake_gmail.history_expired = True
+    synced_mirror.sync()
+    assert fake_gmail.calls["history"] == 1 and fake_gmail.calls["list"] == 1
+    assert synced_mirror.recent(1)[0]["id"] == "m00000"
@@ -0,0 +1,48 @@
+# tests/test_html_validator.py
+import random
+import pytest
+from html_validator import IncrementalHTMLValidator, _legacy_validate, _sample_game, check_html, summarize
+
+QUOTED = "<!DOCTYPE html><html><body><p title='a<b'>x</p><a href=\"x>y\">l</a></body></html>"
+
+def feed_in_pieces(doc, cuts):
+    validator = IncrementalHTMLValidator()
+    for start, end in zip([0] + cuts, cuts + [len(doc)]):
+        validator.feed(doc[start:end])
+    return validator.close()
+
+@pytest.mark.parametrize("doc", [
+    _sample_game(10),
+    _sample_game(10).replace("</html>", ""),
+    _sample_game(10) + "<script></script>",
+    "<html><body></body></html>",
+], ids=["valid", "no_html_close", "two_scripts", "no_doctype"])
+def test_the_verdict_matches_the_old_parser_and_regex_checks(doc):
+    assert summarize(check_html(doc))[0] == _legacy_validate(doc)[0]
+
+def test_a_document_streamed_in_small_chunks_matches_one_pass():
+    game = _sample_game(400)
+    assert feed_in_pieces(game, list(range(7, len(game), 7))) == check_html(game)
+
+def test_a_tag_split_inside_a_quoted_attribute_value_is_read_as_one_tag():
+    cut = QUOTED.index("a<b") + 3
+    assert feed_in_pieces(QUOTED, [cut]) == check_html(QUOTED) == []
+
+@pytest.mark.parametrize("doc", [QUOTED, QUOTED.replace("</p>", ""), _sample_game(3)],
+                         ids=["quoted", "unclosed_p", "game"])
+def test_any_split_gives_the_same_diagnostics(doc):
+    expected = check_html(doc)
+    for cut in range(1, len(doc)):
+        assert feed_in_pieces(doc, [cut]) == expected, doc[:cut]
+    rng = random.Random(0)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(doc)), 10))
+        assert feed_in_pieces(doc, cuts) == expected, cuts
+
+def test_a_second_script_is_fatal_and_stops_the_scan():
+    validator = IncrementalHTMLValidator()
+    assert validator.feed("<!DOCTYPE html><html><script></script>") is None
+    fatal = validator.feed("<script>")
+    assert fatal is not None and fatal.code == "multiple_scripts"
+    assert validator.feed("</div></html>") is fatal
+    assert summarize(validator.close()) == (False, "Multiple script tags detected.")
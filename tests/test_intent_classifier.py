@@ -0,0 +1,29 @@
+# tests/test_intent_classifier.py
+import pytest
+from intent_classifier import AGENT_LABEL, load_examples, predict_tool
+
+@pytest.mark.parametrize("prompt", [
+    "how do I make a game in unity",
+    "how do you make a tetris game in javascript",
+    "how can I build a snake game in python",
+    "why is my snake game so slow",
+    "what's the easiest way to create a game",
+    "why did the roman empire fall",
+])
+def test_questions_about_a_tool_go_to_the_agent(prompt):
+    assert predict_tool(prompt) is None
+
+@pytest.mark.parametrize("prompt, expected", [
+    ("make a snake game", ("GameGenerator", "snake")),
+    ("who is Ada Lovelace", ("WikipediaTool", "Ada Lovelace")),
+    ("calculate 2+2", ("Calculator", "calculate 2+2")),
+])
+def test_clear_requests_skip_the_agent(prompt, expected):
+    assert predict_tool(prompt) == expected
+
+def test_no_eval_prompt_is_short_circuited_to_the_wrong_tool():
+    for text, label in load_examples(split="eval"):
+        routed = predict_tool(text)
+        assert routed is None or routed[0] == label, (text, routed)
+        if label == AGENT_LABEL:
+            assert routed is None, text
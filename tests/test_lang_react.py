@@ -0,0 +1,48 @@
+# tests/test_lang_react.py
+
+def test_games_saved_without_a_browser_are_successes_for_the_breaker(lang_react, monkeypatch):
+    monkeypatch.setattr(lang_react, "make_game", lambda idea: "snake_game_0123456789ab.html")
+    breaker = lang_react.generate_game.breaker
+    failures, successes = breaker.counters["failures"], breaker.counters["successes"]
+    for _ in range(breaker.failures + 1):
+        assert lang_react.generate_game("snake").startswith("Game 'snake' created successfully!")
+    assert breaker.state == "closed"
+    assert breaker.counters["failures"] == failures
+    assert breaker.counters["successes"] == successes + breaker.failures + 1
+
+def test_failed_games_are_errors(lang_react, monkeypatch):
+    monkeypatch.setattr(lang_react, "make_game", lambda idea: "Error: Failed to generate valid HTML.")
+    breaker = lang_react.generate_game.breaker
+    failures = breaker.counters["failures"]
+    assert lang_react.generate_game("a game nobody asked for before").startswith("Error: ")
+    assert breaker.counters["failures"] == failures + 1
+    breaker.record_success()
+
+def test_a_game_made_with_the_browser_off_is_reported_as_created(lang_react, monkeypatch, tmp_path):
+    import game_maker
+    monkeypatch.chdir(tmp_path)
+    # conftest.py turns the browser off, as server.py and batch_runner.py do.
+    assert not game_maker.OPEN_BROWSER
+    monkeypatch.setattr(game_maker.game_cache, "get", lambda key: None)
+    monkeypatch.setattr(game_maker.game_cache, "put", lambda key, html: None)
+    reply = lang_react.generate_game("Pong")
+    saved = list(tmp_path.glob("pong_game_*.html"))
+    assert len(saved) == 1
+    assert reply == f"Game 'Pong' created successfully! Saved as {saved[0].name}."
+
+def test_react_steps_are_only_cached_with_llm_cache_sampling(lang_react, fake_openai):
+    # The model samples, so by default every run of the agent calls it.
+    assert not lang_react.llm.cache.enabled
+    assert lang_react.chat("tell me a joke") == lang_react.chat("tell me a joke")
+    assert fake_openai.total_calls() == 2
+
+def test_a_repeated_react_prompt_is_served_from_the_cache(lang_react, fake_openai, monkeypatch):
+    import importlib
+    from llm_cache import response_cache
+    # LLM_CACHE_SAMPLING=1
+    monkeypatch.setattr(response_cache, "cache_sampling", True)
+    lang_react = importlib.reload(lang_react)
+    first = lang_react.chat("tell me a joke")
+    assert fake_openai.total_calls() == 1
+    assert lang_react.chat("tell me a joke") == first
+    assert fake_openai.total_calls() == 1
@@ -0,0 +1,49 @@
+# tests/test_llm_cache.py
+import pytest
+import game_maker
+from cache import TTLCache
+from fake_services import FAKE_GAME_HTML
+from llm_cache import LLMResponseCache
+
+GAME = game_maker.extract_html_content(FAKE_GAME_HTML)
+
+def _key(content: str, params=None) -> str:
+    return LLMResponseCache.make_key([{"role": "user", "content": content}], params or {"model": "gpt-4o"})
+
+def test_only_the_edges_of_a_message_are_normalized():
+    assert _key("  what is python\n") == _key("what is python") == _key("what is python\r\n")
+    assert _key("what  is python") != _key("what is python")
+    # Refine prompts for documents that differ only in indentation must not share an answer.
+    reindented = GAME.replace("\n  ", "\n    ")
+    assert reindented != GAME
+    assert _key(game_maker.refine_patch_messages(GAME)[-1]["content"]) != \
+        _key(game_maker.refine_patch_messages(reindented)[-1]["content"])
+
+@pytest.mark.parametrize("params, use_cache, cached", [
+    ({"model": "gpt-4o", "temperature": 0}, None, True),
+    ({"model": "gpt-4o", "temperature": 0.7}, None, False),
+    ({"model": "gpt-4o"}, None, False),
+    ({"model": "gpt-4o", "temperature": 0.7}, True, True),
+    ({"model": "gpt-4o", "temperature": 0}, False, False),
+])
+def test_sampled_calls_are_only_cached_when_asked(params, use_cache, cached):
+    cache = LLMResponseCache(TTLCache(), cache_sampling=False)
+    messages = [{"role": "user", "content": "hi"}]
+    cache.store(messages, params, "hello", use_cache)
+    assert (cache.lookup(messages, params, use_cache) == "hello") is cached
+
+def test_sampled_calls_are_cached_with_llm_cache_sampling():
+    cache = LLMResponseCache(TTLCache(), cache_sampling=True)
+    messages = [{"role": "user", "content": "hi"}]
+    cache.store(messages, {"model": "gpt-4o", "temperature": 0.7}, "hello")
+    assert cache.lookup(messages, {"model": "gpt-4o", "temperature": 0.7}) == "hello"
+
+def test_complete_can_opt_in_to_the_cache(fake_openai):
+    messages = [{"role": "user", "content": "ping"}]
+    params = {"model": "gpt-4o", "temperature": 0.7}
+    for _ in range(2):
+        assert game_maker.complete(messages, params) == "pong"
+    assert fake_openai.calls["chat"] == 2
+    for _ in range(2):
+        assert game_maker.complete(messages, params, use_cache=True) == "pong"
+    assert fake_openai.calls["chat"] == 3
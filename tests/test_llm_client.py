@@ -0,0 +1,81 @@
+# tests/test_llm_client.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+import llm_client
+from fake_services import FakeOpenAI
+from llm_client import RateLimitedTransport, RateLimiter, TokenBucket
+
+REQUEST = {"model": "gpt-4o", "messages": [{"role": "user", "content": "ping"}], "max_tokens": 5}
+
+@pytest.fixture
+def post(monkeypatch):
+    """post(fake, limiter) sends one chat completion through a RateLimitedTransport."""
+    # Only the server's Retry-After should make the client wait.
+    monkeypatch.setattr(llm_client, "BACKOFF_BASE", 0.001)
+    clients = []
+
+    def post(fake, limiter):
+        if not clients:
+            clients.append(httpx.Client(transport=RateLimitedTransport(limiter), timeout=10))
+        return clients[0].post(fake.url + "/v1/chat/completions", json=REQUEST)
+    yield post
+    for client in clients:
+        client.close()
+
+def test_429s_are_retried_after_the_servers_retry_after(post):
+    limiter = RateLimiter(rpm=60000, tpm=10 ** 9, max_retries=5)
+    with FakeOpenAI(fail_first=3, retry_after=0.2) as fake:
+        start = time.perf_counter()
+        response = post(fake, limiter)
+        elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"]["content"] == "pong"
+    stats = limiter.stats()
+    assert stats["requests"] == 4 and stats["retries"] == 3 and stats["rate_limited"] == 3
+    assert 0.6 <= elapsed < 1.5, elapsed
+
+def test_retries_stop_after_max_retries(post):
+    limiter = RateLimiter(rpm=60000, tpm=10 ** 9, max_retries=2)
+    with FakeOpenAI(fail_first=10, retry_after=0.01) as fake:
+        response = post(fake, limiter)
+        assert fake.calls == {"chat": 3}
+    assert response.status_code == 429
+    assert limiter.stats()["retries"] == 2 and limiter.stats()["rate_limited"] == 3
+
+def test_503s_are_retried_until_the_outage_ends(post):
+    limiter = RateLimiter(rpm=60000, tpm=10 ** 9, max_retries=20)
+    with FakeOpenAI() as fake:
+        fake.inject(failure_rate=1.0)
+        recovery = threading.Timer(0.2, fake.inject)
+        recovery.start()
+        response = post(fake, limiter)
+        recovery.join()
+    assert response.status_code == 200
+    stats = limiter.stats()
+    assert stats["server_errors"] >= 1 and stats["retries"] == stats["server_errors"]
+    assert stats["requests"] == stats["retries"] + 1
+
+def test_the_token_bucket_paces_requests(post):
+    # 600 requests a minute is one every 0.1 s; with 2 in the bucket, 12 calls take about 1 s.
+    limiter = RateLimiter(rpm=600, tpm=10 ** 9, max_concurrency=8)
+    with FakeOpenAI() as fake:
+        post(fake, limiter)  # opens the connection pool outside the timing
+        limiter.requests.level = 2
+        start = time.perf_counter()
+        with ThreadPoolExecutor(8) as pool:
+            statuses = list(pool.map(lambda _: post(fake, limiter).status_code, range(12)))
+        elapsed = time.perf_counter() - start
+    assert statuses == [200] * 12
+    assert 0.9 <= elapsed < 1.5, elapsed
+    assert limiter.stats()["throttled_seconds"] > 4
+
+def test_reserve_returns_the_wait_for_the_missing_units():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(2) == pytest.approx(2.0, abs=0.05)
+    # A request larger than the bucket is charged at most the bucket's size.
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(1000) == 0.0
@@ -0,0 +1,36 @@
+# tests/test_memory.py
+import memory
+from memory import ConversationMemory, ConversationStore
+
+def test_the_context_stays_within_the_window():
+    conversation = ConversationMemory("window", window_tokens=100, summary_tokens=50)
+    for i in range(50):
+        conversation.add_exchange(f"What is {i} plus {i}?", f"{i} plus {i} is {2 * i}. " * 3)
+    stats = conversation.stats()
+    assert stats["window_tokens"] <= 100 and stats["summary_tokens"] <= 50 and stats["turns"] == 100
+    assert conversation.context()[0]["role"] == "system"
+
+def test_sessions_reload_from_the_store(tmp_path):
+    store = ConversationStore(str(tmp_path / "memory.db"))
+    conversation = ConversationMemory("reload", store, window_tokens=60)
+    for i in range(20):
+        conversation.add_exchange(f"question {i}", f"answer {i}")
+    assert ConversationMemory("reload", store, window_tokens=60).context() == conversation.context()
+
+def test_evicting_a_session_without_a_store_is_logged(monkeypatch, capsys):
+    monkeypatch.setattr(memory, "_store", None)
+    monkeypatch.setattr(memory, "_sessions", memory.OrderedDict())
+    monkeypatch.setattr(memory, "MEMORY_MAX_SESSIONS", 2)
+    for session in ("a", "b", "a", "c"):
+        memory.get_memory(session)
+    assert list(memory._sessions) == ["a", "c"]
+    assert "dropped session 'b'" in capsys.readouterr().out
+
+def test_evicting_a_session_with_a_store_is_quiet(monkeypatch, capsys, tmp_path):
+    monkeypatch.setattr(memory, "_store", ConversationStore(str(tmp_path / "memory.db")))
+    monkeypatch.setattr(memory, "_sessions", memory.OrderedDict())
+    monkeypatch.setattr(memory, "MEMORY_MAX_SESSIONS", 1)
+    memory.get_memory("a").add_exchange("hello", "hi")
+    memory.get_memory("b")
+    assert capsys.readouterr().out == ""
+    assert memory.get_memory("a").turn_count == 2
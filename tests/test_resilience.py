@@ -0,0 +1,129 @@
+# tests/test_resilience.py
+import itertools
+import threading
+import time
+import pytest
+import resilience
+import wiki
+from cache import TieredCache, TTLCache
+from chat_stream import emit, stream_events
+from fake_services import FakeWikipedia
+from resilience import CLOSED, OPEN, CircuitBreaker, Guard, cancelled
+
+_names = itertools.count()
+
+def guard(fn, timeout=None, fallback=None, failures=3):
+    """A Guard with its own breaker, so tests do not share breaker state."""
+    name = f"test-tool-{next(_names)}"
+    with resilience._breakers_lock:
+        resilience._breakers[name] = CircuitBreaker(name, failures=failures, reset_seconds=60)
+    return Guard(name, fn, timeout, fallback)
+
+class NoMemo(dict):
+    def __setitem__(self, key, value):
+        pass
+
+@pytest.fixture
+def fake_wikipedia(monkeypatch):
+    """A FakeWikipedia server behind the real wikipedia package, with wiki's cache emptied.
+
+    The package memoizes search() and summary() forever, so every memo is
+    swapped for a dict that stores nothing.
+    """
+    wikipedia = pytest.importorskip("wikipedia", exc_type=ImportError)
+    with FakeWikipedia() as fake:
+        monkeypatch.setattr(wikipedia.wikipedia, "API_URL", fake.url + "/w/api.php")
+        for value in vars(wikipedia.wikipedia).values():
+            if isinstance(value, wikipedia.util.cache):
+                monkeypatch.setattr(value, "_cache", NoMemo())
+        monkeypatch.setattr(wiki, "_cache", TieredCache(TTLCache(maxsize=16, ttl=60)))
+        yield fake
+
+def test_a_stalled_wikipedia_opens_the_breaker_and_serves_the_last_good_answer(fake_wikipedia):
+    wiki_tool = guard(wiki.wiki_summary, timeout=0.2)
+    assert wiki_tool("Alan Turing").startswith("Alan Turing was")
+    wiki._cache.clear()
+    fake_wikipedia.inject(stall=1.0)
+    start = time.perf_counter()
+    answers = [wiki_tool("Alan Turing") for _ in range(6)]
+    elapsed = time.perf_counter() - start
+    stats = wiki_tool.breaker.stats()
+    assert stats["state"] == OPEN and stats["timeouts"] == 3 and stats["rejected"] == 3
+    assert elapsed < 1.0
+    assert all(answer.startswith("Alan Turing was") and "(Saved answer" in answer for answer in answers)
+    assert wiki_tool("Grace Hopper").startswith("Error: ")
+
+def test_gmail_failures_open_the_breaker(fake_gmail):
+    import gmail_helper
+    gmail_tool = guard(lambda count: gmail_helper.format_emails(gmail_helper.get_recent_emails(int(count))),
+                       timeout=5)
+    assert gmail_tool("2").startswith("2 Most Recent Emails:")
+    fake_gmail.inject(failure_rate=1.0)
+    answers = [gmail_tool("3") for _ in range(4)]
+    assert gmail_tool.breaker.stats()["state"] == OPEN
+    assert all(answer.startswith("Error: ") for answer in answers)
+    assert fake_gmail.faults >= 3
+    fake_gmail.inject()
+    assert gmail_tool("2").startswith("2 Most Recent Emails:\n")
+
+def test_no_free_slot_does_not_count_against_the_tool(monkeypatch):
+    monkeypatch.setattr(resilience, "_slots", threading.BoundedSemaphore(1))
+    resilience._slots.acquire()
+    try:
+        tool = guard(lambda text: text, timeout=0.05, failures=1)
+        assert tool("hello").startswith("Error: ")
+        stats = tool.breaker.stats()
+        assert stats["failures"] == 0 and stats["budget_exhausted"] == 1 and stats["state"] == CLOSED
+    finally:
+        resilience._slots.release()
+    assert tool("hello") == "hello"
+
+def test_an_abandoned_call_is_cancelled_and_goes_quiet():
+    finished = threading.Event()
+    seen = {}
+
+    def slow(text):
+        emit("progress", message="early")
+        time.sleep(0.3)
+        seen["cancelled"] = cancelled()
+        emit("progress", message="late")
+        finished.set()
+        return text
+
+    tool = guard(slow, timeout=0.1)
+
+    def chat():
+        answer = tool("hello")
+        assert not cancelled()
+        finished.wait(2)
+        return answer
+
+    events = list(stream_events(chat))
+    assert seen["cancelled"] is True
+    messages = [event["message"] for event in events if event["type"] == "progress"]
+    assert messages == ["early"]
+    assert events[-1]["type"] == "final" and events[-1]["content"].startswith("Error: ")
+
+def test_an_abandoned_game_is_not_saved_or_cached(fake_openai, tmp_path, monkeypatch):
+    import game_maker
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(game_maker, "GAME_STEP_SECONDS", 0)
+    puts = []
+    monkeypatch.setattr(game_maker.game_cache, "get", lambda key: None)
+    monkeypatch.setattr(game_maker.game_cache, "put", lambda key, html: puts.append(key))
+    finished = threading.Event()
+
+    def slow_refine(html_content):
+        # Refinement runs past the tool's deadline.
+        time.sleep(0.6)
+        finished.set()
+        return html_content
+
+    monkeypatch.setattr(game_maker, "refine_html_content", slow_refine)
+    game_maker.get_client()  # The first call imports the OpenAI SDK, which alone can take the whole deadline.
+    game_tool = guard(lambda idea: game_maker.make_game(idea, open_browser=False, stream=False), timeout=0.4)
+    assert game_tool("catch").startswith("Error: ")
+    assert finished.wait(5)
+    time.sleep(0.2)
+    assert not list(tmp_path.glob("*.html")) and not puts
+    assert game_tool.breaker.stats()["timeouts"] == 1
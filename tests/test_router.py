@@ -0,0 +1,69 @@
+# tests/test_router.py
+import time
+import pytest
+from langchain_core.tools import Tool
+import tool_registry
+from agent_graph import Agent
+from router import (CALCULATION_PROMPTS, COMPOUND_PROMPTS, GOLDEN_PROMPTS, ROUTES, IntentRouter,
+                    _legacy_route)
+
+router = IntentRouter()
+no_gmail_router = IntentRouter([r for r in ROUTES if r.tool != "GmailReader"])
+
+@pytest.mark.parametrize("prompt", GOLDEN_PROMPTS)
+def test_routes_like_the_legacy_cascade(prompt):
+    assert router.route(prompt) == _legacy_route(prompt)
+    assert no_gmail_router.route(prompt) == _legacy_route(prompt, gmail=False)
+    assert router.route_all(prompt) == ([_legacy_route(prompt)] if _legacy_route(prompt) else [])
+
+@pytest.mark.parametrize("prompt", CALCULATION_PROMPTS)
+def test_calculations_without_a_trigger_go_to_the_calculator(prompt):
+    assert router.route(prompt) == ("Calculator", prompt)
+
+@pytest.mark.parametrize("prompt, expected", COMPOUND_PROMPTS)
+def test_route_all_finds_each_intent(prompt, expected):
+    assert router.route_all(prompt) == expected
+
+@pytest.mark.parametrize("prompt", ["check my email and tell me about it",
+                                    "make a game about dragons and tell me about that",
+                                    "what is 6 times 7 and tell me more about it"])
+def test_clauses_without_their_own_topic_are_not_intents(prompt):
+    assert [tool for tool, _ in router.route_all(prompt)] == [router.route(prompt)[0]]
+
+def _sleeping_tool(name: str, seconds: float) -> Tool:
+    def run(tool_input: str) -> str:
+        time.sleep(seconds)
+        return f"{name}: {tool_input}"
+    return Tool(name=name, func=run, description=name)
+
+def test_compound_request_runs_its_tools_in_parallel(monkeypatch):
+    for name in ("Calculator", "GameGenerator", "WikiTool"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, _sleeping_tool(name, 0.5))
+    agent = Agent("test", gmail=False)
+    start = time.perf_counter()
+    reply = agent.run("add 3+4 and tell me about Python and make a game about snakes")
+    elapsed = time.perf_counter() - start
+    # Replies come back in the order asked, whichever tool finished first.
+    assert reply == "Calculator: add 3+4\n\nWikiTool: python\n\nGameGenerator: about snakes"
+    # Three 0.5 s tools take about 0.5 s together; one after another they would take 1.5 s.
+    assert elapsed < 1.0, elapsed
+
+@pytest.mark.parametrize("prompt, previous, expected", [
+    ("what is it", "who is Alan Turing", [("WikiTool", "alan turing")]),
+    ("make a game about it", "tell me about Dragons", [("GameGenerator", "dragons")]),
+    ("tell me about them", "make a game about Space Invaders", [("WikiTool", "Space Invaders")]),
+    ("what is it", "check my email", [("WikiTool", "it")]),
+    ("what is Python", "who is Alan Turing", [("WikiTool", "python")]),
+    ("thanks, that was great", "who is Alan Turing", []),
+])
+def test_follow_ups_take_their_topic_from_the_previous_message(prompt, previous, expected):
+    assert router.route_followup(prompt, previous) == expected
+
+def test_agents_resolve_follow_ups_from_session_memory(monkeypatch):
+    for name in ("Calculator", "GameGenerator", "WikiTool"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, _sleeping_tool(name, 0))
+    agent = Agent("test", gmail=False)
+    session = f"follow-up-{time.monotonic()}"
+    assert agent.run("who is Alan Turing", session) == "WikiTool: alan turing"
+    assert agent.run("make a game about him", session) == "GameGenerator: alan turing"
+    assert agent.run("make a game about him") == "GameGenerator: about him"
@@ -0,0 +1,83 @@
+# tests/test_tracing.py
+from collections import deque
+import pytest
+import resilience
+import tracing
+from chat_stream import stream_events
+from resilience import CircuitBreaker, Guard
+from tracing import NOOP_SPAN, annotate, get_trace, span, start_span, traced
+
+@pytest.fixture(autouse=True)
+def buffer(monkeypatch):
+    """An empty span buffer, with tracing on."""
+    monkeypatch.setattr(tracing, "_buffer", deque(maxlen=100))
+    monkeypatch.setattr(tracing, "TRACING", True)
+    return tracing._buffer
+
+def guard(fn, name):
+    with resilience._breakers_lock:
+        resilience._breakers[name] = CircuitBreaker(name, failures=3, reset_seconds=60)
+    return Guard(name, fn, timeout=5)
+
+def test_nested_spans_are_children_of_the_current_span(buffer):
+    @traced("outer")
+    def outer():
+        with span("inner", step=1):
+            annotate(note="hi")
+        with span("inner", step=2):
+            pass
+
+    outer()
+    spans = get_trace(buffer[-1]["trace_id"])
+    assert [s["name"] for s in spans] == ["outer", "inner", "inner"]
+    assert spans[0]["parent_id"] is None and spans[0]["span_id"] == spans[0]["trace_id"]
+    assert all(s["parent_id"] == spans[0]["span_id"] for s in spans[1:])
+    assert spans[1]["attrs"] == {"step": 1, "note": "hi"}
+
+def test_spans_in_a_guarded_tool_belong_to_the_callers_trace(buffer):
+    @traced("lookup")
+    def lookup(query):
+        with span("lookup.fetch", query=query):
+            return query.upper()
+
+    tool = guard(lookup, "test-tracing-tool")
+    with span("chat") as chat:
+        assert tool("hi") == "HI"
+    spans = {s["name"]: s for s in get_trace(chat.trace_id)}
+    assert set(spans) == {"chat", "lookup", "lookup.fetch"}
+    assert spans["lookup"]["parent_id"] == chat.span_id
+    assert spans["lookup.fetch"]["parent_id"] == spans["lookup"]["span_id"]
+
+def test_an_exception_ends_the_span_with_its_error(buffer):
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("bad input")
+    assert buffer[-1]["name"] == "failing" and buffer[-1]["error"] == "ValueError: bad input"
+
+def test_a_streamed_chat_is_told_its_trace_id():
+    def chat(prompt):
+        with span("chat"):
+            return prompt
+
+    events = list(stream_events(chat, "hi"))
+    assert events[0]["type"] == "trace"
+    assert [s["name"] for s in get_trace(events[0]["trace_id"])] == ["chat"]
+
+def test_tracing_off_records_nothing(buffer, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING", False)
+    seen = []
+
+    @traced("outer")
+    def outer(text):
+        with span("inner") as inner:
+            inner.set(step=1)
+            annotate(note="hi")
+            seen.append(inner)
+            return text
+
+    tool = guard(outer, "test-tracing-off")
+    assert tool("x") == "x"
+    assert seen == [NOOP_SPAN]
+    assert start_span("manual") is NOOP_SPAN
+    assert tracing.current_span() is NOOP_SPAN
+    assert len(buffer) == 0
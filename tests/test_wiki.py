@@ -0,0 +1,142 @@
+# tests/test_wiki.py
+import sys
+import time
+import types
+import pytest
+import wiki
+from cache import SQLiteCache, TieredCache, TTLCache
+
+class DisambiguationError(Exception):
+    def __init__(self, title, options):
+        super().__init__(title)
+        self.options = options
+
+class PageError(Exception):
+    pass
+
+@pytest.fixture
+def wikipedia(monkeypatch):
+    """A stub wikipedia module that answers from a dict and counts its calls."""
+    stub = types.ModuleType("wikipedia")
+    stub.exceptions = types.SimpleNamespace(DisambiguationError=DisambiguationError, PageError=PageError)
+    stub.calls = []
+    pages = {"Python": "Python is a programming language.", "Ada Lovelace": "Ada Lovelace was a mathematician."}
+
+    def summary(query, sentences=2):
+        stub.calls.append(query)
+        if query.casefold() == "mercury":
+            raise DisambiguationError(query, ["Mercury (planet)", "Mercury (element)", "Freddie Mercury"])
+        for title, text in pages.items():
+            if title.casefold() == query.strip().rstrip("?").casefold():
+                return text
+        raise PageError(query)
+
+    stub.summary = summary
+    monkeypatch.setitem(sys.modules, "wikipedia", stub)
+    monkeypatch.setattr(wiki, "_cache", TieredCache(TTLCache(maxsize=16, ttl=60)))
+    return stub
+
+def test_repeated_queries_are_served_from_the_cache(wikipedia):
+    assert wiki.wiki_summary("Python") == "Python is a programming language."
+    for query in ("python", "  PYTHON ", "Python?"):
+        assert wiki.wiki_summary(query) == "Python is a programming language."
+    assert wikipedia.calls == ["Python"]
+    assert wiki.wiki_cache_stats()["memory"]["hits"] == 3
+
+def test_disambiguation_and_missing_pages_are_cached_for_the_negative_ttl(wikipedia, monkeypatch):
+    monkeypatch.setattr(wiki, "WIKI_NEGATIVE_TTL", 0.2)
+    assert wiki.wiki_summary("Mercury").startswith("Multiple results found: ['Mercury (planet)'")
+    assert wiki.wiki_summary("Atlantis") == "No page found."
+    wiki.wiki_summary("mercury")
+    wiki.wiki_summary("atlantis")
+    assert wikipedia.calls == ["Mercury", "Atlantis"]
+    time.sleep(0.25)
+    wiki.wiki_summary("mercury")
+    assert wikipedia.calls == ["Mercury", "Atlantis", "mercury"]
+    # Good answers keep the full TTL.
+    wiki.wiki_summary("Python")
+    wiki.wiki_summary("Python")
+    assert wikipedia.calls.count("Python") == 1
+
+def test_least_recently_used_answers_are_evicted(wikipedia, monkeypatch):
+    monkeypatch.setattr(wiki, "_cache", TieredCache(TTLCache(maxsize=1, ttl=60)))
+    wiki.wiki_summary("Python")
+    wiki.wiki_summary("Ada Lovelace")
+    wiki.wiki_summary("Python")
+    assert wikipedia.calls == ["Python", "Ada Lovelace", "Python"]
+    assert wiki.wiki_cache_stats()["memory"]["evictions"] == 2
+
+def test_the_sqlite_tier_survives_a_restart(wikipedia, monkeypatch, tmp_path):
+    path = str(tmp_path / "wiki.db")
+    monkeypatch.setattr(wiki, "_cache", TieredCache(TTLCache(maxsize=16, ttl=60), SQLiteCache(path, ttl=60)))
+    wiki.wiki_summary("Python")
+    # A new process starts with an empty memory tier over the same file.
+    monkeypatch.setattr(wiki, "_cache", TieredCache(TTLCache(maxsize=16, ttl=60), SQLiteCache(path, ttl=60)))
+    assert wiki.wiki_summary("python") == "Python is a programming language."
+    assert wikipedia.calls == ["Python"]
+    assert wiki.wiki_cache_stats()["disk"]["hits"] == 1
+
+def test_the_sqlite_tier_keeps_at_most_max_entries(wikipedia, monkeypatch, tmp_path):
+    monkeypatch.setattr(wiki, "WIKI_CACHE_DB", str(tmp_path / "wiki.db"))
+    monkeypatch.setattr(wiki, "WIKI_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(wiki, "WIKI_CACHE_SIZE", 0)
+    monkeypatch.setattr(wiki, "_cache", wiki.make_cache())
+    for query in ("Python", "Ada Lovelace", "Python", "Atlantis"):
+        wiki.wiki_summary(query)
+        time.sleep(0.01)
+    disk = wiki.wiki_cache_stats()["disk"]
+    assert disk["evictions"] == 1
+    # "Ada Lovelace" was the least recently used, so it went and "Python" stayed.
+    wiki.wiki_summary("Python")
+    wiki.wiki_summary("Ada Lovelace")
+    assert wikipedia.calls == ["Python", "Ada Lovelace", "Atlantis", "Ada Lovelace"]
+
+def test_offline_mode_never_calls_wikipedia(wikipedia, monkeypatch):
+    monkeypatch.setattr(wiki, "WIKI_OFFLINE", True)
+    assert wiki.wiki_summary("Python") == "No page found."
+    assert wiki.local_summary("Python") == "No page found."
+    assert wikipedia.calls == []
+
+@pytest.fixture
+def index(monkeypatch, tmp_path):
+    """A WikiIndex built from wiki_index's sample dump, installed as wiki's offline index."""
+    from wiki_index import _SAMPLE_DUMP, WikiIndex, build_index
+    dump = tmp_path / "sample.xml"
+    dump.write_text(_SAMPLE_DUMP, encoding="utf-8")
+    counts = build_index(str(dump), str(tmp_path / "index.db"))
+    assert counts == {"pages": 3, "redirects": 1, "skipped": 1}
+    index = WikiIndex(str(tmp_path / "index.db"))
+    monkeypatch.setattr(wiki, "_index", index)
+    return index
+
+@pytest.mark.parametrize("topic, start", [
+    ("Alan Turing", "Alan Mathison Turing (23 June 1912 – 7 June 1954) was an English mathematician, "
+                    "computer scientist and logician. He was highly influential in the development "
+                    "of theoretical computer science."),
+    ("a. m. turing?", "Alan Mathison Turing"),
+    ("python programming language", "Python is a high-level, general-purpose programming language."),
+    ("the roman empire", "The Roman Empire was the state"),
+    ("turing", "Alan Mathison Turing"),
+])
+def test_the_index_finds_pages_by_title_redirect_and_words(index, topic, start):
+    assert index.summary(topic).startswith(start)
+
+def test_the_index_leaves_out_other_namespaces_and_unknown_topics(index):
+    assert index.summary("Talk Roman Empire discussion") is None
+    assert index.summary("nonexistent topic") is None
+
+def test_an_index_hit_never_calls_wikipedia(wikipedia, index):
+    assert wiki.wiki_summary("A. M. Turing").startswith("Alan Mathison Turing")
+    assert wiki.wiki_summary("the roman empire").startswith("The Roman Empire was")
+    assert wikipedia.calls == []
+
+def test_an_index_miss_falls_through_to_wikipedia(wikipedia, index):
+    assert wiki.local_summary("Ada Lovelace") is None
+    assert wiki.wiki_summary("Ada Lovelace") == "Ada Lovelace was a mathematician."
+    assert wikipedia.calls == ["Ada Lovelace"]
+
+def test_offline_mode_answers_from_the_index_alone(wikipedia, index, monkeypatch):
+    monkeypatch.setattr(wiki, "WIKI_OFFLINE", True)
+    assert wiki.wiki_summary("Alan Turing").startswith("Alan Mathison Turing")
+    assert wiki.wiki_summary("Ada Lovelace") == "No page found."
+    assert wikipedia.calls == []
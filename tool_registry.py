@@ -0,0 +1,121 @@
+# tool_registry.py
+import os
+import re
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from langchain_core.tools import Tool
+from gmail_helper import format_emails, get_recent_emails
+from gmail_mirror import recent_emails
+from game_maker import make_game, make_game_from_cache
+from wiki import local_summary, wiki_summary
+from resilience import Guard
+import arithmetic
+
+# Per-call deadlines, in seconds, for the tools that wait on the network. A request's
+# total budget (REQUEST_BUDGET in resilience.py) can cut a call shorter.
+WIKI_TIMEOUT = float(os.getenv("WIKI_TIMEOUT", "10"))
+GMAIL_TIMEOUT = float(os.getenv("GMAIL_TIMEOUT", "15"))
+GAME_TIMEOUT = float(os.getenv("GAME_TIMEOUT", "90"))
+
+# Tools that need Gmail access; agents built without Gmail leave them out.
+GMAIL_TOOLS = frozenset({"GmailReader"})
+
+class ToolContext:
+    """Per-request tool state: the tools this request has already run.
+
+    The tools themselves are built once and shared. Each request gets its own
+    context, and the parallel tool branches of one request share it, so a
+    tool still runs at most once per request.
+    """
+
+    __slots__ = ("called", "_lock")
+
+    def __init__(self):
+        self.called = set()
+        self._lock = threading.Lock()
+
+    def claim(self, name: str) -> bool:
+        """Mark a tool as called; False if this request has already called it."""
+        with self._lock:
+            if name in self.called:
+                return False
+            self.called.add(name)
+            return True
+
+# Tool definitions; each takes the tool input and returns the response text
+def make_game_tool(input_string: str) -> str:
+    """A tool that generates a simple game based on user input."""
+    result = make_game(input_string)
+    return "[FINAL] Game created successfully" if result == "Successfully created game" else result
+
+def cached_game_tool(input_string: str) -> Optional[str]:
+    """The game tool's answer from the game cache alone, or None."""
+    result = make_game_from_cache(input_string)
+    if result is None:
+        return None
+    return "[FINAL] Game created successfully" if result == "Successfully created game" else result
+
+def recent_email(input_string: str) -> str:
+    """A tool that reads the subject line and snippet of the most recent email(s)."""
+    # "my last 10 emails" style queries read several messages
+    match = re.search(r"(?:last|latest|recent)\s+(\d+)", input_string.lower())
+    count = min(int(match.group(1)), 100) if match else 1
+    # Serve from the local mirror, falling back to the live API if it is unavailable
+    try:
+        emails = recent_emails(max(count, 1))
+    except Exception as e:
+        print(f"Gmail mirror unavailable: {str(e)}")
+        emails = get_recent_emails(max(count, 1))
+    return format_emails(emails)
+
+def add(input_string: str) -> str:
+    """A calculator tool: sums the numbers given, or evaluates an expression like '(3 + 4) * 2'."""
+    try:
+        return arithmetic.answer(input_string)
+    except arithmetic.ExpressionError as e:
+        return str(e)
+
+def wiki_tool(input_string: str) -> str:
+    """A tool that fetches summaries from Wikipedia."""
+    return wiki_summary(input_string)
+
+# Every tool, built once at import and shared by all agents and requests
+TOOLS: Dict[str, Tool] = {}
+
+def register_tool(name: str, func: Callable[[str], str], description: str, timeout: Optional[float] = None,
+                  fallback: Optional[Callable[[str], Optional[str]]] = None) -> Tool:
+    """Register a tool, guarded by a deadline, a circuit breaker and a fallback (see resilience.Guard)."""
+    tool = Tool(name=name, func=Guard(name, func, timeout, fallback), description=description)
+    TOOLS[name] = tool
+    return tool
+
+register_tool(
+    "Calculator", add,
+    "Adds numbers or evaluates arithmetic. Input: numbers separated by commas (e.g., '3, 4') or an expression (e.g., '(3 + 4) * 2')",
+)
+register_tool(
+    "GmailReader", recent_email,
+    "Reads the most recent email subject line and snippet, or the last N emails (e.g., 'my last 10 emails').",
+    timeout=GMAIL_TIMEOUT,
+)
+register_tool(
+    "GameGenerator", make_game_tool,
+    "Generates an HTML game based on input (e.g., 'snake'). Opens in browser when done.",
+    timeout=GAME_TIMEOUT, fallback=cached_game_tool,
+)
+register_tool(
+    "WikiTool", wiki_tool,
+    "Gets a summary from Wikipedia. Input: a topic to search for.",
+    timeout=WIKI_TIMEOUT, fallback=local_summary,
+)
+
+def enabled_tools(gmail: bool = True) -> Tuple[str, ...]:
+    """Names of the registered tools an agent gets, in registration order."""
+    return tuple(name for name in TOOLS if gmail or name not in GMAIL_TOOLS)
+
+def run_tool(name: str, tool_input: str, context: ToolContext) -> str:
+    """Run a shared tool for one request, at most once per request."""
+    if not context.claim(name):
+        label = name if name.endswith("Tool") else f"{name} tool"
+        return f"The {label} has already been called."
+    return TOOLS[name].func(tool_input)
@@ -0,0 +1,225 @@
+# tracing.py
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, List, Optional
+from chat_stream import emit
+
+# Set TRACING=0 to turn spans into no-ops.
+TRACING = os.getenv("TRACING", "1") != "0"
+# Finished spans are also appended here as JSON lines, rotated by size.
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_FILE_MAX_MB = float(os.getenv("TRACE_FILE_MAX_MB", "20"))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+# Finished spans kept in memory for the UI waterfall.
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+
+_ids = itertools.count(1)
+_prefix = f"{os.getpid():x}-{int(time.time()):x}"
+
+class Span:
+    """A timed operation. Spans started while another is current become its children."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start_time", "_start", "duration", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: dict):
+        self.span_id = f"{_prefix}-{next(_ids)}"
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.attrs = attrs
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+            "start": round(self.start_time, 6), "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attrs": self.attrs, "error": self.error,
+        }
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off, so callers never need to check."""
+
+    trace_id = span_id = parent_id = None
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_buffer: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+_file_logger: Optional[logging.Logger] = None
+_file_lock = threading.Lock()
+
+def _export(span: Span) -> None:
+    record = span.to_dict()
+    _buffer.append(record)
+    if TRACE_FILE:
+        _get_file_logger().info(json.dumps(record, default=str))
+
+def _get_file_logger() -> logging.Logger:
+    global _file_logger
+    with _file_lock:
+        if _file_logger is None:
+            handler = RotatingFileHandler(TRACE_FILE, maxBytes=int(TRACE_FILE_MAX_MB * 1024 * 1024),
+                                          backupCount=TRACE_FILE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("agent.traces")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _file_logger = logger
+        return _file_logger
+
+def set_enabled(enabled: bool) -> None:
+    global TRACING
+    TRACING = enabled
+
+def is_enabled() -> bool:
+    return TRACING
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+def annotate(**attrs) -> None:
+    """Add attributes to the current span, if any."""
+    span = _current.get()
+    if span is not None:
+        span.attrs.update(attrs)
+
+def start_span(name: str, **attrs):
+    """Start a child of the current span without making it current, for callback-style code.
+
+    The caller must call end() on it. A span with no parent starts a new
+    trace, and a streamed chat is told its trace id.
+    """
+    if not TRACING:
+        return NOOP_SPAN
+    parent = _current.get()
+    span = Span(name, parent, attrs)
+    if parent is None:
+        emit("trace", trace_id=span.trace_id)
+    return span
+
+class span:
+    """Context manager that times a block as a span and makes it current inside the block."""
+
+    __slots__ = ("_span", "_token")
+
+    def __init__(self, name: str, **attrs):
+        self._span = start_span(name, **attrs)
+        self._token = None
+
+    def __enter__(self):
+        if self._span is not NOOP_SPAN:
+            self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            _current.reset(self._token)
+            self._span.end(exc)
+        return False
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator that runs the function inside a span named `name` (default: the function's name)."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACING:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_trace(trace_id: str) -> List[dict]:
+    """The finished spans of one trace, in start order."""
+    return sorted((s for s in list(_buffer) if s["trace_id"] == trace_id), key=lambda s: s["start"])
+
+def recent_traces(limit: int = 20) -> List[dict]:
+    """The newest finished root spans, newest first, each with its span count."""
+    records = list(_buffer)
+    counts: Dict[str, int] = {}
+    for record in records:
+        counts[record["trace_id"]] = counts.get(record["trace_id"], 0) + 1
+    roots = [r for r in reversed(records) if r["parent_id"] is None][:limit]
+    return [{**root, "spans": counts[root["trace_id"]]} for root in roots]
+
+def format_waterfall(spans: List[dict], width: int = 40) -> str:
+    """Render a trace as indented text bars: offset and length are to scale with the whole trace."""
+    if not spans:
+        return "No spans recorded."
+    depth: Dict[str, int] = {}
+    start = min(s["start"] for s in spans)
+    total = max(s["start"] - start + s["duration_ms"] / 1000 for s in spans) or 1e-9
+    lines = []
+    for record in sorted(spans, key=lambda s: s["start"]):
+        level = depth[record["span_id"]] = depth.get(record["parent_id"], -1) + 1
+        offset = record["start"] - start
+        left = int(offset / total * width)
+        length = max(1, round(record["duration_ms"] / 1000 / total * width))
+        bar = " " * left + "█" * min(length, width - left)
+        label = ("  " * level + record["name"])[:32]
+        flag = " !" if record["error"] else ""
+        lines.append(f"{label:<32} {bar:<{width}} {offset * 1000:8.1f} +{record['duration_ms']:.1f} ms{flag}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    import timeit
+
+    @traced("outer")
+    def outer():
+        with span("inner", step=1):
+            time.sleep(0.01)
+        with span("inner", step=2):
+            time.sleep(0.02)
+
+    outer()
+    trace = recent_traces(1)[0]
+    spans = get_trace(trace["trace_id"])
+    print(format_waterfall(spans))
+
+    def plain():
+        return 1
+    wrapped = traced("bench")(plain)
+    runs = 200_000
+    base = min(timeit.repeat(plain, number=runs, repeat=3)) / runs
+    set_enabled(False)
+    disabled = min(timeit.repeat(wrapped, number=runs, repeat=3)) / runs
+    set_enabled(True)
+    enabled = min(timeit.repeat(wrapped, number=runs // 10, repeat=3)) / (runs // 10)
+    print(f"plain call {base * 1e9:.0f} ns, traced with tracing off {disabled * 1e9:.0f} ns, "
+          f"on {enabled * 1e6:.2f} µs per span")
@@ -1,12 +1,94 @@
-import wikipedia
+import os
+import re
+import threading
+from cache import MISSING, SQLiteCache, TieredCache, TTLCache
+from tracing import annotate, traced
 
+# Cache settings. Set WIKI_CACHE_DB to a file path to keep a SQLite tier across restarts.
+WIKI_CACHE_SIZE = int(os.getenv("WIKI_CACHE_SIZE", "512"))
+WIKI_CACHE_TTL = float(os.getenv("WIKI_CACHE_TTL", str(24 * 3600)))
+# Disambiguation and missing-page answers are cached for a shorter time.
+WIKI_NEGATIVE_TTL = float(os.getenv("WIKI_NEGATIVE_TTL", str(10 * 60)))
+WIKI_CACHE_DB = os.getenv("WIKI_CACHE_DB")
+# Rows kept in the SQLite tier; the least recently used are evicted beyond this.
+WIKI_CACHE_MAX_ENTRIES = int(os.getenv("WIKI_CACHE_MAX_ENTRIES", "10000"))
+# Offline index built by `python wiki_index.py ingest`; Wikipedia is only called when it has no match.
+WIKI_INDEX = os.getenv("WIKI_INDEX")
+# Answer from the index alone, never from the network.
+WIKI_OFFLINE = os.getenv("WIKI_OFFLINE", "0") != "0"
+
+def make_cache():
+    """The answer cache: memory, plus SQLite when WIKI_CACHE_DB is set."""
+    return TieredCache(
+        TTLCache(maxsize=WIKI_CACHE_SIZE, ttl=WIKI_CACHE_TTL),
+        SQLiteCache(WIKI_CACHE_DB, ttl=WIKI_CACHE_TTL, max_entries=WIKI_CACHE_MAX_ENTRIES) if WIKI_CACHE_DB else None,
+    )
+
+_cache = make_cache()
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """The shared offline index, or None when WIKI_INDEX is unset or missing."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = False
+            if WIKI_INDEX:
+                from wiki_index import WikiIndex
+                try:
+                    _index = WikiIndex(WIKI_INDEX)
+                except FileNotFoundError:
+                    print(f"Wikipedia index {WIKI_INDEX} not found; using the network.")
+        return _index or None
+
+def normalize_query(query):
+    """Normalize a query into a cache key: case, inner whitespace and trailing '?'."""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?").strip().casefold()
+
+def local_summary(query):
+    """The answer from the cache or the offline index, or None; never touches the network."""
+    key = normalize_query(query)
+    cached = _cache.get(key)
+    if cached is not MISSING:
+        annotate(source="cache")
+        return cached
+
+    index = get_index()
+    summary = index.summary(query) if index else None
+    if summary is not None:
+        annotate(source="index")
+        _cache.set(key, summary)
+    return summary
+
+@traced("wiki_summary")
 def wiki_summary(query):
+    summary = local_summary(query)
+    if summary is not None:
+        return summary
+    key = normalize_query(query)
+    annotate(source="offline" if WIKI_OFFLINE else "network")
+    if WIKI_OFFLINE:
+        summary = "No page found."
+        _cache.set(key, summary, ttl=WIKI_NEGATIVE_TTL)
+        return summary
+
+    # Deferred so that importing the agents does not pull in wikipedia and its dependencies
+    import wikipedia
     try:
         summary = wikipedia.summary(query, sentences=2)
         print(summary)
-        return summary
+        ttl = WIKI_CACHE_TTL
     except wikipedia.exceptions.DisambiguationError as e:
-        return f"Multiple results found: {e.options[:5]}"
+        summary = f"Multiple results found: {e.options[:5]}"
+        ttl = WIKI_NEGATIVE_TTL
     except wikipedia.exceptions.PageError:
-        return "No page found."
+        summary = "No page found."
+        ttl = WIKI_NEGATIVE_TTL
+    _cache.set(key, summary, ttl=ttl)
+    return summary
 
+def wiki_cache_stats():
+    """Hit, miss and eviction counters for each cache tier."""
+    return _cache.stats()
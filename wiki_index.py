@@ -0,0 +1,258 @@
+# wiki_index.py
+import bz2
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+# Bytes of the index file to memory-map when serving.
+WIKI_INDEX_MMAP = int(os.getenv("WIKI_INDEX_MMAP_MB", "1024")) * 1024 * 1024
+# Longest lead paragraph kept per article.
+MAX_LEAD_CHARS = 1500
+# Leading words dropped from full-text queries ("the roman empire" -> "roman empire").
+STOPWORDS = frozenset({"the", "a", "an"})
+SCHEMA = """
+CREATE TABLE pages (id INTEGER PRIMARY KEY, title TEXT NOT NULL, lead TEXT NOT NULL);
+CREATE TABLE titles (key TEXT PRIMARY KEY, page_id INTEGER NOT NULL) WITHOUT ROWID;
+CREATE VIRTUAL TABLE title_search USING fts5(title, page_id UNINDEXED, tokenize='unicode61 remove_diacritics 2');
+"""
+
+def title_key(text: str) -> str:
+    """Normalize a title or query for exact lookup: case, underscores, whitespace and trailing '?'."""
+    return re.sub(r"[\s_]+", " ", text).strip().rstrip("?").strip().casefold()
+
+def first_sentences(text: str, count: int = 2) -> str:
+    """The first `count` sentences, splitting after . ! ? followed by a capitalised word."""
+    sentences = re.split(r"(?<=[a-z0-9)\]\"'][.!?])\s+(?=[A-Z0-9\"'(])", text.strip())
+    return " ".join(sentences[:count])
+
+# Wikitext clean-up, applied in order to the lead section.
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+_TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+_TABLE = re.compile(r"\{\|[^{}]*?\|\}", re.DOTALL)
+_FILE = re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\[\]]*\]\][^\[\]]*)*\]\]", re.IGNORECASE)
+_LINK = re.compile(r"\[\[(?:[^|\[\]]*\|)?([^\[\]]*)\]\]")
+_EXTERNAL = re.compile(r"\[https?://[^\s\]]+\s*([^\]]*)\]")
+_EMPHASIS = re.compile(r"'{2,}")
+_DISAMBIGUATION = re.compile(r"\{\{\s*(?:disambiguation|disambig|dab|hndis|geodis)\b", re.IGNORECASE)
+
+def lead_paragraph(wikitext: str) -> str:
+    """Plain text of the article's lead section, before the first heading."""
+    text = _COMMENT.sub("", wikitext)
+    text = _REF.sub("", text)
+    # Templates and tables nest, so strip the innermost ones until none are left.
+    for pattern in (_TEMPLATE, _TABLE):
+        previous = None
+        while previous != text:
+            previous, text = text, pattern.sub("", text)
+    text = re.split(r"^\s*==", text, maxsplit=1, flags=re.MULTILINE)[0]
+    text = _FILE.sub("", text)
+    text = _LINK.sub(r"\1", text)
+    text = _EXTERNAL.sub(r"\1", text)
+    text = _TAG.sub("", _EMPHASIS.sub("", text))
+    text = re.sub(r"\(\s*[;,]?\s*\)", "", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text[:MAX_LEAD_CHARS]
+
+def _open(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def read_dump(path: str) -> Iterator[Tuple[str, Optional[str], str]]:
+    """Yield (title, redirect target or None, wikitext) for every main-namespace page.
+
+    Reads MediaWiki XML exports (pages-articles.xml, optionally .bz2 or .gz)
+    as a stream. JSON lines with {"title", "text"} or {"title", "redirect"}
+    work too, which is handy for small test subsets.
+    """
+    if path.endswith((".jsonl", ".jsonl.gz", ".jsonl.bz2")):
+        with _open(path) as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row["title"], row.get("redirect"), row.get("text", "")
+        return
+    with _open(path) as f:
+        title = redirect = text = None
+        namespace = "0"
+        for event, element in iterparse(f, events=("end",)):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = element.text
+            elif tag == "ns":
+                namespace = element.text
+            elif tag == "redirect":
+                redirect = element.get("title")
+            elif tag == "text":
+                text = element.text or ""
+            elif tag == "page":
+                if namespace == "0" and title:
+                    yield title, redirect, text or ""
+                title = redirect = text = None
+                namespace = "0"
+                element.clear()
+
+def build_index(dump_path: str, out_path: str, limit: Optional[int] = None, batch_size: int = 10_000) -> dict:
+    """Build a read-only search index from a dump. The file is swapped in atomically when done."""
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + SCHEMA)
+    pages: List[tuple] = []
+    redirects: List[Tuple[str, str]] = []
+    counts = {"pages": 0, "redirects": 0, "skipped": 0}
+
+    def flush():
+        conn.executemany("INSERT INTO pages (id, title, lead) VALUES (?, ?, ?)", pages)
+        conn.executemany("INSERT OR IGNORE INTO titles (key, page_id) VALUES (?, ?)",
+                         [(title_key(title), page_id) for page_id, title, _ in pages])
+        conn.executemany("INSERT INTO title_search (title, page_id) VALUES (?, ?)",
+                         [(title, page_id) for page_id, title, _ in pages])
+        pages.clear()
+
+    for title, redirect, text in read_dump(dump_path):
+        if redirect:
+            redirects.append((title, redirect))
+            continue
+        lead = "" if _DISAMBIGUATION.search(text) else lead_paragraph(text)
+        if not lead:
+            counts["skipped"] += 1
+            continue
+        counts["pages"] += 1
+        pages.append((counts["pages"], title, lead))
+        if len(pages) >= batch_size:
+            flush()
+        if limit is not None and counts["pages"] >= limit:
+            break
+    flush()
+
+    # Redirects point at titles, so they are resolved once every page is in.
+    for source, target in redirects:
+        row = conn.execute("SELECT page_id FROM titles WHERE key = ?", (title_key(target),)).fetchone()
+        if row is None:
+            continue
+        if conn.execute("INSERT OR IGNORE INTO titles (key, page_id) VALUES (?, ?)",
+                        (title_key(source), row[0])).rowcount:
+            conn.execute("INSERT INTO title_search (title, page_id) VALUES (?, ?)", (source, row[0]))
+            counts["redirects"] += 1
+    conn.execute("INSERT INTO title_search (title_search) VALUES ('optimize')")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, out_path)
+    return counts
+
+class WikiIndex:
+    """Read-only lookups against an index built by build_index.
+
+    The file is opened immutable and memory-mapped, so many worker processes
+    can share it through the page cache without locking. Each thread gets its
+    own connection.
+    """
+
+    def __init__(self, path: str, mmap_size: int = WIKI_INDEX_MMAP):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = f"file:{os.path.abspath(self.path)}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+        return conn
+
+    def find(self, query: str) -> Optional[Tuple[str, str]]:
+        """Return (title, lead) for the best-matching page, or None."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT p.title, p.lead FROM titles t JOIN pages p ON p.id = t.page_id WHERE t.key = ?",
+            (title_key(query),),
+        ).fetchone()
+        if row is not None:
+            return row
+        words = [w for w in re.findall(r"\w+", query.casefold()) if w not in STOPWORDS]
+        if not words:
+            return None
+        # Every word must appear in the title; bm25 ranks, and shorter titles win ties.
+        match = " ".join('"' + w.replace('"', '""') + '"' for w in words)
+        return conn.execute(
+            "SELECT p.title, p.lead FROM title_search s JOIN pages p ON p.id = s.page_id "
+            "WHERE title_search MATCH ? ORDER BY bm25(title_search), length(s.title) LIMIT 1",
+            (match,),
+        ).fetchone()
+
+    def summary(self, query: str, sentences: int = 2) -> Optional[str]:
+        found = self.find(query)
+        return first_sentences(found[1], sentences) if found else None
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        return {
+            "pages": conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0],
+            "titles": conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0],
+            "bytes": os.path.getsize(self.path),
+        }
+
+_SAMPLE_DUMP = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">
+<page><title>Alan Turing</title><ns>0</ns><revision><text>{{Short description|English mathematician}}
+{{Infobox scientist|name=Alan Turing|birth_date={{birth date|1912|6|23}}}}
+'''Alan Mathison Turing''' (23 June 1912 – 7 June 1954) was an English [[mathematician]], [[computer science|computer scientist]] and [[logic]]ian.&lt;ref&gt;{{cite web|url=x}}&lt;/ref&gt; He was highly influential in the development of [[theoretical computer science]]. He is widely considered to be the father of computer science.
+== Early life ==
+Turing was born in [[Maida Vale]], London.</text></revision></page>
+<page><title>Turing</title><ns>0</ns><revision><text>'''Turing''' may refer to: {{disambiguation}}</text></revision></page>
+<page><title>A. M. Turing</title><ns>0</ns><redirect title="Alan Turing" /><revision><text>#REDIRECT [[Alan Turing]]</text></revision></page>
+<page><title>Python (programming language)</title><ns>0</ns><revision><text>[[File:Python logo.svg|thumb|The [[logo]]]]
+'''Python''' is a [[high-level programming language|high-level]], [[general-purpose programming language]]. Its design philosophy emphasizes [[code readability]]. Python is dynamically typed and garbage-collected. It supports multiple paradigms.</text></revision></page>
+<page><title>Roman Empire</title><ns>0</ns><revision><text>The '''Roman Empire''' was the state ruled by the [[Ancient Rome|Romans]] following [[Augustus]]'s assumption of sole rule. It included territory around the [[Mediterranean Sea|Mediterranean]]. It was ruled by emperors.</text></revision></page>
+<page><title>Talk:Roman Empire</title><ns>1</ns><revision><text>Discussion.</text></revision></page>
+</mediawiki>
+"""
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    import timeit
+
+    parser = argparse.ArgumentParser(description="Build or query the offline Wikipedia index.")
+    sub = parser.add_subparsers(dest="command")
+    ingest = sub.add_parser("ingest", help="build an index from a pages-articles dump or a JSONL subset")
+    ingest.add_argument("dump")
+    ingest.add_argument("--out", default="wiki_index.db")
+    ingest.add_argument("--limit", type=int)
+    query = sub.add_parser("query", help="look a topic up in an index")
+    query.add_argument("index")
+    query.add_argument("topic")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        print(build_index(args.dump, args.out, args.limit))
+    elif args.command == "query":
+        print(WikiIndex(args.index).summary(args.topic) or "No page found.")
+    else:
+        # Benchmark on a small inline dump.
+        with tempfile.TemporaryDirectory() as tmp:
+            dump = os.path.join(tmp, "sample.xml")
+            with open(dump, "w", encoding="utf-8") as f:
+                f.write(_SAMPLE_DUMP)
+            out = os.path.join(tmp, "index.db")
+            print(build_index(dump, out))
+            index = WikiIndex(out)
+            for topic in ("Alan Turing", "python programming language"):
+                seconds = min(timeit.repeat(lambda: index.summary(topic), number=1000, repeat=3)) / 1000
+                print(f"{topic!r}: {seconds * 1e6:.0f} µs per lookup")